@@ -1,146 +1,193 @@
-import { callPythonScheduler } from "../utils/callPython.js";
+import {
+  callPythonScheduler,
+  startPythonJob,
+  getPythonJob,
+  cancelPythonJob,
+  streamPythonJobEvents,
+  callPythonBatch,
+  callPythonCapacitySweep,
+  getPythonRecommendations
+} from "../utils/callPython.js";
 import userModel from "../models/userModel.js";
 import roomModel from "../models/roomModel.js";
 import subjectModel from "../models/subjectModel.js";
 import timetableModel from "../models/timetableModel.js";
 
-export const generateTimetable = async (req, res) => {
-  try {
-    const { years, roomMappings, teachers: wizardTeachers } = req.body;
-    
-    // Get admin's department from middleware
-    const department = req.adminDepartment;
-    
-    if (!department) {
-      return res.status(400).json({
-        success: false,
-        message: "Department not found for admin"
-      });
-    }
+// Raised while assembling a department payload; reported to the client as a 400
+class PayloadBuildError extends Error {}
 
-    console.log(`🎯 Generating timetable for department: ${department}`);
+// Department-filtered rooms, teachers, subjects and saved timetables in the
+// scheduler's payload format.
+// body: { years, roomMappings, teachers, warmStart, constraints, diff, deferRecommendations }
+const buildDepartmentPayload = async (department, body) => {
+  const { years, roomMappings, teachers: wizardTeachers, warmStart, constraints, diff, deferRecommendations } = body;
 
-    // STEP 1: Fetch department-filtered resources
-    
-    // Fetch rooms for this department
-    const departmentRooms = await roomModel.find({ 
-      department 
-    }).select("name type capacity labCategory primaryYear");
+  // STEP 1: Fetch department-filtered resources
+  
+  // Fetch rooms for this department
+  const departmentRooms = await roomModel.find({ 
+    department 
+  }).select("name type capacity labCategory primaryYear");
 
-    if (departmentRooms.length === 0) {
-      return res.status(400).json({
-        success: false,
-        message: `No rooms found for ${department}. Please add rooms first.`
-      });
-    }
+  if (departmentRooms.length === 0) {
+    throw new PayloadBuildError(`No rooms found for ${department}. Please add rooms first.`);
+  }
 
-    console.log(`🏛️ Found ${departmentRooms.length} rooms for ${department}`);
+  console.log(`🏛️ Found ${departmentRooms.length} rooms for ${department}`);
 
-    let departmentTeachers = wizardTeachers || [];
+  let departmentTeachers = wizardTeachers || [];
 
-    if (!departmentTeachers || departmentTeachers.length === 0) {
-      console.log("⚠️ No teachers in wizard payload, fetching from database...");
-      departmentTeachers = await userModel.find({
-        role: "teacher",
-        department
-      }).select("name email subjects");
-    } else {
-      console.log(` Using ${departmentTeachers.length} teachers from wizard payload`);
-    }
+  if (!departmentTeachers || departmentTeachers.length === 0) {
+    console.log("⚠️ No teachers in wizard payload, fetching from database...");
+    departmentTeachers = await userModel.find({
+      role: "teacher",
+      department
+    }).select("name email subjects");
+  } else {
+    console.log(` Using ${departmentTeachers.length} teachers from wizard payload`);
+  }
 
-    if (departmentTeachers.length === 0) {
-      return res.status(400).json({
-        success: false,
-        message: `No teachers found for ${department}. Please add teachers first.`
-      });
+  if (departmentTeachers.length === 0) {
+    throw new PayloadBuildError(`No teachers found for ${department}. Please add teachers first.`);
+  }
+
+  console.log(`👥 Found ${departmentTeachers.length} teachers for ${department}`);
+  
+  // Log teacher-subject assignments for debugging
+  departmentTeachers.forEach(t => {
+    const subjectCount = (t.subjects || []).length;
+    console.log(`   - ${t.name}: ${subjectCount} subject(s) assigned`);
+    if (subjectCount > 0 && process.env.NODE_ENV !== "production") {
+      const codes = (t.subjects || []).map(s => s.code || s).join(", ");
+      console.log(`     Subjects: ${codes}`);
     }
+  });
 
-    console.log(`👥 Found ${departmentTeachers.length} teachers for ${department}`);
+  // STEP 2: Enrich years with full subject details from database
+  const enrichedYears = {};
+  
+  for (const [yearName, yearData] of Object.entries(years)) {
+    const subjectCodes = yearData.subjects.map(s => s.code);
     
-    // Log teacher-subject assignments for debugging
-    departmentTeachers.forEach(t => {
-      const subjectCount = (t.subjects || []).length;
-      console.log(`   - ${t.name}: ${subjectCount} subject(s) assigned`);
-      if (subjectCount > 0 && process.env.NODE_ENV !== "production") {
-        const codes = (t.subjects || []).map(s => s.code || s).join(", ");
-        console.log(`     Subjects: ${codes}`);
-      }
+    const fullSubjects = await subjectModel.find({
+      code: { $in: subjectCodes },
+      department  
     });
 
-    // STEP 2: Enrich years with full subject details from database
-    const enrichedYears = {};
+    if (fullSubjects.length === 0) {
+      throw new PayloadBuildError(`No subjects found for ${yearName} in ${department}. Please add subjects first.`);
+    }
+
+    console.log(`📚 Year ${yearName}: Found ${fullSubjects.length} subjects`);
+
+    // STEP 3: Flatten components into individual entries
+    const mappedSubjects = fullSubjects.flatMap(subject => {
+      return subject.components.map(comp => ({
+        code: subject.code,
+        name: subject.name,
+        type: comp.type,
+        hours: comp.hours,
+        batches: comp.batches || 1,
+        labDuration: comp.labDuration || 2
+      }));
+    });
+
+    enrichedYears[yearName] = {
+      ...yearData,
+      subjects: mappedSubjects
+    };
+  }
+
+  // STEP 4: Fetch saved timetables for this department
+  const savedTimetables = await timetableModel.find({ 
+    department 
+  })
+  .sort({ createdAt: -1 })
+  .limit(5)
+  .lean();
+
+  //  STEP 5: Use teachers from wizard (already in correct format)
+  const payload = {
+    years: enrichedYears,
+    rooms: departmentRooms.map(r => ({
+      name: r.name,
+      type: r.type,
+      capacity: r.capacity,
+      labCategory: r.labCategory || "None",
+      primaryYear: r.primaryYear || "Shared"
+    })),
+    teachers: departmentTeachers,  // Use directly - already has subjects
+    saved_timetables: savedTimetables.map(tt => ({
+      year: tt.year,
+      division: tt.division,
+      timetableData: tt.timetableData
+    })),
+    roomMappings: roomMappings || {},
+    // Stay under the 200s HTTP timeout so the solver can return a partial result
+    timeLimit: Number(process.env.SCHEDULER_TIME_LIMIT) || 180,
+    // Start from the saved timetables of the classes being regenerated
+    warmStart: Boolean(warmStart),
+    // Declarative rules (teacherUnavailable, roomBlackout, ...), validated by the scheduler
+    constraints: Array.isArray(constraints) ? constraints : [],
+    // "saved" (or { against: "previous", previous }) returns only the changes
+    ...(diff ? { diff } : {}),
+    // Skip recommendations in the solve; fetch them through the returned handle
+    ...(deferRecommendations ? { deferRecommendations: true } : {})
+  };
+
+  console.log("Sending payload to Python scheduler...");
+  console.log(`Years: ${Object.keys(enrichedYears).length}`);
+  console.log(`Total subjects: ${Object.values(enrichedYears).reduce((sum, y) => sum + y.subjects.length, 0)}`);
+  console.log(`Rooms: ${departmentRooms.length}`);
+  console.log(`Teachers: ${departmentTeachers.length}`);
+  console.log(`Teachers with subjects: ${departmentTeachers.filter(t => (t.subjects || []).length > 0).length}`);
+
+  return payload;
+};
+
+export const generateTimetable = async (req, res) => {
+  try {
+    const { async: runAsync, profile } = req.body;
     
-    for (const [yearName, yearData] of Object.entries(years)) {
-      const subjectCodes = yearData.subjects.map(s => s.code);
-      
-      const fullSubjects = await subjectModel.find({
-        code: { $in: subjectCodes },
-        department  
+    // Get admin's department from middleware
+    const department = req.adminDepartment;
+    
+    if (!department) {
+      return res.status(400).json({
+        success: false,
+        message: "Department not found for admin"
       });
+    }
+
+    console.log(`🎯 Generating timetable for department: ${department}`);
 
-      if (fullSubjects.length === 0) {
-        return res.status(400).json({
-          success: false,
-          message: `No subjects found for ${yearName} in ${department}. Please add subjects first.`
-        });
+    let payload;
+    try {
+      payload = await buildDepartmentPayload(department, req.body);
+    } catch (error) {
+      if (error instanceof PayloadBuildError) {
+        return res.status(400).json({ success: false, message: error.message });
       }
+      throw error;
+    }
 
-      console.log(`📚 Year ${yearName}: Found ${fullSubjects.length} subjects`);
-
-      // STEP 3: Flatten components into individual entries
-      const mappedSubjects = fullSubjects.flatMap(subject => {
-        return subject.components.map(comp => ({
-          code: subject.code,
-          name: subject.name,
-          type: comp.type,
-          hours: comp.hours,
-          batches: comp.batches || 1,
-          labDuration: comp.labDuration || 2
-        }));
+    // STEP 6a: Background solve - the client follows progress on the events stream
+    if (runAsync) {
+      const job = await startPythonJob(payload);
+      console.log(` Scheduler job started: ${job.job_id}`);
+      return res.status(202).json({
+        success: true,
+        status: job.status,
+        message: `Timetable generation started for ${department}`,
+        department,
+        jobId: job.job_id,
+        eventsUrl: `/api/scheduler/jobs/${job.job_id}/events`,
+        cancelUrl: `/api/scheduler/jobs/${job.job_id}/cancel`
       });
-
-      enrichedYears[yearName] = {
-        ...yearData,
-        subjects: mappedSubjects
-      };
     }
 
-    // STEP 4: Fetch saved timetables for this department
-    const savedTimetables = await timetableModel.find({ 
-      department 
-    })
-    .sort({ createdAt: -1 })
-    .limit(5)
-    .lean();
-
-    //  STEP 5: Use teachers from wizard (already in correct format)
-    const payload = {
-      years: enrichedYears,
-      rooms: departmentRooms.map(r => ({
-        name: r.name,
-        type: r.type,
-        capacity: r.capacity,
-        labCategory: r.labCategory || "None",
-        primaryYear: r.primaryYear || "Shared"
-      })),
-      teachers: departmentTeachers,  // Use directly - already has subjects
-      saved_timetables: savedTimetables.map(tt => ({
-        year: tt.year,
-        division: tt.division,
-        timetableData: tt.timetableData
-      })),
-      roomMappings: roomMappings || {}
-    };
-
-    console.log("Sending payload to Python scheduler...");
-    console.log(`Years: ${Object.keys(enrichedYears).length}`);
-    console.log(`Total subjects: ${Object.values(enrichedYears).reduce((sum, y) => sum + y.subjects.length, 0)}`);
-    console.log(`Rooms: ${departmentRooms.length}`);
-    console.log(`Teachers: ${departmentTeachers.length}`);
-    console.log(`Teachers with subjects: ${departmentTeachers.filter(t => (t.subjects || []).length > 0).length}`);
-
     // STEP 6: Call Python scheduler
-    const result = await callPythonScheduler(payload);
+    const result = await callPythonScheduler(payload, { profile });
 
     console.log(` Scheduler completed with status: ${result.status}`);
 
@@ -156,9 +203,19 @@ export const generateTimetable = async (req, res) => {
       room_conflicts: result.room_conflicts || [],
       unallocated: result.unallocated || [],
       recommendations: result.recommendations || [],
+      recommendations_deferred: result.recommendations_deferred || false,
+      recommendation_handle: result.recommendation_handle || null,
       warnings: result.warnings || [],
       critical_issues: result.critical_issues || [],
-      lab_conflicts: result.lab_conflicts || []
+      lab_conflicts: result.lab_conflicts || [],
+      deadline_reached: result.deadline_reached || false,
+      cancelled: result.cancelled || false,
+      not_attempted: result.not_attempted || [],
+      warm_start: result.warm_start || null,
+      quality: result.quality || null,
+      profile: result.profile || null,
+      diff: result.diff || null,
+      timetables_omitted: result.timetables_omitted || false
     });
 
   } catch (error) {
@@ -180,4 +237,165 @@ export const generateTimetable = async (req, res) => {
       error: error.toString()
     });
   }
-};
\ No newline at end of file
+};
+// Institution-wide run: { departments: { <name>: { years, roomMappings, teachers, warmStart } } }.
+// Independent departments are solved in parallel; shared rooms are arbitrated
+// by the scheduler. Results are returned for review, nothing is saved.
+export const generateBatchTimetables = async (req, res) => {
+  try {
+    const departments = req.body.departments || {};
+    const names = Object.keys(departments);
+
+    if (names.length === 0) {
+      return res.status(400).json({
+        success: false,
+        message: "No departments to generate"
+      });
+    }
+
+    console.log(`🎯 Generating timetables for departments: ${names.join(", ")}`);
+
+    const payloads = {};
+    for (const department of names) {
+      try {
+        payloads[department] = await buildDepartmentPayload(department, departments[department]);
+      } catch (error) {
+        if (error instanceof PayloadBuildError) {
+          return res.status(400).json({ success: false, department, message: error.message });
+        }
+        throw error;
+      }
+    }
+
+    const report = await callPythonBatch({
+      departments: payloads,
+      timeLimit: Number(process.env.SCHEDULER_TIME_LIMIT) || 180
+    });
+
+    console.log(` Batch completed with status: ${report.status} in ${report.seconds}s`);
+
+    return res.json({
+      success: true,
+      status: report.status,
+      message: `Timetables generated for ${names.length} departments`,
+      departments: report.departments,
+      groups: report.groups,
+      shared_rooms: report.shared_rooms,
+      shared_teachers: report.shared_teachers,
+      cross_department_conflicts: report.cross_department_conflicts
+    });
+
+  } catch (error) {
+    console.error(" Batch scheduler error:", error);
+    return res.status(500).json({
+      success: false,
+      status: "error",
+      message: error.response?.data?.error || error.message || "Failed to generate timetables"
+    });
+  }
+};
+
+// "How many lab rooms / teachers do we need?": sweeps resource dimensions of the
+// department's payload, e.g. dimensions: [{ resource: "rooms", roomType: "Lab", min: 1, max: 8 }]
+export const sweepCapacity = async (req, res) => {
+  try {
+    const { dimensions, targetUnallocatedHours } = req.body;
+    const department = req.adminDepartment;
+
+    if (!department) {
+      return res.status(400).json({
+        success: false,
+        message: "Department not found for admin"
+      });
+    }
+
+    let payload;
+    try {
+      payload = await buildDepartmentPayload(department, req.body);
+    } catch (error) {
+      if (error instanceof PayloadBuildError) {
+        return res.status(400).json({ success: false, message: error.message });
+      }
+      throw error;
+    }
+
+    const report = await callPythonCapacitySweep({
+      ...payload,
+      dimensions,
+      targetUnallocatedHours: targetUnallocatedHours || 0
+    });
+
+    console.log(` Capacity sweep for ${department}: ${report.evaluations} variants, minimal ${JSON.stringify(report.minimal)}`);
+
+    return res.json({ success: true, department, ...report });
+
+  } catch (error) {
+    console.error(" Capacity sweep error:", error.response?.data || error.message);
+    return res.status(error.response?.status === 400 ? 400 : 500).json({
+      success: false,
+      status: "error",
+      message: error.response?.data?.error || error.message,
+      payload_errors: error.response?.data?.payload_errors
+    });
+  }
+};
+
+const relayJobError = (res, error) => {
+  console.error(" Scheduler job error:", error.response?.data || error.message);
+  return res.status(error.response?.status || 500).json({
+    success: false,
+    status: "error",
+    message: error.response?.data?.error || error.message
+  });
+};
+
+export const getGenerationJob = async (req, res) => {
+  try {
+    const job = await getPythonJob(req.params.jobId);
+    return res.json({ success: true, ...job });
+  } catch (error) {
+    return relayJobError(res, error);
+  }
+};
+
+export const cancelGenerationJob = async (req, res) => {
+  try {
+    const job = await cancelPythonJob(req.params.jobId);
+    return res.json({ success: true, ...job });
+  } catch (error) {
+    return relayJobError(res, error);
+  }
+};
+
+// Recommendations of a solve generated with { deferRecommendations: true }.
+// body: { sessions } (indexes into unallocated), plus the result's unallocated and
+// lab_conflicts and the payload's teachers and rooms if the handle may have expired
+export const getRecommendations = async (req, res) => {
+  try {
+    const recommendations = await getPythonRecommendations(req.params.handle, req.body || {});
+    return res.json({ success: true, ...recommendations });
+  } catch (error) {
+    return relayJobError(res, error);
+  }
+};
+
+// Relay the scheduler's server-sent progress events unchanged
+export const streamGenerationJob = async (req, res) => {
+  let upstream;
+  try {
+    upstream = await streamPythonJobEvents(req.params.jobId);
+  } catch (error) {
+    return relayJobError(res, error);
+  }
+
+  res.writeHead(200, {
+    "Content-Type": "text/event-stream",
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no"
+  });
+  upstream.pipe(res);
+  upstream.on("error", () => res.end());
+  // The browser went away: stop reading (the job keeps running until cancelled)
+  req.on("close", () => upstream.destroy());
+};
@@ -1,4 +1,5 @@
 import timetableModel from "../models/timetableModel.js";
+import { streamPythonExport } from "../utils/callPython.js";
 
 export const saveTimetable = async (req, res) => {
   try {
@@ -190,4 +191,60 @@ export const deleteTimetable = async (req, res) => {
       error: error.message
     });
   }
-};
\ No newline at end of file
+};
+
+// Calendar feed of the department's saved timetables for one teacher or room
+// (or all of them): GET /export/:format?resource=teacher|room&name=&termStart=&weeks=
+export const exportTimetables = async (req, res) => {
+  const { format } = req.params;
+  const { resource, name, termStart, weeks, timezone } = req.query;
+
+  let upstream;
+  try {
+    const filter = {};
+    if (req.adminRole !== "superadmin") {
+      filter.department = req.adminDepartment;
+    }
+    const timetables = await timetableModel
+      .find(filter)
+      .select("year division timetableData timeConfig")
+      .lean();
+
+    upstream = await streamPythonExport(format, {
+      resource,
+      name,
+      termStart,
+      weeks,
+      timezone,
+      saved_timetables: timetables.map(tt => ({
+        year: tt.year,
+        division: tt.division,
+        timetableData: tt.timetableData,
+        timeConfig: tt.timeConfig
+      }))
+    });
+  } catch (error) {
+    if (error.response) {
+      // Error bodies arrive as a stream too
+      let text = "";
+      for await (const chunk of error.response.data) text += chunk;
+      let details;
+      try { details = JSON.parse(text); } catch { details = { error: text }; }
+      return res.status(error.response.status).json({
+        success: false,
+        message: details.error || "Export failed",
+        error: details
+      });
+    }
+    console.error("Export timetable error:", error);
+    return res.status(500).json({ success: false, message: "Failed to export timetable", error: error.message });
+  }
+
+  res.writeHead(200, {
+    "Content-Type": upstream.headers["content-type"],
+    "Content-Disposition": upstream.headers["content-disposition"]
+  });
+  upstream.data.pipe(res);
+  upstream.data.on("error", () => res.end());
+  req.on("close", () => upstream.data.destroy());
+};
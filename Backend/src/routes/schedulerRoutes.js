@@ -1,5 +1,13 @@
-import { generateTimetable } from "../controllers/schedulerController.js";
-import { adminAuth, blockSuperadminGeneration } from "../middleware/adminAuth.js";
+import {
+  generateTimetable,
+  generateBatchTimetables,
+  sweepCapacity,
+  getGenerationJob,
+  cancelGenerationJob,
+  streamGenerationJob,
+  getRecommendations
+} from "../controllers/schedulerController.js";
+import { adminAuth, superAdminAuth, blockSuperadminGeneration } from "../middleware/adminAuth.js";
 import express from "express";
 
 const schedulerRouter = express.Router();
@@ -7,4 +15,18 @@ const schedulerRouter = express.Router();
 // Add blockSuperadminGeneration to prevent superadmin from generating
 schedulerRouter.post("/generate", adminAuth, blockSuperadminGeneration, generateTimetable);
 
+// Minimum rooms/teachers for zero unallocated hours (nothing is saved)
+schedulerRouter.post("/capacity", adminAuth, blockSuperadminGeneration, sweepCapacity);
+
+// Institution-wide preview across departments (results are not saved)
+schedulerRouter.post("/generate/batch", superAdminAuth, generateBatchTimetables);
+
+// Background generation started with { async: true }
+schedulerRouter.get("/jobs/:jobId", adminAuth, getGenerationJob);
+schedulerRouter.get("/jobs/:jobId/events", adminAuth, streamGenerationJob);
+schedulerRouter.post("/jobs/:jobId/cancel", adminAuth, cancelGenerationJob);
+
+// Recommendations of a generation run with { deferRecommendations: true }
+schedulerRouter.post("/recommendations/:handle", adminAuth, getRecommendations);
+
 export default schedulerRouter;
\ No newline at end of file
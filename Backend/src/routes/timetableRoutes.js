@@ -5,7 +5,8 @@ import {
   saveTimetable, 
   getAllTimetables, 
   deleteTimetable, 
-  getAllIndividualTimetables
+  getAllIndividualTimetables,
+  exportTimetables
 } from "../controllers/timetableController.js";
 
 const timetableRouter = express.Router();
@@ -22,5 +23,7 @@ timetableRouter.post("/save", adminAuth, saveTimetable);
 timetableRouter.get("/individual",  getAllIndividualTimetables); // New route for individual timetables
 timetableRouter.get("/all", combinedAuth, getAllTimetables); // Changed
 timetableRouter.delete("/delete/:id", adminAuth, deleteTimetable);
+// Per-teacher / per-room calendars (csv or ics), streamed from the scheduler
+timetableRouter.get("/export/:format", adminAuth, exportTimetables);
 
 export default timetableRouter;
\ No newline at end of file
@@ -1,10 +1,52 @@
 import axios from "axios";
 
-export async function callPythonScheduler(payload) {
+// profile: "cprofile" | "sampling" to profile this solve (needs SCHEDULER_PROFILE_TOKEN)
+export async function callPythonScheduler(payload, { profile } = {}) {
   try {
+    const headers = {};
+    if (profile && process.env.SCHEDULER_PROFILE_TOKEN) {
+      headers["X-Scheduler-Profile"] = profile === true ? "cprofile" : String(profile);
+      headers["X-Scheduler-Profile-Token"] = process.env.SCHEDULER_PROFILE_TOKEN;
+    }
     const response = await axios.post(
       `${process.env.PYTHON_API_URL}/generate`,
       payload,
+      { timeout: 200000, headers }
+    );
+
+    return response.data;
+
+  } catch (err) {
+    console.error("PYTHON FULL ERROR: ");
+    console.error(err.response?.data || err.message);
+    throw err;
+  }
+}
+
+// Several departments in one run ({ departments: { name: payload }, timeLimit })
+export async function callPythonBatch(payload) {
+  try {
+    const response = await axios.post(
+      `${process.env.PYTHON_API_URL}/generate/batch`,
+      payload,
+      { timeout: 200000 }
+    );
+
+    return response.data;
+
+  } catch (err) {
+    console.error("PYTHON FULL ERROR: ");
+    console.error(err.response?.data || err.message);
+    throw err;
+  }
+}
+
+// Capacity sweep: the base payload plus "dimensions" to vary
+export async function callPythonCapacitySweep(payload) {
+  try {
+    const response = await axios.post(
+      `${process.env.PYTHON_API_URL}/capacity/sweep`,
+      payload,
       { timeout: 200000 }
     );
 
@@ -16,3 +58,64 @@ export async function callPythonScheduler(payload) {
     throw err;
   }
 }
+
+// ----- Background jobs with progress events -----
+// Jobs live in the Python worker that started them, so these calls must reach
+// the same scheduler instance (a single worker, or sticky routing).
+
+export async function startPythonJob(payload) {
+  const response = await axios.post(
+    `${process.env.PYTHON_API_URL}/jobs`,
+    payload,
+    { timeout: 30000 }
+  );
+  return response.data;
+}
+
+export async function getPythonJob(jobId) {
+  const response = await axios.get(
+    `${process.env.PYTHON_API_URL}/jobs/${encodeURIComponent(jobId)}`,
+    { timeout: 30000 }
+  );
+  return response.data;
+}
+
+export async function cancelPythonJob(jobId) {
+  const response = await axios.post(
+    `${process.env.PYTHON_API_URL}/jobs/${encodeURIComponent(jobId)}/cancel`,
+    {},
+    { timeout: 30000 }
+  );
+  return response.data;
+}
+
+// Recommendations of a solve made with deferRecommendations. body: { sessions }
+// (indexes into unallocated; all when omitted). A worker that does not know the
+// handle rebuilds it from { unallocated, lab_conflicts, teachers, rooms }.
+export async function getPythonRecommendations(handle, body = {}) {
+  const response = await axios.post(
+    `${process.env.PYTHON_API_URL}/recommendations/${encodeURIComponent(handle)}`,
+    body,
+    { timeout: 30000 }
+  );
+  return response.data;
+}
+
+// Server-sent event stream of a job; resolves to a readable stream
+export async function streamPythonJobEvents(jobId) {
+  const response = await axios.get(
+    `${process.env.PYTHON_API_URL}/jobs/${encodeURIComponent(jobId)}/events`,
+    { responseType: "stream", timeout: 0 }
+  );
+  return response.data;
+}
+
+// Calendar export (format: "csv" | "ics"). Resolves with the upstream response
+// so headers and the chunked body can be relayed as they arrive.
+export async function streamPythonExport(format, body) {
+  return axios.post(
+    `${process.env.PYTHON_API_URL}/export/${encodeURIComponent(format)}`,
+    body,
+    { responseType: "stream", timeout: 0 }
+  );
+}
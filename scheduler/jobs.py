@@ -0,0 +1,161 @@
+"""
+Background solve jobs with server-sent progress events.
+
+A job runs one solve in a background thread (through the worker's admission
+control) and buffers the solver's progress events: phase start/end,
+placements so far, unallocated hours and an ETA. Any number of clients can
+stream them as SSE; a late subscriber first gets the events it missed. The
+last event is "done" and carries the full result. Cancelling a job stops
+the solve at its next deadline check and still returns the partial result.
+
+Jobs live in the worker process that created them. Behind several gunicorn
+workers, /jobs/<id>/... calls need sticky routing to that worker; the
+single-request /generate/stream endpoint has no such requirement.
+"""
+import json
+import threading
+import time
+import uuid
+
+from solver.core.deadline import Deadline
+from solver.diff import response_result
+from solver.timetable_solver import solve_timetable
+from serving import AdmissionRejected, env_int
+
+JOB_TTL_SECONDS = env_int("SCHEDULER_JOB_TTL", 600)
+MAX_FINISHED_JOBS = env_int("SCHEDULER_MAX_FINISHED_JOBS", 50)
+HEARTBEAT_SECONDS = 15
+
+
+def format_sse(event):
+    return f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+class Job:
+    def __init__(self, deadline):
+        self.id = uuid.uuid4().hex
+        self.deadline = deadline
+        self.status = "queued"
+        self.events = []
+        self.result = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    def publish(self, event):
+        with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    def set_status(self, status):
+        self.status = status
+        self.publish({"event": "status", "status": status})
+
+    def finish(self, status, result):
+        with self._changed:
+            self.status = status
+            self.result = result
+            self.finished_at = time.time()
+            self.events.append({"event": "done", "status": status, "result": response_result(result)})
+            self._changed.notify_all()
+
+    def cancel(self):
+        if not self.finished:
+            self.deadline.cancel()
+            self.publish({"event": "cancel_requested"})
+
+    def summary(self, include_result=True):
+        summary = {
+            "job_id": self.id,
+            "status": self.status,
+            "events": len(self.events),
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+        progress = [e for e in self.events if e["event"] == "phase_end"]
+        if progress:
+            summary["progress"] = {k: v for k, v in progress[-1].items() if k != "class_timetable"}
+        if include_result and self.finished:
+            summary["result"] = response_result(self.result)
+        return summary
+
+    def stream(self, cancel_on_disconnect=False):
+        """SSE frames: every event so far, then new ones until the job is done."""
+        index = 0
+        try:
+            while True:
+                with self._changed:
+                    if index >= len(self.events) and not self.finished:
+                        self._changed.wait(HEARTBEAT_SECONDS)
+                    pending = self.events[index:]
+                    index += len(pending)
+                    done = self.finished and index == len(self.events)
+                if not pending:
+                    yield ": keep-alive\n\n"
+                for event in pending:
+                    yield format_sse(event)
+                if done:
+                    return
+        except GeneratorExit:
+            # The client went away; a single-request stream has nobody left to deliver to
+            if cancel_on_disconnect:
+                self.cancel()
+            raise
+
+
+class JobStore:
+    """Jobs of this worker process, finished ones kept for JOB_TTL_SECONDS."""
+
+    def __init__(self, admission, on_result=None):
+        self.admission = admission
+        self.on_result = on_result
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+    def start(self, payload, deadline=None):
+        job = Job(Deadline.coerce(deadline))
+        with self._lock:
+            self._prune()
+            self.jobs[job.id] = job
+        job.publish({"event": "queued", "job_id": job.id})
+        threading.Thread(target=self._run, args=(job, payload), daemon=True).start()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _run(self, job, payload):
+        try:
+            with self.admission.admit():
+                job.set_status("running")
+                result = solve_timetable(payload, job.deadline, progress=job.publish)
+            if self.on_result:
+                self.on_result(result)
+            if result.get("cancelled"):
+                status = "cancelled"
+            elif result.get("status") == "error":
+                status = "failed"
+            else:
+                status = "done"
+            job.finish(status, result)
+        except AdmissionRejected as e:
+            job.finish("rejected", {"error": str(e), "status": "rejected"})
+        except Exception as e:
+            print(f"Job {job.id} failed: {e}")
+            job.finish("failed", {"error": str(e), "status": "error"})
+
+    def _prune(self):
+        now = time.time()
+        finished = sorted(
+            (job for job in self.jobs.values() if job.finished),
+            key=lambda job: job.finished_at
+        )
+        expired = [job for job in finished if now - job.finished_at > JOB_TTL_SECONDS]
+        overflow = finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]
+        for job in expired + overflow:
+            self.jobs.pop(job.id, None)
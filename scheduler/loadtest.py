@@ -0,0 +1,515 @@
+"""
+Load test of the scheduler service's /generate endpoint, on one machine.
+
+    python loadtest.py [--url http://127.0.0.1:6000]
+        [--spawn production|dev]  start main.py for the run (and stop it after)
+        [--workers N] [--worker-concurrency N] [--queue-size N]
+                                  serving settings for the spawned service
+        [--pid PID]               service process to measure when not spawned
+        [--concurrency 1,2,4,8]   concurrent callers; one run per level
+        [--duration S]            seconds per level (default 30)
+        [--mix small=6,medium=3,large=1]  synthetic payload sizes and weights
+        [--records DIR]           replay recorded payloads (recorder.py) instead
+        [--time-limit S]          timeLimit sent with every payload
+        [--timeout S]             client timeout (default 200, as the backend)
+        [--output report.json]    write the full report
+
+Callers stand in for the Node backend: each one posts a payload the way
+callPythonScheduler does (one JSON POST per solve, no retries, a 200 second
+timeout) and sends the next as soon as the answer arrives, or after the
+Retry-After delay when it was rejected. Every level of
+--concurrency runs for --duration seconds; solves still running when it ends
+are waited for and counted.
+
+Per level the report gives throughput (answered solves per second), p50, p95
+and p99 latency of successful solves, and the share of errors (5xx, 4xx other
+than 429, refused connections), rejections (429 from admission control) and
+client timeouts. Worker memory is the resident set size of the service's
+processes, sampled every half second from /proc: the peak of a single worker
+and of all of them together. It needs the service's pid, so it is only
+reported with --spawn or --pid.
+
+"Sustained" is the highest level whose error, rejection and timeout rate
+together stay under --max-failure-rate and whose p95 stays under --max-p95,
+when given: the concurrency a deployment of this shape can take.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+SIZES = {
+    # years, divisions per year, theory subjects, lab subjects per year
+    "small": (1, 1, 4, 1),
+    "medium": (2, 2, 5, 2),
+    "large": (4, 3, 6, 2),
+}
+YEAR_NAMES = ("FE", "SE", "TE", "BE")
+
+
+# ----- synthetic payloads ----------------------------------------------------------
+
+def make_payload(size, seed=0, time_limit=None):
+    """A /generate payload of one of SIZES, with enough teachers and rooms to solve."""
+    years_count, divisions, theory, labs = SIZES[size]
+    rnd = random.Random(f"{size}-{seed}")
+    years = {}
+    teachers = []
+    for year in YEAR_NAMES[:years_count]:
+        subjects = [
+            {"code": f"{year}-T{i}", "name": f"{year} Theory {i}", "type": "Theory", "hours": rnd.choice((2, 3, 3, 4))}
+            for i in range(theory)
+        ]
+        subjects += [
+            {"code": f"{year}-L{i}", "name": f"{year} Lab {i}", "type": "Lab", "hours": 2,
+             "batches": 3, "labDuration": 2}
+            for i in range(labs)
+        ]
+        subjects.append({"code": f"{year}-TUT", "name": f"{year} Tutorial", "type": "Tutorial",
+                         "hours": 1, "batches": 3, "labDuration": 1})
+        years[year] = {
+            "divisions": divisions,
+            "subjects": subjects,
+            "holidays": ["Sat", "Sun"],
+            "timeConfig": {"startTime": "09:00", "endTime": "17:00", "periodDuration": 60,
+                           "lunchStart": "13:00", "lunchDuration": 60},
+        }
+        for subject in subjects:
+            for _ in range(max(1, divisions)):
+                teachers.append({
+                    "name": f"Teacher {len(teachers) + 1}",
+                    "subjects": [{"code": subject["code"]}],
+                    "maxHoursPerDay": rnd.choice((4, 5, 6)),
+                })
+
+    rooms = [{"name": f"Lab {i + 1}", "type": "Lab", "capacity": 30} for i in range(2 + years_count * divisions)]
+    rooms += [{"name": f"Classroom {i + 1}", "type": "Classroom", "capacity": 60}
+              for i in range(1 + years_count * divisions)]
+    payload = {"years": years, "teachers": teachers, "rooms": rooms,
+               "saved_timetables": [], "roomMappings": {}, "seed": seed}
+    if time_limit is not None:
+        payload["timeLimit"] = time_limit
+    return payload
+
+
+def parse_mix(text):
+    """"small=6,medium=3" -> [(size, weight)]."""
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in SIZES:
+            raise argparse.ArgumentTypeError(f"unknown payload size {name!r}, expected one of {list(SIZES)}")
+        try:
+            mix.append((name, float(weight or 1)))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"bad weight for {name}: {weight!r}")
+    return mix
+
+
+def parse_levels(text):
+    try:
+        levels = [int(part) for part in text.split(",") if part.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma separated integers, got {text!r}")
+    if not levels or min(levels) < 1:
+        raise argparse.ArgumentTypeError("concurrency levels must be positive")
+    return levels
+
+
+class PayloadSource:
+    """Encoded payloads, picked at random by weight. Thread-safe."""
+
+    def __init__(self, bodies, seed=0):
+        self.bodies = bodies            # [(label, weight, bytes)]
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+
+    @classmethod
+    def synthetic(cls, mix, time_limit=None, variants=4):
+        bodies = []
+        for size, weight in mix:
+            for seed in range(variants):
+                body = json.dumps(make_payload(size, seed, time_limit)).encode()
+                bodies.append((size, weight / variants, body))
+        return cls(bodies)
+
+    @classmethod
+    def recorded(cls, directory, time_limit=None):
+        # Imported only here: recorder pulls in the solver through serving
+        from recorder import list_records, read_record
+        bodies = []
+        for path in list_records(directory):
+            payload = read_record(path)["payload"]
+            if time_limit is not None:
+                payload["timeLimit"] = time_limit
+            bodies.append((os.path.basename(path), 1.0, json.dumps(payload).encode()))
+        return cls(bodies)
+
+    def pick(self):
+        with self.lock:
+            label, _, body = self.rnd.choices(self.bodies, weights=[w for _, w, _ in self.bodies])[0]
+        return label, body
+
+
+# ----- the stand-in backend client -------------------------------------------------
+
+class StandInBackend:
+    """Posts payloads to /generate like the Node backend's callPythonScheduler."""
+
+    def __init__(self, url, timeout=200.0):
+        parsed = urllib.parse.urlsplit(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 80
+        self.path = (parsed.path.rstrip("/") or "") + "/generate"
+        self.timeout = timeout
+
+    def call(self, body):
+        """One solve: (outcome, HTTP status or None, seconds, Retry-After seconds or None)."""
+        started = time.perf_counter()
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request("POST", self.path, body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+            retry_after = response.getheader("Retry-After")
+        except (socket.timeout, TimeoutError):
+            return "timeout", None, time.perf_counter() - started, None
+        except (OSError, http.client.HTTPException):
+            return "error", None, time.perf_counter() - started, None
+        finally:
+            connection.close()
+        seconds = time.perf_counter() - started
+        if status == 429:
+            try:
+                return "rejected", status, seconds, float(retry_after)
+            except (TypeError, ValueError):
+                return "rejected", status, seconds, None
+        if status >= 300:
+            return "error", status, seconds, None
+        return "ok", status, seconds, None
+
+
+# ----- the service under test ------------------------------------------------------
+
+def _get(url, timeout=2.0):
+    parsed = urllib.parse.urlsplit(url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=timeout)
+    try:
+        connection.request("GET", parsed.path or "/")
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    except OSError:
+        return None
+    finally:
+        connection.close()
+
+
+def spawn_service(mode, url, settings, log_path, ready_timeout=180):
+    """Start main.py in mode ("production" or "dev") and wait until /readyz answers 200."""
+    env = dict(os.environ, PORT=str(urllib.parse.urlsplit(url).port or 80))
+    env.update({key: str(value) for key, value in settings.items() if value is not None})
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")]
+    if mode == "production":
+        command.append("--production")
+    log = open(log_path, "ab") if log_path else subprocess.DEVNULL
+    process = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    deadline = time.monotonic() + ready_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"scheduler exited with status {process.returncode} while starting")
+        if _get(url.rstrip("/") + "/readyz") == 200:
+            return process
+        time.sleep(0.5)
+    stop_service(process)
+    raise RuntimeError(f"scheduler not ready after {ready_timeout}s")
+
+
+def stop_service(process):
+    process.terminate()
+    try:
+        process.wait(timeout=40)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def _children():
+    """ppid -> [pid] for every process on the machine."""
+    children = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                # The command name may contain spaces; fields after it are fixed
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(name))
+    return children
+
+
+def _rss_kb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+class MemorySampler:
+    """
+    Peak resident memory of a service process tree. Workers are the root's
+    children (gunicorn), or the root itself when it has none (dev server).
+    """
+
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = None
+        self.reset()
+
+    def reset(self):
+        self.peak_worker_kb = 0
+        self.peak_total_kb = 0
+        self.workers = 0
+
+    def sample(self):
+        workers = _children().get(self.pid, []) or [self.pid]
+        sizes = [_rss_kb(pid) for pid in workers]
+        total = sum(sizes) + (_rss_kb(self.pid) if workers != [self.pid] else 0)
+        self.workers = max(self.workers, len(workers))
+        self.peak_worker_kb = max(self.peak_worker_kb, max(sizes, default=0))
+        self.peak_total_kb = max(self.peak_total_kb, total)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.sample()
+        self.thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+
+# ----- the load ---------------------------------------------------------------------
+
+def percentile(values, q):
+    """Nearest-rank percentile of a sorted list, or None."""
+    if not values:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+def run_level(client, source, concurrency, duration):
+    """concurrency callers for duration seconds. Returns (wall seconds, [(label, outcome, status, seconds)])."""
+    results = []
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def caller():
+        while time.perf_counter() < stop_at:
+            label, body = source.pick()
+            outcome, status, seconds, retry_after = client.call(body)
+            with lock:
+                results.append((label, outcome, status, seconds))
+            if outcome == "rejected":
+                # A rejected user tries again later, not in a tight loop
+                time.sleep(max(0.0, min(retry_after or 1.0, stop_at - time.perf_counter())))
+            elif outcome == "error" and status is None:
+                time.sleep(0.1)     # the service is down; don't spin
+
+    started = time.perf_counter()
+    callers = [threading.Thread(target=caller, name=f"caller-{i}", daemon=True) for i in range(concurrency)]
+    for thread in callers:
+        thread.start()
+    for thread in callers:
+        thread.join()
+    return time.perf_counter() - started, results
+
+
+def summarize(concurrency, wall, results, memory=None):
+    total = len(results)
+    ok = sorted(seconds for _, outcome, _, seconds in results if outcome == "ok")
+    counts = {kind: sum(1 for _, outcome, _, _ in results if outcome == kind)
+              for kind in ("ok", "error", "rejected", "timeout")}
+    statuses = {}
+    for _, _, status, _ in results:
+        key = str(status) if status is not None else "none"
+        statuses[key] = statuses.get(key, 0) + 1
+
+    by_payload = {}
+    for label in sorted({label for label, _, _, _ in results}):
+        times = sorted(s for l, outcome, _, s in results if l == label and outcome == "ok")
+        by_payload[label] = {
+            "requests": sum(1 for l, _, _, _ in results if l == label),
+            "ok": len(times),
+            "p50": _round(percentile(times, 50)),
+            "p95": _round(percentile(times, 95)),
+        }
+
+    def rate(kind):
+        return round(counts[kind] / total, 4) if total else 0.0
+
+    return {
+        "concurrency": concurrency,
+        "seconds": round(wall, 2),
+        "requests": total,
+        "ok": counts["ok"],
+        "throughput": round(counts["ok"] / wall, 3) if wall else 0.0,
+        "p50": _round(percentile(ok, 50)),
+        "p95": _round(percentile(ok, 95)),
+        "p99": _round(percentile(ok, 99)),
+        "max": _round(ok[-1] if ok else None),
+        "error_rate": rate("error"),
+        "rejected_rate": rate("rejected"),
+        "timeout_rate": rate("timeout"),
+        "statuses": statuses,
+        "by_payload": by_payload,
+        "memory": memory,
+    }
+
+
+def _round(value):
+    return round(value, 4) if value is not None else None
+
+
+def sustained_level(levels, max_failure_rate, max_p95=None):
+    """Highest concurrency within the failure and p95 limits, or None."""
+    best = None
+    for level in levels:
+        failures = level["error_rate"] + level["rejected_rate"] + level["timeout_rate"]
+        if failures > max_failure_rate or not level["ok"]:
+            continue
+        if max_p95 is not None and (level["p95"] is None or level["p95"] > max_p95):
+            continue
+        best = level["concurrency"] if best is None else max(best, level["concurrency"])
+    return best
+
+
+def _ms(value):
+    return f"{value * 1000:.0f}" if value is not None else "-"
+
+
+def _print_level(level):
+    memory = level["memory"] or {}
+    worker = f"{memory['peak_worker_mb']:.0f}" if memory else "-"
+    total = f"{memory['peak_total_mb']:.0f}" if memory else "-"
+    print(f"{level['concurrency']:>5} {level['requests']:>8} {level['throughput']:>8.2f} "
+          f"{_ms(level['p50']):>8} {_ms(level['p95']):>8} {_ms(level['p99']):>8} "
+          f"{100 * level['error_rate']:>6.1f}% {100 * level['rejected_rate']:>6.1f}% "
+          f"{100 * level['timeout_rate']:>6.1f}% {worker:>8} {total:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the scheduler's /generate endpoint.")
+    parser.add_argument("--url", default="http://127.0.0.1:6000")
+    parser.add_argument("--spawn", choices=("production", "dev"), help="start main.py for the run")
+    parser.add_argument("--workers", type=int, help="SCHEDULER_WORKERS for --spawn")
+    parser.add_argument("--worker-concurrency", type=int, help="SCHEDULER_WORKER_CONCURRENCY for --spawn")
+    parser.add_argument("--queue-size", type=int, help="SCHEDULER_QUEUE_SIZE for --spawn")
+    parser.add_argument("--server-log", help="file for the spawned service's output (default: discarded)")
+    parser.add_argument("--pid", type=int, help="pid of a running service (gunicorn master) to measure")
+    parser.add_argument("--concurrency", type=parse_levels, default=[1, 2, 4, 8])
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("small=6,medium=3,large=1"))
+    parser.add_argument("--records", help="directory of recorded payloads to send instead of synthetic ones")
+    parser.add_argument("--time-limit", type=float)
+    parser.add_argument("--timeout", type=float, default=200.0)
+    parser.add_argument("--warmup", type=int, default=2, help="unmeasured requests before the first level")
+    parser.add_argument("--max-failure-rate", type=float, default=0.01)
+    parser.add_argument("--max-p95", type=float, help="p95 seconds a sustained level must stay under")
+    parser.add_argument("--output")
+    args = parser.parse_args(argv)
+
+    if args.records:
+        source = PayloadSource.recorded(args.records, args.time_limit)
+        if not source.bodies:
+            parser.error("no recordings found")
+    else:
+        source = PayloadSource.synthetic(args.mix, args.time_limit)
+    client = StandInBackend(args.url, args.timeout)
+
+    process = None
+    if args.spawn:
+        settings = {
+            "SCHEDULER_WORKERS": args.workers,
+            "SCHEDULER_WORKER_CONCURRENCY": args.worker_concurrency,
+            "SCHEDULER_QUEUE_SIZE": args.queue_size,
+        }
+        print(f"Starting scheduler ({args.spawn}) on {args.url} ...")
+        process = spawn_service(args.spawn, args.url, settings, args.server_log)
+    elif _get(args.url.rstrip("/") + "/healthz") != 200:
+        parser.error(f"no scheduler answering at {args.url} (start one or use --spawn)")
+    pid = process.pid if process else args.pid
+
+    levels = []
+    try:
+        for _ in range(args.warmup):
+            client.call(source.pick()[1])
+
+        print(f"{'conc':>5} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'errors':>7} {'429':>7} {'timeout':>7} {'wkr MB':>8} {'all MB':>8}")
+        for concurrency in args.concurrency:
+            memory = None
+            if pid:
+                with MemorySampler(pid) as sampler:
+                    wall, results = run_level(client, source, concurrency, args.duration)
+                memory = {
+                    "workers": sampler.workers,
+                    "peak_worker_mb": round(sampler.peak_worker_kb / 1024, 1),
+                    "peak_total_mb": round(sampler.peak_total_kb / 1024, 1),
+                }
+            else:
+                wall, results = run_level(client, source, concurrency, args.duration)
+            level = summarize(concurrency, wall, results, memory)
+            levels.append(level)
+            _print_level(level)
+    finally:
+        if process:
+            stop_service(process)
+
+    sustained = sustained_level(levels, args.max_failure_rate, args.max_p95)
+    print(f"\nSustained concurrency: {sustained if sustained is not None else 'none'} "
+          f"(failures <= {100 * args.max_failure_rate:g}%"
+          + (f", p95 <= {args.max_p95:g}s" if args.max_p95 is not None else "") + ")")
+
+    if args.output:
+        report = {
+            "url": args.url,
+            "spawned": args.spawn,
+            "settings": {"workers": args.workers, "worker_concurrency": args.worker_concurrency,
+                         "queue_size": args.queue_size, "time_limit": args.time_limit,
+                         "timeout": args.timeout, "duration": args.duration},
+            "payloads": sorted({label for label, _, _ in source.bodies}),
+            "levels": levels,
+            "sustained_concurrency": sustained,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
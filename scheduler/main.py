@@ -1,34 +1,316 @@
-from flask import Flask, request, jsonify
-from solver.timetable_solver import solve_timetable
+from flask import Flask, Response, g, request, jsonify
+from werkzeug.exceptions import HTTPException
+from solver.timetable_solver import compare_engines, solve_timetable
+from solver.batch import solve_departments
+from solver.diff import response_result
+from solver.capacity import sweep_capacity
+from solver.export import export_calendar
+from solver.core.deadline import Deadline
+from solver.core.model import PayloadError
+from solver.recommendations.deferred import RECOMMENDATIONS, DeferredRecommendations
+from serving import AdmissionController, AdmissionRejected, env_int, is_warm, run_production, warm_solver
+from metrics import REGISTRY, observe_admission, observe_recording, observe_request, observe_solve
+from jobs import JobStore
+from recorder import PayloadRecorder
+from profiling import ProfileDenied, profile_solve, requested_mode
+import functools
 import os
+import sys
+import time
 import traceback
 
 
 app = Flask(__name__)
+app.config["MAX_CONTENT_LENGTH"] = env_int("SCHEDULER_MAX_BODY_MB", 16) * 1024 * 1024
+
+admission = AdmissionController.from_env()
+admission.on_change = observe_admission
+DEBUG_PAYLOADS = os.environ.get("SCHEDULER_DEBUG") == "1"
+jobs = JobStore(admission, on_result=observe_solve)
+# Anonymized /generate payloads for replay.py, only when SCHEDULER_RECORD_DIR is set
+recorder = PayloadRecorder.from_env(on_outcome=observe_recording)
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    if request.endpoint != "metrics":
+        observe_request(
+            request.endpoint or "unknown",
+            response.status_code,
+            time.perf_counter() - g.request_started,
+            request.content_length if request.endpoint == "generate" else None
+        )
+    return response
 
 @app.route("/", methods=["GET"])
 def home():
     return {"status": "Scheduler running"}
 
+@app.route("/healthz", methods=["GET"])
+def liveness():
+    return {"status": "alive"}
+
+@app.route("/readyz", methods=["GET"])
+def readiness():
+    if not is_warm():
+        return {"status": "warming"}, 503
+    if not admission.has_capacity():
+        return {"status": "busy"}, 503
+    return {"status": "ready"}
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+@app.errorhandler(413)
+def payload_too_large(e):
+    return jsonify({"error": f"Payload exceeds {app.config['MAX_CONTENT_LENGTH']} bytes"}), 413
+
+def payload_error_response(e):
+    return jsonify({"error": str(e), "status": "error", "payload_errors": e.errors}), 400
+
+def busy_response(message="Scheduler is at capacity, retry later"):
+    response = jsonify({"error": message, "status": "rejected"})
+    response.headers["Retry-After"] = "5"
+    return response, 429
+
+def request_payload():
+    """The request's JSON object. Raises PayloadError."""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        raise PayloadError([{"path": "body", "message": "must be a JSON object", "value": type(payload).__name__}])
+    return payload
+
+def request_time_limit(payload):
+    """Per-request time budget in seconds (None: unlimited), defaulting to the service-wide limit. Raises PayloadError."""
+    time_limit = payload.get("timeLimit")
+    if time_limit is None:
+        time_limit = os.environ.get("SOLVER_TIME_LIMIT")
+    try:
+        seconds = Deadline.coerce(time_limit).limit
+    except (TypeError, ValueError):
+        seconds = 0
+    if seconds is not None and seconds <= 0:
+        raise PayloadError([{"path": "timeLimit", "message": "must be a positive, finite number of seconds",
+                             "value": payload.get("timeLimit", time_limit)}])
+    return seconds
+
+def admitted(view):
+    """
+    Run a solving endpoint in one of the worker's admission slots: payload
+    errors answer 400, a full worker 429, anything unexpected 500.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            with admission.admit():
+                return view(*args, **kwargs)
+
+        except PayloadError as e:
+            return payload_error_response(e)
+
+        except AdmissionRejected as e:
+            return busy_response(str(e))
+
+        except HTTPException:
+            raise
+
+        except Exception as e:
+            print("\n=== PYTHON ERROR ===")
+            traceback.print_exc()
+            return jsonify({"error": str(e)}), 500
+    return wrapper
+
 @app.route("/generate", methods=["POST"])
+@admitted
 def generate():
-    try:
-        payload = request.get_json()
-        print("\n=== PAYLOAD RECEIVED ===")
+    payload = request_payload()
+    years = payload.get("years")
+    print(f"\n=== PAYLOAD RECEIVED === {request.content_length or 0} bytes, "
+          f"years={list(years) if isinstance(years, dict) else years}")
+    if DEBUG_PAYLOADS:
         print(payload)
 
-        result = solve_timetable(payload)
-        print("\n=== SOLVER RESULT ===")
+    deadline = request_time_limit(payload)
+    try:
+        profile_mode = requested_mode(request.headers, payload)
+    except ProfileDenied as e:
+        return jsonify({"error": str(e), "status": "error"}), 403
+    if profile_mode:
+        result, profile = profile_solve(profile_mode, solve_timetable, payload, deadline)
+        result["profile"] = profile
+        print(f"\n=== PROFILE === mode={profile_mode} file={profile.get('file')}")
+    else:
+        result = solve_timetable(payload, deadline)
+    observe_solve(result)
+    if recorder:
+        recorder.record(payload, result)
+    print(f"\n=== SOLVER RESULT === status={result.get('status')} "
+          f"unallocated={len(result.get('unallocated', []))}")
+    if DEBUG_PAYLOADS:
         print(result)
 
-        return jsonify(result)
+    if result.get("payload_errors"):
+        return jsonify(result), 400
+    return jsonify(response_result(result))
+
+@app.route("/recommendations/<handle>", methods=["POST"])
+def recommendations(handle):
+    """
+    Recommendations of a solve made with "deferRecommendations": all of them,
+    or {"sessions": [indexes into "unallocated"]}. Handles live in the worker
+    that solved; elsewhere the body must also carry the result's "unallocated"
+    and "lab_conflicts" and the payload's "teachers" and "rooms".
+    """
+    try:
+        body = request_payload() if request.get_data() else {}
+        deferred = RECOMMENDATIONS.get(handle)
+        if deferred is None:
+            if "unallocated" not in body:
+                return jsonify({"error": "Unknown recommendation handle; send the result context to rebuild it"}), 404
+            deferred = DeferredRecommendations.from_context(body, handle)
+            RECOMMENDATIONS.add(deferred)
+        recommendations = deferred.get(body.get("sessions"))
+    except PayloadError as e:
+        return payload_error_response(e)
+    return jsonify({**deferred.summary(), "recommendations": recommendations})
+
+@app.route("/compare", methods=["POST"])
+@admitted
+def compare():
+    """Solve one payload with several engines ("engines": [...], default all) and compare them."""
+    payload = request_payload()
+    report = compare_engines(payload, payload.get("engines"), request_time_limit(payload))
+    print(f"\n=== ENGINE COMPARISON === recommended={report['recommended']}")
+    return jsonify(report)
+
+@app.route("/generate/batch", methods=["POST"])
+@admitted
+def generate_batch():
+    """Solve several departments ("departments": {name: payload}) in one run, sharing rooms safely."""
+    payload = request_payload()
+    report = solve_departments(payload.get("departments"), request_time_limit(payload),
+                               env_int("SCHEDULER_BATCH_WORKERS", 0) or None)
+    for result in report["departments"].values():
+        observe_solve(result)
+    print(f"\n=== BATCH RESULT === status={report['status']} groups={len(report['groups'])} "
+          f"cross_conflicts={len(report['cross_department_conflicts'])}")
+    return jsonify(report)
+
+@app.route("/capacity/sweep", methods=["POST"])
+@admitted
+def capacity_sweep():
+    """Smallest rooms/teachers/daily-hours configuration with no unallocated hours ("dimensions": [...])."""
+    payload = request_payload()
+    report = sweep_capacity(
+        payload,
+        payload.get("dimensions"),
+        request_time_limit(payload),
+        env_int("SCHEDULER_SWEEP_WORKERS", 0) or None,
+        target=payload.get("targetUnallocatedHours", 0),
+        variant_time_limit=payload.get("variantTimeLimit")
+    )
+    print(f"\n=== CAPACITY SWEEP RESULT === minimal={report['minimal']} "
+          f"evaluations={report['evaluations']}")
+    return jsonify(report)
+
+def event_stream(job, cancel_on_disconnect=False):
+    return Response(
+        job.stream(cancel_on_disconnect),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def start_job():
+    """Start a job for the request's payload. Raises PayloadError before anything runs."""
+    payload = request_payload()
+    deadline = request_time_limit(payload)
+    years = payload.get("years")
+    print(f"\n=== JOB PAYLOAD RECEIVED === {request.content_length or 0} bytes, "
+          f"years={list(years) if isinstance(years, dict) else years}")
+    return jobs.start(payload, deadline)
 
-    except Exception as e:
-        print("\n=== PYTHON ERROR ===")
-        traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
+@app.route("/jobs", methods=["POST"])
+def create_job():
+    """Start a background solve; follow it at /jobs/<id>/events, cancel at /jobs/<id>/cancel."""
+    if not admission.has_capacity():
+        return busy_response()
+    try:
+        job = start_job()
+    except PayloadError as e:
+        return payload_error_response(e)
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "events_url": f"/jobs/{job.id}/events",
+        "cancel_url": f"/jobs/{job.id}/cancel"
+    }), 202
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.summary())
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return event_stream(job)
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    job.cancel()
+    return jsonify(job.summary(include_result=False))
+
+@app.route("/generate/stream", methods=["POST"])
+def generate_stream():
+    """Solve with progress events on this response; disconnecting cancels the solve."""
+    if not admission.has_capacity():
+        return busy_response()
+    try:
+        job = start_job()
+    except PayloadError as e:
+        return payload_error_response(e)
+    return event_stream(job, cancel_on_disconnect=True)
+
+@app.route("/export/<fmt>", methods=["POST"])
+def export(fmt):
+    """
+    Stream a teacher or room calendar (csv or ics) built from a class_timetable,
+    saved_timetables, or the result of a finished job ("job_id").
+    """
+    try:
+        body = request_payload()
+        export_request = dict(body, format=fmt)
+        job_id = body.get("job_id")
+        if job_id:
+            job = jobs.get(job_id) if isinstance(job_id, str) else None
+            if job is None or job.result is None:
+                return jsonify({"error": "Unknown or unfinished job"}), 404
+            export_request["class_timetable"] = job.result.get("class_timetable") or {}
+        media_type, filename, chunks = export_calendar(export_request)
+    except PayloadError as e:
+        return payload_error_response(e)
+    return Response(
+        chunks,
+        content_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Accel-Buffering": "no"}
+    )
 
 
 if __name__ == "__main__":
-    port = int(os.environ.get("PORT", 6000))
-    app.run(host="0.0.0.0", port=port)
+    if "--production" in sys.argv or os.environ.get("SCHEDULER_MODE") == "production":
+        run_production(app, admission)
+    else:
+        warm_solver()
+        port = int(os.environ.get("PORT", 6000))
+        app.run(host="0.0.0.0", port=port)
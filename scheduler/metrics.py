@@ -0,0 +1,271 @@
+"""
+Prometheus text-format metrics for the scheduler service.
+
+Each process keeps its own registry. In production mode gunicorn runs several
+workers, so every worker also writes a snapshot of its registry to
+SCHEDULER_METRICS_DIR and /metrics merges the snapshots of all workers.
+"""
+import json
+import os
+import threading
+
+# Seconds; solves range from milliseconds to the 200s Node timeout
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 200)
+SIZE_BUCKETS = (1_000, 10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 5_000_000, 16_000_000)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{name}="{str(value)}"' for name, value in pairs)
+    return "{" + body + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dump(self):
+        return [[list(key), value] for key, value in self.values.items()]
+
+    def merge(self, dumped):
+        for key, value in dumped:
+            key = tuple(tuple(pair) for pair in key)
+            self.values[key] = self.values.get(key, 0) + value
+
+    def render(self):
+        for key, value in sorted(self.values.items()):
+            yield f"{self.name}{_format_labels(key)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """Summed across workers, which is what queue depth and in-flight need."""
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        self.values[_label_key(labels)] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry["counts"][i] += 1
+                break
+        entry["sum"] += value
+        entry["count"] += 1
+
+    def dump(self):
+        return [[list(key), value] for key, value in self.values.items()]
+
+    def merge(self, dumped):
+        for key, value in dumped:
+            key = tuple(tuple(pair) for pair in key)
+            entry = self.values.setdefault(
+                key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            )
+            entry["counts"] = [a + b for a, b in zip(entry["counts"], value["counts"])]
+            entry["sum"] += value["sum"]
+            entry["count"] += value["count"]
+
+    def render(self):
+        for key, entry in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry["counts"]):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(key, [('le', _format_value(bound))])} {cumulative}"
+            yield f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {entry['count']}"
+            yield f"{self.name}_sum{_format_labels(key)} {_format_value(entry['sum'])}"
+            yield f"{self.name}_count{_format_labels(key)} {entry['count']}"
+
+
+class Registry:
+    def __init__(self, snapshot_dir=None):
+        self.metrics = {}
+        self.snapshot_dir = snapshot_dir
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def _empty_copy(self):
+        copy = Registry()
+        for metric in self.metrics.values():
+            if isinstance(metric, Histogram):
+                copy.register(Histogram(metric.name, metric.help, metric.buckets))
+            else:
+                copy.register(type(metric)(metric.name, metric.help))
+        return copy
+
+    def write_snapshot(self):
+        """Persist this process's values so sibling workers can serve them."""
+        if not self.snapshot_dir:
+            return
+        with self.lock:
+            data = {name: metric.dump() for name, metric in self.metrics.items()}
+        path = os.path.join(self.snapshot_dir, f"{os.getpid()}.json")
+        # One temporary file per thread: request threads of a worker write concurrently
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as fh:
+            json.dump(data, fh)
+        os.replace(tmp_path, path)
+
+    def collect(self):
+        """Registry holding the merged values of every worker."""
+        if not self.snapshot_dir:
+            return self
+        self.write_snapshot()
+        merged = self._empty_copy()
+        for filename in os.listdir(self.snapshot_dir):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.snapshot_dir, filename)) as fh:
+                    data = json.load(fh)
+            except (OSError, ValueError):
+                continue
+            for name, dumped in data.items():
+                if name in merged.metrics:
+                    merged.metrics[name].merge(dumped)
+        return merged
+
+    def render(self):
+        registry = self.collect()
+        lines = []
+        with self.lock:
+            for metric in registry.metrics.values():
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                lines.extend(metric.render())
+            lines.extend(_cache_hit_ratio_lines(registry))
+        return "\n".join(lines) + "\n"
+
+
+def mark_process_dead(snapshot_dir, pid):
+    """Drop a dead worker's gauges; its counters and histograms stay in the totals."""
+    path = os.path.join(snapshot_dir, f"{pid}.json")
+    try:
+        with open(path) as fh:
+            data = json.load(fh)
+    except (OSError, ValueError):
+        return
+    for name in (QUEUE_DEPTH.name, IN_FLIGHT.name):
+        data.pop(name, None)
+    with open(path, "w") as fh:
+        json.dump(data, fh)
+
+
+def _cache_hit_ratio_lines(registry):
+    lookups = registry.metrics.get(CACHE_LOOKUPS.name)
+    if not lookups or not lookups.values:
+        return []
+    totals = {}
+    for key, value in lookups.values.items():
+        labels = dict(key)
+        entry = totals.setdefault(labels["cache"], {"hit": 0, "miss": 0})
+        entry[labels["result"]] += value
+    lines = [
+        "# HELP scheduler_cache_hit_ratio Share of cache lookups that were hits",
+        "# TYPE scheduler_cache_hit_ratio gauge"
+    ]
+    for cache, entry in sorted(totals.items()):
+        total = entry["hit"] + entry["miss"]
+        ratio = entry["hit"] / total if total else 0.0
+        lines.append(f'scheduler_cache_hit_ratio{{cache="{cache}"}} {_format_value(ratio)}')
+    return lines
+
+
+REGISTRY = Registry(os.environ.get("SCHEDULER_METRICS_DIR") or None)
+
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    "scheduler_request_duration_seconds", "HTTP request latency by endpoint"))
+REQUESTS = REGISTRY.register(Counter(
+    "scheduler_requests_total", "HTTP requests by endpoint and status code"))
+SOLVE_PHASE_LATENCY = REGISTRY.register(Histogram(
+    "scheduler_solve_phase_duration_seconds", "Solver latency per phase"))
+SOLVE_LATENCY = REGISTRY.register(Histogram(
+    "scheduler_solve_duration_seconds", "End-to-end solver latency"))
+PAYLOAD_SIZE = REGISTRY.register(Histogram(
+    "scheduler_payload_bytes", "Size of /generate request bodies", SIZE_BUCKETS))
+SOLVES = REGISTRY.register(Counter(
+    "scheduler_solves_total", "Solves by result status"))
+PLACEMENTS = REGISTRY.register(Counter(
+    "scheduler_placements_total", "Timetable entries placed"))
+UNALLOCATED_HOURS = REGISTRY.register(Counter(
+    "scheduler_unallocated_hours_total", "Required hours the solver could not place"))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "scheduler_cache_lookups_total", "Solver cache lookups by cache and result"))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "scheduler_queue_depth", "Requests waiting for a solver slot"))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    "scheduler_solves_in_flight", "Solves currently running"))
+RECORDINGS = REGISTRY.register(Counter(
+    "scheduler_recordings_total", "Recorded /generate payloads by outcome"))
+
+
+def observe_request(endpoint, status_code, seconds, payload_bytes=None):
+    with REGISTRY.lock:
+        REQUEST_LATENCY.observe(seconds, endpoint=endpoint)
+        REQUESTS.inc(endpoint=endpoint, code=status_code)
+        if payload_bytes is not None:
+            PAYLOAD_SIZE.observe(payload_bytes)
+    REGISTRY.write_snapshot()
+
+
+def observe_solve(result):
+    """Record the solver's own stats block (see solver.helpers.stats)."""
+    stats = result.get("stats") or {}
+    with REGISTRY.lock:
+        SOLVES.inc(status=result.get("status", "unknown"))
+        if "total_seconds" in stats:
+            SOLVE_LATENCY.observe(stats["total_seconds"])
+        for phase, seconds in stats.get("phases", {}).items():
+            SOLVE_PHASE_LATENCY.observe(seconds, phase=phase)
+        counters = stats.get("counters", {})
+        PLACEMENTS.inc(counters.get("placements", 0))
+        UNALLOCATED_HOURS.inc(counters.get("unallocated_hours", 0))
+        for cache, values in stats.get("caches", {}).items():
+            CACHE_LOOKUPS.inc(values.get("hits", 0), cache=cache, result="hit")
+            CACHE_LOOKUPS.inc(values.get("misses", 0), cache=cache, result="miss")
+
+
+def observe_admission(admission):
+    with REGISTRY.lock:
+        QUEUE_DEPTH.set(admission.waiting)
+        IN_FLIGHT.set(admission.in_flight)
+    REGISTRY.write_snapshot()
+
+
+def observe_recording(outcome):
+    with REGISTRY.lock:
+        RECORDINGS.inc(outcome=outcome)
@@ -0,0 +1,219 @@
+"""
+Per-request profiling of a solve.
+
+A caller holding SCHEDULER_PROFILE_TOKEN can ask for one /generate solve to
+be profiled, with the header "X-Scheduler-Profile: cprofile|sampling" (or
+"profile": "cprofile" / "sampling" / true in the payload) plus
+"X-Scheduler-Profile-Token". Without a configured token profiling is off.
+
+    cprofile   deterministic cProfile of every call; exact call counts, but
+               it slows the solve down, most in small hot functions
+    sampling   the solving thread's stack every SCHEDULER_PROFILE_INTERVAL_MS
+               (default 5); little overhead, statistical times
+
+Both modes also trace allocations with tracemalloc. tracemalloc is
+process-wide, so one profiled solve runs at a time per worker; a second
+request is solved normally and says so in its "profile" block.
+
+The full profile is saved under SCHEDULER_PROFILE_DIR (the last
+SCHEDULER_PROFILE_MAX_FILES are kept): a pstats file for cprofile, folded
+stacks for flame graphs for sampling. The response's "profile" block holds
+the top functions, the solver's phase timings and the top allocation sites.
+"""
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+
+from serving import env_int
+
+PROFILE_MODES = ("cprofile", "sampling")
+PROFILE_DIR = os.environ.get("SCHEDULER_PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "scheduler-profiles")
+MAX_PROFILE_FILES = env_int("SCHEDULER_PROFILE_MAX_FILES", 20)
+SAMPLE_INTERVAL = env_int("SCHEDULER_PROFILE_INTERVAL_MS", 5) / 1000
+TOP_N = env_int("SCHEDULER_PROFILE_TOP", 15)
+
+_profiling = threading.Lock()
+
+
+class ProfileDenied(Exception):
+    """A profile was requested without valid authorization."""
+
+
+def requested_mode(headers, payload):
+    """
+    Profiling mode the request asks for, or None. Raises ProfileDenied when
+    one is asked for without the configured token.
+    """
+    mode = headers.get("X-Scheduler-Profile") or (payload or {}).get("profile")
+    if mode in (None, "", False, "0", "off"):
+        return None
+    mode = "cprofile" if mode in (True, "1", "on") else str(mode).lower()
+    if mode not in PROFILE_MODES:
+        raise ProfileDenied(f"unknown profile mode {mode!r}, expected one of {list(PROFILE_MODES)}")
+    token = os.environ.get("SCHEDULER_PROFILE_TOKEN")
+    if not token:
+        raise ProfileDenied("profiling is disabled on this scheduler")
+    if not hmac.compare_digest(headers.get("X-Scheduler-Profile-Token") or "", token):
+        raise ProfileDenied("invalid profiling token")
+    return mode
+
+
+# ----- summaries -------------------------------------------------------------------
+
+def _location(filename, line, name):
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+
+def _cprofile_functions(profiler, top):
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = [
+        {"function": _location(*func), "calls": nc, "self_seconds": round(tt, 4), "cumulative_seconds": round(ct, 4)}
+        for func, (cc, nc, tt, ct, _) in stats.stats.items()
+    ]
+    return {
+        "by_self_time": sorted(rows, key=lambda r: -r["self_seconds"])[:top],
+        "by_cumulative_time": sorted(rows, key=lambda r: -r["cumulative_seconds"])[:top],
+    }
+
+
+def _sampling_functions(stacks, samples, top):
+    own = {}
+    inclusive = {}
+    for stack, count in stacks.items():
+        own[stack[-1]] = own.get(stack[-1], 0) + count
+        for frame in set(stack):
+            inclusive[frame] = inclusive.get(frame, 0) + count
+
+    def rows(counts):
+        return [
+            {"function": frame, "samples": count, "percent": round(100 * count / samples, 1)}
+            for frame, count in sorted(counts.items(), key=lambda item: -item[1])[:top]
+        ]
+    return {"samples": samples, "by_self_time": rows(own), "by_cumulative_time": rows(inclusive)}
+
+
+def _allocations(snapshot, top):
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    return [
+        {"location": f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+         "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+        for stat in snapshot.statistics("lineno")[:top]
+    ]
+
+
+# ----- profilers -------------------------------------------------------------------
+
+class _Sampler:
+    """Samples one thread's Python stack from a background thread."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                # Function granularity: the line a function starts on, not the current line
+                stack.append(_location(code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            if stack:
+                key = tuple(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+                self.samples += 1
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+
+def _save(profile_id, suffix, write):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}-{profile_id}{suffix}")
+    write(path)
+    profiles = sorted(
+        os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR)
+        if name.endswith((".prof", ".folded"))
+    )
+    for old in profiles[:max(0, len(profiles) - MAX_PROFILE_FILES)]:
+        try:
+            os.remove(old)
+        except FileNotFoundError:
+            pass
+    return path
+
+
+def profile_solve(mode, solve, *args, top=None):
+    """
+    Run solve(*args) under the given profiler. Returns (result, profile
+    summary). When another profiled solve is running, solves unprofiled.
+    """
+    top = top or TOP_N
+    if not _profiling.acquire(blocking=False):
+        return solve(*args), {"mode": mode, "error": "another profiled solve is running in this worker; not profiled"}
+
+    profile_id = uuid.uuid4().hex[:12]
+    try:
+        tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            if mode == "cprofile":
+                profiler = cProfile.Profile()
+                result = profiler.runcall(solve, *args)
+            else:
+                with _Sampler(threading.get_ident(), SAMPLE_INTERVAL) as sampler:
+                    result = solve(*args)
+            seconds = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+
+        if mode == "cprofile":
+            functions = _cprofile_functions(profiler, top)
+            path = _save(profile_id, ".prof", profiler.dump_stats)
+        else:
+            functions = _sampling_functions(sampler.stacks, max(1, sampler.samples), top)
+
+            def write_folded(path):
+                with open(path, "w") as f:
+                    for stack, count in sorted(sampler.stacks.items()):
+                        f.write(f"{';'.join(stack)} {count}\n")
+            path = _save(profile_id, ".folded", write_folded)
+    finally:
+        _profiling.release()
+
+    stats = result.get("stats") or {}
+    return result, {
+        "id": profile_id,
+        "mode": mode,
+        "file": path,
+        "profiled_seconds": round(seconds, 4),
+        "functions": functions,
+        "phases": stats.get("phases", {}),
+        "allocations": {
+            "peak_kb": round(peak / 1024, 1),
+            "top": _allocations(snapshot, top),
+        },
+    }
@@ -0,0 +1,248 @@
+"""
+Opt-in recording of /generate requests for offline benchmarking.
+
+With SCHEDULER_RECORD_DIR set, every /generate payload (or a sample of
+them) is anonymized and written there as a gzip'd JSON record together
+with the solve's metrics: status, engine, latency per phase, counters and
+quality report. replay.py runs such a corpus through any solver build and
+compares it against the recorded numbers.
+
+Anonymization replaces teacher and room names (and database ids) with
+stable per-record aliases such as "Teacher 3" and "Room 7", everywhere they
+appear: teachers, rooms, room mappings, saved timetables and constraints.
+Personal teacher fields (email, phone, ...) are dropped. Room types and
+capacities, subjects, time grids and limits are kept, so a replayed solve
+does the same work as the original.
+
+Records are written by one background thread per worker, so a request
+never waits on the disk; when the queue is full the record is dropped.
+After each write the directory is trimmed, oldest first, to
+SCHEDULER_RECORD_MAX_FILES files and SCHEDULER_RECORD_MAX_MB megabytes.
+"""
+import copy
+import gzip
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+
+from serving import env_int
+
+RECORD_VERSION = 1
+RECORD_SUFFIX = ".json.gz"
+PERSONAL_TEACHER_FIELDS = ("email", "phone", "mobile", "contact", "userId", "employeeId", "_id")
+
+
+class _Aliases:
+    """Stable replacement names within one record."""
+
+    def __init__(self):
+        self.names = {}
+
+    def alias(self, kind, value):
+        if value in (None, ""):
+            return value
+        names = self.names.setdefault(kind, {})
+        if value not in names:
+            names[value] = f"{kind} {len(names) + 1}"
+        return names[value]
+
+
+def anonymize_payload(payload):
+    """Deep copy of a /generate payload with teacher and room identities replaced."""
+    payload = copy.deepcopy(payload)
+    aliases = _Aliases()
+
+    def teacher(name):
+        return aliases.alias("Teacher", name)
+
+    def room(name):
+        return aliases.alias("Room", name)
+
+    def record_id(value):
+        return aliases.alias("id", str(value)) if value not in (None, "") else value
+
+    for t in payload.get("teachers") or []:
+        if isinstance(t, dict):
+            for field in PERSONAL_TEACHER_FIELDS:
+                t.pop(field, None)
+            t["name"] = teacher(t.get("name"))
+
+    for r in payload.get("rooms") or []:
+        if isinstance(r, dict):
+            r["name"] = room(r.get("name"))
+            if "_id" in r:
+                r["_id"] = record_id(r["_id"])
+
+    for mapping in (payload.get("roomMappings") or {}).values():
+        if not isinstance(mapping, dict):
+            continue
+        if "roomId" in mapping:
+            mapping["roomId"] = record_id(mapping["roomId"])
+        if "roomName" in mapping:
+            mapping["roomName"] = room(mapping["roomName"])
+        for batch in mapping.get("batches") or []:
+            if isinstance(batch, dict):
+                if "room" in batch:
+                    batch["room"] = record_id(batch["room"])
+                if "roomName" in batch:
+                    batch["roomName"] = room(batch["roomName"])
+
+    for saved in payload.get("saved_timetables") or []:
+        if not isinstance(saved, dict):
+            continue
+        for slots in (saved.get("timetableData") or {}).values():
+            for entries in (slots or {}).values():
+                for entry in entries or []:
+                    if isinstance(entry, dict):
+                        if "teacher" in entry:
+                            entry["teacher"] = teacher(entry["teacher"])
+                        if "room" in entry:
+                            entry["room"] = room(entry["room"])
+
+    for rule in payload.get("constraints") or []:
+        if isinstance(rule, dict):
+            if "teacher" in rule:
+                rule["teacher"] = teacher(rule["teacher"])
+            if "room" in rule:
+                rule["room"] = room(rule["room"])
+
+    return payload
+
+
+def solve_metrics(result):
+    """The numbers of a solve a replay is compared against."""
+    stats = result.get("stats") or {}
+    quality = result.get("quality") or {}
+    return {
+        "status": result.get("status"),
+        "engine": result.get("engine"),
+        "deadline_reached": result.get("deadline_reached"),
+        "seconds": stats.get("total_seconds"),
+        "phases": stats.get("phases", {}),
+        "counters": stats.get("counters", {}),
+        "quality": {"score": quality.get("score"), "metrics": quality.get("metrics", {})},
+    }
+
+
+def read_record(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def list_records(directory):
+    """Record files in a directory, oldest first."""
+    try:
+        names = [n for n in os.listdir(directory) if n.endswith(RECORD_SUFFIX)]
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, n) for n in sorted(names)]
+
+
+class PayloadRecorder:
+    def __init__(self, directory, sample_rate=1.0, min_seconds=0.0,
+                 max_files=500, max_bytes=200 * 1024 * 1024, queue_size=8, on_outcome=None):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.min_seconds = min_seconds
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.on_outcome = on_outcome
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, on_outcome=None):
+        """A recorder when SCHEDULER_RECORD_DIR is set, otherwise None."""
+        directory = os.environ.get("SCHEDULER_RECORD_DIR")
+        if not directory:
+            return None
+        return cls(
+            directory,
+            sample_rate=float(os.environ.get("SCHEDULER_RECORD_SAMPLE") or 1.0),
+            min_seconds=float(os.environ.get("SCHEDULER_RECORD_MIN_SECONDS") or 0.0),
+            max_files=env_int("SCHEDULER_RECORD_MAX_FILES", 500),
+            max_bytes=env_int("SCHEDULER_RECORD_MAX_MB", 200) * 1024 * 1024,
+            queue_size=env_int("SCHEDULER_RECORD_QUEUE", 8),
+            on_outcome=on_outcome
+        )
+
+    def _outcome(self, outcome):
+        if self.on_outcome:
+            self.on_outcome(outcome)
+
+    def record(self, payload, result, endpoint="generate"):
+        """Queue one solve for writing. Never raises and never blocks."""
+        try:
+            metrics = solve_metrics(result)
+            if result.get("payload_errors") or (metrics["seconds"] or 0) < self.min_seconds:
+                return
+            if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+                return
+            entry = {
+                "version": RECORD_VERSION,
+                "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "endpoint": endpoint,
+                "payload": anonymize_payload(payload),
+                "result": metrics,
+            }
+        except Exception as e:
+            print(f"⚠️ Could not prepare recording: {e}")
+            self._outcome("failed")
+            return
+
+        self._start()
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self._outcome("dropped")
+
+    def _start(self):
+        # Started lazily: gunicorn forks workers after the app is imported
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                os.makedirs(self.directory, exist_ok=True)
+                self.thread = threading.Thread(target=self._writer, name="payload-recorder", daemon=True)
+                self.thread.start()
+
+    def _writer(self):
+        while True:
+            entry = self.queue.get()
+            try:
+                self.write(entry)
+                self._outcome("written")
+            except OSError as e:
+                print(f"⚠️ Could not write recording: {e}")
+                self._outcome("failed")
+
+    def write(self, entry):
+        """Write one record atomically, then trim the directory. Returns its path."""
+        name = f"{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        path = os.path.join(self.directory, name + RECORD_SUFFIX)
+        partial = os.path.join(self.directory, f".{name}.tmp")
+        with gzip.open(partial, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump(entry, f, separators=(",", ":"), default=str)
+        os.replace(partial, path)
+        self.rotate()
+        return path
+
+    def rotate(self):
+        """Delete the oldest records beyond the file and size limits."""
+        files = []
+        for path in list_records(self.directory):
+            try:
+                files.append((path, os.path.getsize(path)))
+            except FileNotFoundError:
+                continue     # another worker rotated it away
+        total = sum(size for _, size in files)
+        while files and (len(files) > self.max_files or total > self.max_bytes):
+            path, size = files.pop(0)
+            total -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,174 @@
+"""
+Replay recorded /generate payloads (see recorder.py) through a solver build.
+
+    python replay.py RECORD_DIR [more dirs or .json.gz files]
+        [--solver PATH]        solver build to import (a scheduler checkout)
+        [--engine NAME]        override the recorded engine
+        [--time-limit S]       override the recorded timeLimit
+        [--repeat N]           timed runs per record; the median is reported
+        [--output report.json] write the replay report
+        [--baseline report.json]  compare with an earlier replay report
+
+Each record is solved --repeat times for latency, then once more under
+tracemalloc for peak Python memory. Latency, unallocated hours and quality
+score are compared with the recorded numbers, or with the baseline report
+when one is given. Recorded latency comes from the production machine, so
+the baseline comparison (two builds replayed on the same machine) is the
+one to gate on; memory is only compared against a baseline, because the
+service does not trace allocations. Requests recorded without a seed are
+replayed with seed 0.
+
+Exits with status 1 when any record regresses beyond the thresholds.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+
+def _record_paths(paths, list_records):
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(list_records(path))
+        elif os.path.isfile(path):
+            found.append(path)
+    return found
+
+
+def _quiet(fn, *args):
+    # The solver prints its progress; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args)
+
+
+def replay_record(solve_timetable, record, engine=None, time_limit=None, repeat=3):
+    payload = dict(record["payload"])
+    payload.setdefault("seed", 0)
+    if engine:
+        payload["engine"] = engine
+    deadline = time_limit if time_limit is not None else payload.get("timeLimit")
+
+    timings = []
+    result = None
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        result = _quiet(solve_timetable, payload, deadline)
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        _quiet(solve_timetable, payload, deadline)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "status": result.get("status"),
+        "engine": result.get("engine"),
+        "seconds": round(statistics.median(timings), 4),
+        "peak_memory_kb": round(peak / 1024),
+        "unallocated_hours": (result.get("stats") or {}).get("counters", {}).get("unallocated_hours", 0),
+        "quality_score": (result.get("quality") or {}).get("score"),
+        "deadline_reached": result.get("deadline_reached"),
+    }
+
+
+def recorded_numbers(record):
+    result = record.get("result") or {}
+    return {
+        "status": result.get("status"),
+        "engine": result.get("engine"),
+        "seconds": result.get("seconds"),
+        "peak_memory_kb": None,
+        "unallocated_hours": (result.get("counters") or {}).get("unallocated_hours", 0),
+        "quality_score": (result.get("quality") or {}).get("score"),
+        "deadline_reached": result.get("deadline_reached"),
+    }
+
+
+def compare(current, reference, max_slowdown, max_memory_growth, score_tolerance):
+    """Regressions of current against reference, as short descriptions."""
+    problems = []
+    if reference.get("seconds") and current["seconds"] > reference["seconds"] * max_slowdown:
+        problems.append(f"latency {reference['seconds']}s -> {current['seconds']}s")
+    if reference.get("peak_memory_kb") and current["peak_memory_kb"] > reference["peak_memory_kb"] * max_memory_growth:
+        problems.append(f"memory {reference['peak_memory_kb']}KB -> {current['peak_memory_kb']}KB")
+    if current["unallocated_hours"] > (reference.get("unallocated_hours") or 0):
+        problems.append(f"unallocated {reference.get('unallocated_hours')} -> {current['unallocated_hours']}")
+    if (reference.get("quality_score") is not None and current["quality_score"] is not None
+            and current["quality_score"] > reference["quality_score"] + score_tolerance):
+        problems.append(f"quality score {reference['quality_score']} -> {current['quality_score']}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded scheduler payloads and compare the results.")
+    parser.add_argument("records", nargs="+", help="record directories or .json.gz files")
+    parser.add_argument("--solver", help="directory containing the solver package to benchmark")
+    parser.add_argument("--engine")
+    parser.add_argument("--time-limit", type=float)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output")
+    parser.add_argument("--baseline", help="earlier replay report to compare against")
+    parser.add_argument("--max-slowdown", type=float, default=1.25)
+    parser.add_argument("--max-memory-growth", type=float, default=1.25)
+    parser.add_argument("--score-tolerance", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    if args.solver:
+        sys.path.insert(0, os.path.abspath(args.solver))
+    # Imported only now: recorder pulls in the solver through serving
+    from recorder import list_records, read_record
+    from solver.timetable_solver import solve_timetable
+
+    paths = _record_paths(args.records, list_records)
+    if not paths:
+        parser.error("no recordings found")
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {entry["record"]: entry["replay"] for entry in json.load(f)["records"]}
+
+    entries = []
+    regressions = 0
+    print(f"{'record':<40} {'recorded':>9} {'replay':>9} {'mem KB':>9} {'unalloc':>9} {'score':>10}  regressions")
+    for path in paths:
+        record = read_record(path)
+        name = os.path.basename(path)
+        replay = replay_record(solve_timetable, record, args.engine, args.time_limit, args.repeat)
+        recorded = recorded_numbers(record)
+        reference = baseline.get(name, recorded)
+        problems = compare(replay, reference, args.max_slowdown, args.max_memory_growth, args.score_tolerance)
+        regressions += bool(problems)
+        entries.append({"record": name, "recorded": recorded, "replay": replay, "regressions": problems})
+        print(f"{name[:40]:<40} {recorded['seconds'] or 0:>9.3f} {replay['seconds']:>9.3f} "
+              f"{replay['peak_memory_kb']:>9} {replay['unallocated_hours']:>9} "
+              f"{replay['quality_score'] if replay['quality_score'] is not None else '-':>10}  "
+              f"{'; '.join(problems) or '-'}")
+
+    replayed = [e["replay"]["seconds"] for e in entries]
+    summary = {
+        "records": len(entries),
+        "regressions": regressions,
+        "total_seconds": round(sum(replayed), 4),
+        "median_seconds": round(statistics.median(replayed), 4),
+        "compared_with": "baseline" if args.baseline else "recorded",
+    }
+    print(f"\n{summary['records']} records, {regressions} regressed, "
+          f"replay total {summary['total_seconds']}s (compared with {summary['compared_with']})")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"summary": summary, "records": entries}, f, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+Production serving mode for the scheduler service.
+
+Runs the Flask app under gunicorn with pre-forked worker processes. The
+solver is imported and warmed once in the master before forking, so every
+worker starts hot. Each worker admits a bounded number of concurrent solves
+and a bounded queue of waiting requests; anything beyond that gets a 429.
+"""
+import contextlib
+import io
+import os
+import tempfile
+import threading
+
+from solver.timetable_solver import solve_timetable
+from metrics import REGISTRY, mark_process_dead
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+# Minimal payload that exercises every allocation phase once
+WARMUP_PAYLOAD = {
+    "years": {
+        "WARMUP": {
+            "divisions": 1,
+            "holidays": ["Sat", "Sun"],
+            "timeConfig": {
+                "startTime": "09:00",
+                "endTime": "13:00",
+                "periodDuration": 60,
+                "lunchStart": "11:00",
+                "lunchDuration": 60
+            },
+            "subjects": [
+                {"code": "W-TH", "type": "Theory", "hours": 1},
+                {"code": "W-LAB", "type": "Lab", "hours": 2, "batches": 1, "labDuration": 2},
+                {"code": "W-TUT", "type": "Tutorial", "hours": 1, "batches": 1}
+            ]
+        }
+    },
+    "teachers": [
+        {"name": "Warmup Teacher",
+         "subjects": [{"code": "W-TH"}, {"code": "W-LAB"}, {"code": "W-TUT"}]}
+    ],
+    "rooms": [
+        {"name": "Warmup Classroom", "type": "Classroom"},
+        {"name": "Warmup Lab", "type": "Lab"}
+    ],
+    "saved_timetables": [],
+    "roomMappings": {}
+}
+
+_warm = threading.Event()
+
+
+def warm_solver():
+    """Import every solver module and run one throwaway solve."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        solve_timetable(WARMUP_PAYLOAD)
+    _warm.set()
+
+
+def is_warm():
+    return _warm.is_set()
+
+
+class AdmissionRejected(Exception):
+    """Raised when a worker has no free solve slot and its queue is full."""
+
+
+class AdmissionController:
+    """
+    Per-worker admission control.
+    At most max_concurrent solves run at once; up to max_queue more wait for
+    a slot (for at most queue_timeout seconds). Everything else is rejected.
+    """
+
+    def __init__(self, max_concurrent=1, max_queue=4, queue_timeout=30):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        # Called with the controller after every change in waiting/in-flight counts
+        self.on_change = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_concurrent=env_int("SCHEDULER_WORKER_CONCURRENCY", 1),
+            max_queue=env_int("SCHEDULER_QUEUE_SIZE", 4),
+            queue_timeout=env_int("SCHEDULER_QUEUE_TIMEOUT", 30)
+        )
+
+    def has_capacity(self):
+        with self._lock:
+            return self.in_flight + self.waiting < self.max_concurrent + self.max_queue
+
+    @contextlib.contextmanager
+    def admit(self):
+        with self._lock:
+            if self.in_flight + self.waiting >= self.max_concurrent + self.max_queue:
+                raise AdmissionRejected("Scheduler is at capacity, retry later")
+            self.waiting += 1
+
+        # Counts and the slot are settled in finally blocks: on_change may raise
+        acquired = False
+        try:
+            self._changed()
+            acquired = self._slots.acquire(timeout=self.queue_timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+                if acquired:
+                    self.in_flight += 1
+        if not acquired:
+            self._changed()
+            raise AdmissionRejected("Timed out waiting for a free solver slot")
+
+        try:
+            self._changed()
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+            self._changed()
+
+    def _changed(self):
+        if self.on_change:
+            self.on_change(self)
+
+
+def run_production(app, admission):
+    """Serve the app with pre-forked gunicorn workers."""
+    from gunicorn.app.base import BaseApplication
+
+    # Threads per worker: one per solve slot and queued request, plus headroom
+    # so health checks are still answered while every slot is busy, plus the
+    # long-lived SSE progress streams (background jobs solve on their own threads).
+    threads = admission.max_concurrent + admission.max_queue + 2 + env_int("SCHEDULER_STREAM_THREADS", 4)
+
+    options = {
+        "bind": f"0.0.0.0:{env_int('PORT', 6000)}",
+        "workers": env_int("SCHEDULER_WORKERS", os.cpu_count() or 2),
+        "worker_class": "gthread",
+        "threads": threads,
+        "timeout": env_int("SCHEDULER_WORKER_TIMEOUT", 300),
+        "graceful_timeout": 30,
+        "keepalive": 5,
+        "preload_app": True,
+        "max_requests": env_int("SCHEDULER_MAX_REQUESTS", 0),
+        "max_requests_jitter": env_int("SCHEDULER_MAX_REQUESTS_JITTER", 0),
+        "accesslog": "-",
+    }
+
+    # Workers share metrics through per-process snapshot files
+    if not REGISTRY.snapshot_dir:
+        REGISTRY.snapshot_dir = tempfile.mkdtemp(prefix="scheduler-metrics-")
+    else:
+        # Start from zero: drop snapshots left behind by a previous run
+        os.makedirs(REGISTRY.snapshot_dir, exist_ok=True)
+        for filename in os.listdir(REGISTRY.snapshot_dir):
+            if filename.endswith(".json"):
+                os.remove(os.path.join(REGISTRY.snapshot_dir, filename))
+
+    def child_exit(server, worker):
+        mark_process_dead(REGISTRY.snapshot_dir, worker.pid)
+
+    options["child_exit"] = child_exit
+
+    class SchedulerApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    print(f"=== SCHEDULER (production) workers={options['workers']} "
+          f"concurrency={admission.max_concurrent} queue={admission.max_queue} ===")
+    # Warm once in the master; forked workers inherit the loaded solver
+    warm_solver()
+    SchedulerApplication().run()
@@ -1,4 +1,5 @@
 """Timetable solver package."""
-from .timetable_solver import solve_timetable
+from .timetable_solver import compare_engines, solve_timetable
+from .batch import solve_departments
 
-__all__ = ['solve_timetable']
\ No newline at end of file
+__all__ = ['solve_timetable', 'compare_engines', 'solve_departments']
\ No newline at end of file
@@ -0,0 +1,9 @@
+# ============================================
+# FILE 34: solver/__main__.py
+# ============================================
+"""python -m solver: see cli.py."""
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -2,131 +2,134 @@
 # FILE 8: solver/allocators/base_allocator.py
 # ============================================
 
-from ..core.validators import teacher_can_teach_entry
-from ..core.conflict_checker import check_global_conflicts, check_room_availability, is_batch_available
-from ..core.room_manager import get_compatible_rooms_for_subject
-from ..helpers.teachers import can_teacher_take_slot, increment_teacher_daily_count
-from ..config import CHECK_ROOM_CONFLICTS
+from ..core.conflict_checker import is_batch_available, saved_room_conflict, saved_teacher_conflict
+from ..core.probe_cache import class_key, room_key, teacher_key
+from ..helpers.teachers import can_teacher_take_slot
 
-def allocate_slot(req, day, slot_info, class_tt, teacher_tt, room_tt, teachers, rooms, 
-                  saved_timetables=None, teacher_limits=None, previous_subject=None, room_mappings=None):
-    """Allocate single slot with room mappings support."""
-    yname, div, code, stype, batch = req["year"], req["div"], req["code"], req["type"], req["batch"]
-    slot_key = slot_info["slot_key"]
+def allocate_slot(ctx, demand, day, slot_info, use_limits=True, previous_subject=None):
+    """Allocate a single slot for a demand using its precomputed teachers and rooms."""
+    model = ctx.model
+    req = demand.req
+    yname, div, stype, batch = req.year, req.div, req.type, req.batch
+    slot_key = slot_info.key
+    teacher_limits = ctx.teacher_limits if use_limits else None
     
     # Skip lunch slots
-    if slot_info.get("is_lunch"):
+    if slot_info.is_lunch:
         return False
     
+    # Same probe already failed and nothing it depends on was freed since
+    probe = ("slot", req.id, day, slot_key)
+    if ctx.probe_failures.get(probe):
+        return False
+    
+    # Declarative constraints: compiled masks, one lookup per resource
+    constraints = model.constraints
+    check_constraints = constraints.active
+    if check_constraints:
+        bits = constraints.slot_bits(req.year_id, [slot_key])
+        if constraints.requirement_blocked(req, day, bits):
+            ctx.probe_failures.fail(probe)
+            return False
+        if constraints.class_too_long(ctx, req, day, [slot_key]):
+            return False
+    
     # Batch availability check
     if batch is not None:
-        if not is_batch_available(class_tt, yname, div, day, slot_key, batch):
+        if not is_batch_available(ctx.class_tt, yname, div, day, slot_key, batch):
+            ctx.probe_failures.fail(probe, depends_on=[class_key(req.division_id, day, slot_key)])
             return False
     
     # Theory lecture - check slot is empty
     if stype == "Theory":
-        current_occupants = class_tt[yname][div][day].get(slot_key, [])
-        if len(current_occupants) > 0:
+        if ctx.class_tt[yname][div][day].get(slot_key):
+            ctx.probe_failures.fail(probe, depends_on=[class_key(req.division_id, day, slot_key)])
             return False
     
     # Find eligible teacher
-    eligible = [t for t in teachers if any(s["code"] == code for s in t.get("subjects", []))]
+    eligible = [model.teachers[tid] for tid in req.teacher_ids]
+    limited = False
     
     if teacher_limits:
-        eligible = [t for t in eligible if can_teacher_take_slot(t["name"], day, teacher_limits)]
+        within_limits = [t for t in eligible if can_teacher_take_slot(t.id, day, teacher_limits)]
+        limited = len(within_limits) < len(eligible)
+        eligible = within_limits
     
     if not eligible:
         return False
     
     if teacher_limits:
-        eligible.sort(key=lambda t: teacher_limits[t["name"]]["daily_count"][day])
+        eligible.sort(key=lambda t: teacher_limits[t.id]["daily_count"][day])
     
     # Find available teacher
     available_t = None
+    busy = []
     
     for t in eligible:
-        if not teacher_tt[t["name"]][day].get(slot_key, []):
-            if saved_timetables:
-                global_check = check_global_conflicts(t["name"], day, slot_key, saved_timetables)
-                if global_check["conflict"]:
-                    continue
-            available_t = t["name"]
-            break
+        if ctx.teacher_tt[t.name][day].get(slot_key):
+            busy.append(teacher_key(t.id, day, slot_key))
+            continue
+        if saved_teacher_conflict(ctx, t.id, day, slot_key):
+            continue
+        if check_constraints:
+            if constraints.teacher_blocked(t.id, req.year_id, day, bits):
+                continue
+            if constraints.teacher_too_long(ctx, t.id, day, [slot_key]):
+                # Depends on the teacher's neighbouring sessions: never cached
+                limited = True
+                continue
+        available_t = t
+        break
     
     if not available_t:
+        # Teachers skipped for their daily limit might be free: only cache limit-free failures
+        if not limited:
+            ctx.probe_failures.fail(probe, depends_on=busy)
         return False
     
-    # Room allocation with mappings
-    room_type_map = {
-        "Lab": "Lab",
-        "Tutorial": "Tutorial",
-        "Theory": "Theory"
-    }
-    
-    candidate_rooms = get_compatible_rooms_for_subject(
-        rooms, code, room_type_map.get(stype, "Theory"), yname, div, room_mappings, batch
-    )
-    
-    # Fallback if no rooms found
-    if not candidate_rooms or len(candidate_rooms) == 0:
-        if stype == "Lab":
-            candidate_rooms = [r for r in rooms if r.get("type") == "Lab"]
-        elif stype == "Tutorial":
-            candidate_rooms = [r for r in rooms if r.get("type") in ["Tutorial", "Classroom"]]
-        else:
-            candidate_rooms = [r for r in rooms if r.get("type") == "Classroom"]
-    
-    # Find available room
+    # Find available room (candidates already include mappings and type fallback)
     available_r = None
+    busy = []
     
-    for room in candidate_rooms:
-        room_name = room.get("name") if isinstance(room, dict) else room
+    for room_id in req.room_ids:
+        room = model.rooms[room_id]
         
-        if room_tt[room_name][day].get(slot_key, []):
+        if ctx.room_tt[room.name][day].get(slot_key):
+            busy.append(room_key(room.id, day, slot_key))
             continue
         
-        if saved_timetables and CHECK_ROOM_CONFLICTS:
-            room_check = check_room_availability(room_name, day, slot_key, saved_timetables)
-            if room_check["conflict"]:
-                continue
+        if saved_room_conflict(ctx, room.id, day, slot_key):
+            continue
         
-        available_r = room_name
+        if check_constraints and constraints.room_blocked(room.id, req.year_id, day, bits):
+            continue
+        
+        available_r = room
         break
     
     if not available_r:
+        ctx.probe_failures.fail(probe, depends_on=busy)
         return False
     
-    # Allocation
-    entry = {
-        "subject": code,
-        "teacher": available_t,
-        "room": available_r,
-        "batch": batch,
-        "type": stype
-    }
-    
-    if slot_key not in class_tt[yname][div][day]:
-        class_tt[yname][div][day][slot_key] = []
-    if slot_key not in teacher_tt[available_t][day]:
-        teacher_tt[available_t][day][slot_key] = []
-    if slot_key not in room_tt[available_r][day]:
-        room_tt[available_r][day][slot_key] = []
-    
-    class_tt[yname][div][day][slot_key].append(entry)
-    teacher_tt[available_t][day][slot_key].append({
-        "subject": code,
-        "year": yname,
-        "division": div,
-        "room": available_r,
-        "batch": batch
-    })
-    room_tt[available_r][day][slot_key].append({
-        "subject": code,
-        "year": yname,
-        "division": div
-    })
-    
-    if teacher_limits:
-        increment_teacher_daily_count(available_t, day, teacher_limits)
-    
-    return True
\ No newline at end of file
+    ctx.place_session(req, day, [slot_key], available_t, available_r, count_towards_limit=use_limits)
+    return True
+
+
+def allocate_fallback(ctx, pool):
+    """Last pass: place leftover single-slot hours anywhere, ignoring daily limits."""
+    print("=== FALLBACK ALLOCATION ===")
+    for demand in pool:
+        if ctx.expired():
+            break
+        if demand.remaining > 0:
+            demand.attempted = True
+            year = ctx.model.years[demand.req.year_id]
+            for day in year.working_days:
+                for slot_info in year.slots:
+                    if slot_info.is_lunch:
+                        continue
+                    if demand.remaining <= 0:
+                        break
+                    
+                    if allocate_slot(ctx, demand, day, slot_info, use_limits=False):
+                        demand.remaining -= 1
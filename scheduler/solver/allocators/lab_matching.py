@@ -0,0 +1,301 @@
+# ============================================
+# FILE 20: solver/allocators/lab_matching.py
+# ============================================
+"""
+Matching-based placement of continuous multi-hour labs.
+
+For each day, every pending lab session is connected to the (room, window)
+pairs it could use: a break-free window where the batch is free, the room is
+free, and at least one qualified teacher is free. A maximum bipartite
+matching (Hopcroft-Karp) spreads sessions over rooms, so one lab no longer
+grabs a shared lab room that several others depend on. Conflicts that the
+matching cannot see (teachers, overlapping windows) are resolved greedily
+when the matched sessions are committed; the day is then re-matched until
+no further session fits. A lab left without a session that day is explained
+by the first conflict first-fit would have met.
+"""
+import math
+from collections import deque
+
+from ..config import DAY_NAMES
+from ..core.conflict_checker import (
+    check_continuous_slots_available, constraint_conflict, is_batch_available, saved_room_conflict,
+    saved_teacher_conflict
+)
+from ..helpers.teachers import can_teacher_take_slot, reset_teacher_daily_counts
+
+INFINITY = float("inf")
+
+
+def hopcroft_karp(adjacency, right_count):
+    """
+    Maximum bipartite matching.
+    adjacency[u] lists the right nodes of left node u, in order of preference.
+    Returns match_left where match_left[u] is the matched right node or None.
+    """
+    left_count = len(adjacency)
+    match_left = [None] * left_count
+    match_right = [None] * right_count
+    dist = [0] * left_count
+
+    def bfs():
+        queue = deque()
+        for u in range(left_count):
+            if match_left[u] is None:
+                dist[u] = 0
+                queue.append(u)
+            else:
+                dist[u] = INFINITY
+        found = False
+        while queue:
+            u = queue.popleft()
+            for v in adjacency[u]:
+                w = match_right[v]
+                if w is None:
+                    found = True
+                elif dist[w] == INFINITY:
+                    dist[w] = dist[u] + 1
+                    queue.append(w)
+        return found
+
+    def dfs(u):
+        for v in adjacency[u]:
+            w = match_right[v]
+            if w is None or (dist[w] == dist[u] + 1 and dfs(w)):
+                match_left[u] = v
+                match_right[v] = u
+                return True
+        dist[u] = INFINITY
+        return False
+
+    while bfs():
+        for u in range(left_count):
+            if match_left[u] is None:
+                dfs(u)
+
+    return match_left
+
+
+def break_free_windows(slots, duration):
+    """Start indexes of windows of `duration` slots with no lunch/break inside."""
+    return [
+        start for start in range(len(slots) - duration + 1)
+        if not any(slot.is_lunch for slot in slots[start:start + duration])
+    ]
+
+
+def _first_break_conflict(req, day, slots):
+    """Describe the first window a break interrupts, in the shape recommendations expect."""
+    duration = req.lab_duration
+    for start in range(len(slots) - duration + 1):
+        for i, slot in enumerate(slots[start:start + duration]):
+            if slot.is_lunch:
+                return {
+                    "reason": "break_interruption",
+                    "detail": f"Break/Lunch at slot {slot.key} interrupts continuous lab",
+                    "break_slot": slot.key,
+                    "break_position": i + 1,
+                    "total_duration": duration,
+                    "suggestion": f"Move break before or after this {duration}-hour time window",
+                    "subject": req.code,
+                    "year": req.year,
+                    "division": req.div,
+                    "batch": req.batch,
+                    "day": day,
+                    "attempted_start": slots[start].key
+                }
+    return None
+
+
+def _probe_conflicts(ctx, req, day, windows, teachers):
+    """(window start, conflict) of every failed probe, in first-fit order."""
+    for start in windows:
+        for teacher in teachers:
+            for room_id in req.room_ids:
+                success, _, conflict = check_continuous_slots_available(ctx, req, day, start, teacher,
+                                                                        ctx.model.rooms[room_id])
+                if not success and conflict.get("reason"):
+                    yield start, conflict
+
+
+def _blocking_conflict(ctx, req, day, slots, windows):
+    """
+    Why req got no session on day: the first conflict first-fit would meet in
+    a break-free window (batch, teacher, room, constraint), the teachers'
+    daily limit, or a break interruption when every window crosses a break.
+    """
+    teachers = [ctx.model.teachers[tid] for tid in req.teacher_ids
+                if can_teacher_take_slot(tid, day, ctx.teacher_limits, req.lab_duration)]
+    if windows and req.teacher_ids and not teachers:
+        conflict = {"reason": "teacher_daily_limit",
+                    "detail": f"Every teacher of {req.code} has reached their daily hours on {day}"}
+    else:
+        start, conflict = next(_probe_conflicts(ctx, req, day, windows, teachers), (None, None))
+        if conflict is None:
+            return _first_break_conflict(req, day, slots)
+        conflict = dict(conflict, attempted_start=slots[start].key)
+    return {**conflict, "subject": req.code, "year": req.year, "division": req.div, "batch": req.batch, "day": day}
+
+
+def _free_teachers(ctx, req, day, slot_keys):
+    teachers = []
+    for tid in req.teacher_ids:
+        if not can_teacher_take_slot(tid, day, ctx.teacher_limits, req.lab_duration):
+            continue
+        teacher = ctx.model.teachers[tid]
+        teacher_day = ctx.teacher_tt[teacher.name][day]
+        if any(teacher_day.get(k) or saved_teacher_conflict(ctx, tid, day, k) for k in slot_keys):
+            continue
+        if constraint_conflict(ctx, req, day, slot_keys, teacher=teacher):
+            continue
+        teachers.append(teacher)
+    return teachers
+
+
+def _room_free(ctx, room, day, slot_keys):
+    room_day = ctx.room_tt[room.name][day]
+    return not any(room_day.get(k) or saved_room_conflict(ctx, room.id, day, k) for k in slot_keys)
+
+
+def _session_edges(ctx, req, day, windows):
+    """Feasible (room_id, start) pairs for one session of req on day."""
+    model = ctx.model
+    slots = model.years[req.year_id].slots
+    edges = []
+    for start in windows:
+        slot_keys = [slot.key for slot in slots[start:start + req.lab_duration]]
+        ctx.stats.count("lab_window_probes")
+        if not all(is_batch_available(ctx.class_tt, req.year, req.div, day, k, req.batch) for k in slot_keys):
+            continue
+        if constraint_conflict(ctx, req, day, slot_keys):
+            continue
+        if not _free_teachers(ctx, req, day, slot_keys):
+            continue
+        for room_id in req.room_ids:
+            room = model.rooms[room_id]
+            if _room_free(ctx, room, day, slot_keys) and not constraint_conflict(ctx, req, day, slot_keys, room=room):
+                edges.append((room_id, start))
+    return edges
+
+
+def _sessions_allowed_today(demand, working_days_left):
+    """One session a day, more only when the remaining days cannot fit the rest."""
+    sessions_left = math.ceil(demand.remaining / demand.req.lab_duration)
+    return max(1, math.ceil(sessions_left / max(1, working_days_left)))
+
+
+def _commit(ctx, demand, day, edges):
+    """Place a session using the first edge that is still conflict-free."""
+    model = ctx.model
+    req = demand.req
+    slots = model.years[req.year_id].slots
+    for room_id, start in edges:
+        ctx.stats.count("lab_commit_checks")
+        room = model.rooms[room_id]
+        slot_keys = [slot.key for slot in slots[start:start + req.lab_duration]]
+        # Earlier commits this round may have taken the batch, room or teachers
+        if not all(is_batch_available(ctx.class_tt, req.year, req.div, day, k, req.batch) for k in slot_keys):
+            continue
+        if not _room_free(ctx, room, day, slot_keys):
+            continue
+        # Earlier commits may also have lengthened the class's run of periods
+        if constraint_conflict(ctx, req, day, slot_keys, room=room):
+            continue
+        teachers = _free_teachers(ctx, req, day, slot_keys)
+        if not teachers:
+            continue
+        teacher = min(teachers, key=lambda t: ctx.teacher_limits[t.id]["daily_count"][day])
+        ctx.place_session(req, day, slot_keys, teacher, room)
+        demand.remaining -= req.lab_duration
+        return True
+    return False
+
+
+def allocate_labs_by_matching(ctx):
+    """
+    Allocate continuous multi-hour labs day by day with maximum matching.
+    Returns failed attempts keyed by lab, in the same shape as allocate_multi_hour_labs.
+    """
+    print("=== PHASE 2: ALLOCATING MULTI-HOUR LABS (matching) ===")
+    model = ctx.model
+    failed_lab_attempts = {}
+    windows_cache = {}
+
+    for day_index, day in enumerate(DAY_NAMES):
+        if ctx.expired():
+            break
+
+        reset_teacher_daily_counts(day, ctx.teacher_limits)
+        placed_today = {}
+        lab_order = ctx.seeded_order(ctx.lab_pool)
+
+        while not ctx.expired():
+            # Left side: one node per session still allowed today
+            sessions = []
+            for demand in lab_order:
+                req = demand.req
+                year = model.years[req.year_id]
+                if demand.remaining <= 0 or day in year.holidays:
+                    continue
+                demand.attempted = True
+                days_left = sum(1 for d in DAY_NAMES[day_index:] if d not in year.holidays)
+                allowed = _sessions_allowed_today(demand, days_left)
+                if placed_today.get(req.id, 0) < allowed:
+                    sessions.append(demand)
+
+            if not sessions:
+                break
+
+            # Right side: (room, window start) pairs
+            right_ids = {}
+            adjacency = []
+            session_edges = []
+            for demand in sessions:
+                req = demand.req
+                window_key = (req.year_id, req.lab_duration)
+                if window_key not in windows_cache:
+                    windows_cache[window_key] = break_free_windows(model.years[req.year_id].slots, req.lab_duration)
+                edges = _session_edges(ctx, req, day, windows_cache[window_key])
+                session_edges.append(edges)
+                adjacency.append([right_ids.setdefault(edge, len(right_ids)) for edge in edges])
+
+            matching = hopcroft_karp(adjacency, len(right_ids))
+            right_edges = {v: edge for edge, v in right_ids.items()}
+
+            # Matched sessions first (their matched edge first), then the rest greedily
+            placed = 0
+            order = sorted(range(len(sessions)), key=lambda u: matching[u] is None)
+            for u in order:
+                demand = sessions[u]
+                edges = session_edges[u]
+                if matching[u] is not None:
+                    matched = right_edges[matching[u]]
+                    edges = [matched] + [e for e in edges if e != matched]
+                if edges and _commit(ctx, demand, day, edges):
+                    placed += 1
+                    placed_today[demand.req.id] = placed_today.get(demand.req.id, 0) + 1
+                    failed_lab_attempts.pop(demand.req.key, None)
+
+            if placed == 0:
+                break
+
+        # Explain labs that could not be placed today
+        for demand in ctx.lab_pool:
+            req = demand.req
+            year = model.years[req.year_id]
+            if demand.remaining <= 0 or day in year.holidays or placed_today.get(req.id):
+                continue
+            windows = windows_cache.get((req.year_id, req.lab_duration))
+            if windows is None:
+                windows = windows_cache[(req.year_id, req.lab_duration)] = break_free_windows(year.slots, req.lab_duration)
+            conflict = _blocking_conflict(ctx, req, day, year.slots, windows)
+            if conflict:
+                entry = failed_lab_attempts.setdefault(req.key, {
+                    "req": demand,
+                    "conflict": conflict,
+                    "days_attempted": set()
+                })
+                entry["days_attempted"].add(day)
+                entry["conflict"] = conflict
+
+    return failed_lab_attempts
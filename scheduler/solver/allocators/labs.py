@@ -2,85 +2,35 @@
 # FILE 9: solver/allocators/lab_allocator.py
 # ============================================
 
-from ..core.validators import teacher_can_teach_entry
+from ..config import DAY_NAMES
 from ..core.conflict_checker import check_continuous_slots_available
-from ..core.room_manager import get_compatible_rooms_for_subject
-from ..helpers.teachers import increment_teacher_daily_count
+from ..helpers.teachers import can_teacher_take_slot, reset_teacher_daily_counts
 
-def allocate_lab_continuous(req, day, start_slot_idx, class_tt, teacher_tt, room_tt, 
-                            teachers, rooms, year_time_slots, saved_timetables, 
-                            lab_conflicts, teacher_limits=None, room_mappings=None):
-    """Continuous lab allocation with room mappings support."""
-    yname, div, code, batch = req["year"], req["div"], req["code"], req["batch"]
-    lab_duration = req.get("lab_duration", 1)
+def allocate_lab_continuous(ctx, demand, day, start_slot_idx):
+    """Continuous lab allocation using the demand's precomputed teachers and rooms."""
+    model = ctx.model
+    req = demand.req
+    yname, div, code, batch = req.year, req.div, req.code, req.batch
+    lab_duration = req.lab_duration
+    slots = model.years[req.year_id].slots
     
     # Find eligible teachers
-    eligible = [t for t in teachers if any(s["code"] == code for s in t.get("subjects", []))]
-    
-    if teacher_limits:
-        eligible = [t for t in eligible 
-                   if teacher_limits[t["name"]]["daily_count"][day] + lab_duration 
-                      <= teacher_limits[t["name"]]["max_per_day"]]
+    eligible = [model.teachers[tid] for tid in req.teacher_ids
+                if can_teacher_take_slot(tid, day, ctx.teacher_limits, lab_duration)]
     
     best_conflict = None
     
     for t in eligible:
-        # Get labs with mappings support
-        candidate_rooms = get_compatible_rooms_for_subject(
-            rooms, code, "Lab", yname, div, room_mappings, batch
-        )
-        
-        # Fallback to any lab
-        if not candidate_rooms or len(candidate_rooms) == 0:
-            candidate_rooms = [r for r in rooms if r.get("type") == "Lab"]
-        
-        for room in candidate_rooms:
-            room_name = room.get("name") if isinstance(room, dict) else room
+        for room_id in req.room_ids:
+            room = model.rooms[room_id]
             
             # Check if continuous slots are available
             can_allocate, slot_keys, conflict_info = check_continuous_slots_available(
-                class_tt, teacher_tt, room_tt, yname, div, day,
-                start_slot_idx, lab_duration, t["name"], room_name,
-                batch, year_time_slots[yname], saved_timetables
+                ctx, req, day, start_slot_idx, t, room
             )
             
             if can_allocate:
-                session_id = f"{day}-{slot_keys[0]}"
-                
-                # Allocate all slots for this continuous lab
-                for i, slot_key in enumerate(slot_keys):
-                    entry = {
-                        "subject": code,
-                        "teacher": t["name"],
-                        "room": room_name,
-                        "batch": batch,
-                        "type": "Lab",
-                        "lab_part": f"{i+1}/{lab_duration}",
-                        "lab_session_id": session_id
-                    }
-                    
-                    class_tt[yname][div][day][slot_key].append(entry)
-                    
-                    teacher_tt[t["name"]][day][slot_key].append({
-                        "subject": code,
-                        "year": yname,
-                        "division": div,
-                        "room": room_name,
-                        "batch": batch,
-                        "lab_part": f"{i+1}/{lab_duration}"
-                    })
-                    
-                    room_tt[room_name][day][slot_key].append({
-                        "subject": code,
-                        "year": yname,
-                        "division": div
-                    })
-                
-                # Update teacher limits
-                if teacher_limits:
-                    for _ in range(lab_duration):
-                        increment_teacher_daily_count(t["name"], day, teacher_limits)
-                
+                ctx.place_session(req, day, slot_keys, t, room)
                 return True, None
             
             # Track break interruption conflicts
@@ -93,7 +43,64 @@ def allocate_lab_continuous(req, day, start_slot_idx, class_tt, teacher_tt, room
                         "division": div,
                         "batch": batch,
                         "day": day,
-                        "attempted_start": year_time_slots[yname][start_slot_idx]["slot_key"]
+                        "attempted_start": slots[start_slot_idx].key
                     }
     
     return False, best_conflict
+
+
+def allocate_multi_hour_labs(ctx):
+    """
+    Allocate continuous multi-hour labs, at most one session per request per day.
+    Returns the failed attempts keyed by lab, used to explain unallocated labs.
+    """
+    print("=== PHASE 2: ALLOCATING MULTI-HOUR LABS ===")
+    failed_lab_attempts = {}
+    
+    for day in DAY_NAMES:
+        if ctx.expired():
+            break
+        
+        reset_teacher_daily_counts(day, ctx.teacher_limits)
+        
+        for demand in ctx.seeded_order(ctx.lab_pool):
+            if demand.remaining <= 0:
+                continue
+            
+            if ctx.expired():
+                break
+            
+            req = demand.req
+            year = ctx.model.years[req.year_id]
+            
+            if day in year.holidays:
+                continue
+            
+            demand.attempted = True
+            lab_duration = req.lab_duration
+            lab_key = req.key
+            
+            for start_idx in range(len(year.slots) - lab_duration + 1):
+                if demand.remaining <= 0:
+                    break
+                
+                success, conflict_info = allocate_lab_continuous(ctx, demand, day, start_idx)
+                
+                if success:
+                    demand.remaining -= lab_duration
+                    if lab_key in failed_lab_attempts:
+                        del failed_lab_attempts[lab_key]
+                    break
+                
+                if conflict_info and conflict_info.get('reason'):
+                    if lab_key not in failed_lab_attempts:
+                        failed_lab_attempts[lab_key] = {
+                            "req": demand,
+                            "conflict": conflict_info,
+                            "days_attempted": set()
+                        }
+                    failed_lab_attempts[lab_key]["days_attempted"].add(day)
+                    if conflict_info.get('reason') == 'break_interruption':
+                        failed_lab_attempts[lab_key]["conflict"] = conflict_info
+    
+    return failed_lab_attempts
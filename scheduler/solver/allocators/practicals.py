@@ -2,39 +2,64 @@
 # FILE 11: solver/allocators/practical_allocator.py
 # ============================================
 
-import random
 from ..config import DAY_NAMES
+from ..helpers.teachers import reset_teacher_daily_counts
 from .base import allocate_slot
 
-def allocate_practicals(practical_pool, years, year_time_slots, class_tt, teacher_tt, 
-                        room_tt, teachers, rooms, saved_timetables, teacher_limits, room_mappings):
-    """Allocate single-hour practicals/tutorials."""
+def build_practical_queues(pool):
+    """year_id -> division_id -> that class's practical demands, in pool order."""
+    queues = {}
+    for demand in pool:
+        queues.setdefault(demand.req.year_id, {}).setdefault(demand.req.division_id, []).append(demand)
+    return queues
+
+def allocate_practicals(ctx):
+    """
+    Allocate single-hour practicals/tutorials. Each year's demands are only
+    tried against that year's own slot grid, class by class.
+    Stops early once the deadline is reached.
+    """
     print("=== PHASE 3: ALLOCATING SINGLE-HOUR PRACTICALS ===")
-    
+
+    practical_pool = ctx.practical_pool
+    queues = build_practical_queues(practical_pool)
+    probes = 0
+
     for day in DAY_NAMES:
-        for req in practical_pool:
-            req["count_today"] = 0
-            
-        for teacher_name in teacher_limits:
-            teacher_limits[teacher_name]["daily_count"][day] = 0
-            
-        for yname, slots in year_time_slots.items():
-            ydata = years[yname]
-            
-            if day in ydata.get("holidays", []):
+        for demand in practical_pool:
+            demand.count_today = 0
+
+        reset_teacher_daily_counts(day, ctx.teacher_limits)
+
+        for year in ctx.model.years:
+            if day in year.holidays or year.id not in queues:
                 continue
-            
-            random.shuffle(practical_pool)
-            
-            for slot_info in slots:
-                if slot_info["is_lunch"]:
+
+            # Drop finished demands so probes follow what is still needed
+            classes = []
+            for division_id, queue in queues[year.id].items():
+                queue[:] = [d for d in queue if d.remaining > 0]
+                if queue:
+                    ctx.rng.shuffle(queue)
+                    classes.append(queue)
+
+            for slot_info in year.slots:
+                if slot_info.is_lunch:
                     continue
-                
-                for req in practical_pool:
-                    if req["remaining"] <= 0 or req["count_today"] >= req["max_per_day"]:
-                        continue
-                    
-                    if allocate_slot(req, day, slot_info, class_tt, teacher_tt, room_tt, 
-                                teachers, rooms, saved_timetables, teacher_limits, None, room_mappings):
-                        req["remaining"] -= 1
-                        req["count_today"] += 1
\ No newline at end of file
+
+                if ctx.expired():
+                    ctx.stats.count("practical_probes", probes)
+                    return
+
+                for queue in classes:
+                    for demand in queue:
+                        if demand.remaining <= 0 or demand.count_today >= demand.req.max_per_day:
+                            continue
+
+                        demand.attempted = True
+                        probes += 1
+                        if allocate_slot(ctx, demand, day, slot_info):
+                            demand.remaining -= 1
+                            demand.count_today += 1
+
+    ctx.stats.count("practical_probes", probes)
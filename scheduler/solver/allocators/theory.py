@@ -5,104 +5,99 @@
 import math
 from ..config import DAY_NAMES
 from ..helpers.timetable import get_previous_slot_subject
+from ..helpers.teachers import reset_teacher_daily_counts
 from .base import allocate_slot
 
-def allocate_theory_lectures(theory_pool, years, year_time_slots, class_tt, teacher_tt, 
-                             room_tt, teachers, rooms, saved_timetables, teacher_limits, room_mappings):
-    """Allocate all theory lectures across the week."""
+def allocate_theory_lectures(ctx):
+    """Allocate all theory lectures across the week. Stops early once the deadline is reached."""
     print("=== PHASE 1: ALLOCATING THEORY LECTURES ===")
+    model, theory_pool = ctx.model, ctx.theory_pool
     
+    # Per-division distribution, keyed by division id
     theory_distribution = {}
-    for req in theory_pool:
-        class_key = f"{req['year']}_Div{req['div']}"
-        if class_key not in theory_distribution:
-            theory_distribution[class_key] = {
+    for demand in theory_pool:
+        div_id = demand.req.division_id
+        if div_id not in theory_distribution:
+            theory_distribution[div_id] = {
                 "total_lectures": 0,
                 "subjects": []
             }
-        theory_distribution[class_key]["total_lectures"] += req["remaining"]
-        theory_distribution[class_key]["subjects"].append(req)
+        theory_distribution[div_id]["total_lectures"] += demand.remaining
+        theory_distribution[div_id]["subjects"].append(demand)
 
-    for class_key, dist_data in theory_distribution.items():
-        yname = class_key.split("_")[0]
-        ydata = years[yname]
-        working_days = len([d for d in DAY_NAMES if d not in ydata.get("holidays", [])])
+    for div_id, dist_data in theory_distribution.items():
+        year = model.years[model.divisions[div_id].year_id]
+        working_days = len(year.working_days)
         
         total = dist_data["total_lectures"]
-        dist_data["per_day_target"] = math.ceil(total / working_days)
+        dist_data["per_day_target"] = math.ceil(total / working_days) if working_days else 0
         dist_data["daily_count"] = {day: 0 for day in DAY_NAMES}
 
-    for day in DAY_NAMES:
-        for req in theory_pool:
-            req["count_today"] = 0
+    for day in ctx.seeded_order(DAY_NAMES):
+        if ctx.expired():
+            return
         
-        for teacher_name in teacher_limits:
-            teacher_limits[teacher_name]["daily_count"][day] = 0
+        for demand in theory_pool:
+            demand.count_today = 0
         
-        for yname, slots in year_time_slots.items():
-            ydata = years[yname]
-            
-            if day in ydata.get("holidays", []):
+        reset_teacher_daily_counts(day, ctx.teacher_limits)
+        
+        for year in model.years:
+            if day in year.holidays:
                 continue
             
-            divs = int(ydata.get("divisions", 1))
+            yname, slots = year.name, year.slots
             
-            for div in range(1, divs + 1):
-                class_key = f"{yname}_Div{div}"
+            for div_id in ctx.seeded_order(year.division_ids):
+                if ctx.expired():
+                    return
                 
-                if class_key not in theory_distribution:
+                if div_id not in theory_distribution:
                     continue
                 
-                dist_data = theory_distribution[class_key]
+                div = model.divisions[div_id].number
+                dist_data = theory_distribution[div_id]
                 target = dist_data["per_day_target"]
                 daily_count = dist_data["daily_count"][day]
                 
-                class_lectures = [r for r in theory_pool 
-                                if r["year"] == yname and r["div"] == div and r["remaining"] > 0]
+                # Shuffled first, so the stable sort by hours left breaks ties by seed
+                class_lectures = ctx.seeded_order(d for d in dist_data["subjects"] if d.remaining > 0)
+                for demand in class_lectures:
+                    demand.attempted = True
                 
                 subjects_today = set()
                 
                 for slot_idx, slot_info in enumerate(slots):
-                    if slot_info.get("is_lunch"):
+                    if slot_info.is_lunch:
                         continue
                     
                     if daily_count >= target:
                         break
                     
-                    prev_subject = get_previous_slot_subject(class_tt, yname, div, day, slot_idx, slots)
+                    prev_subject = get_previous_slot_subject(ctx.class_tt, yname, div, day, slot_idx, slots)
                     
-                    unscheduled_today = [r for r in class_lectures 
-                                        if r["remaining"] > 0 
-                                        and r["count_today"] < r["max_per_day"]
-                                        and r["code"] not in subjects_today]
+                    open_lectures = [d for d in class_lectures
+                                     if d.remaining > 0 and d.count_today < d.req.max_per_day]
                     
-                    different_from_prev = [r for r in class_lectures 
-                                        if r["remaining"] > 0 
-                                        and r["count_today"] < r["max_per_day"]
-                                        and r["code"] != prev_subject]
+                    unscheduled_today = [d for d in open_lectures if d.req.code not in subjects_today]
+                    different_from_prev = [d for d in open_lectures if d.req.code != prev_subject]
                     
-                    any_available = [r for r in class_lectures 
-                                    if r["remaining"] > 0 
-                                    and r["count_today"] < r["max_per_day"]]
-                    
-                    for candidate_pool in [unscheduled_today, different_from_prev, any_available]:
+                    for candidate_pool in [unscheduled_today, different_from_prev, open_lectures]:
                         if not candidate_pool:
                             continue
                         
-                        candidate_pool.sort(key=lambda x: x["remaining"], reverse=True)
+                        candidate_pool.sort(key=lambda d: d.remaining, reverse=True)
                         
                         allocated = False
-                        for req in candidate_pool:
-                            if allocate_slot(req, day, slot_info, class_tt, teacher_tt, room_tt, 
-                                        teachers, rooms, saved_timetables, teacher_limits, prev_subject, room_mappings):
-                                req["remaining"] -= 1
-                                req["count_today"] += 1
+                        for demand in candidate_pool:
+                            if allocate_slot(ctx, demand, day, slot_info, previous_subject=prev_subject):
+                                demand.remaining -= 1
+                                demand.count_today += 1
                                 daily_count += 1
                                 dist_data["daily_count"][day] = daily_count
-                                subjects_today.add(req["code"])
+                                subjects_today.add(demand.req.code)
                                 allocated = True
                                 break
                         
                         if allocated:
                             break
-
@@ -0,0 +1,134 @@
+# ============================================
+# FILE 24: solver/allocators/warm_start.py
+# ============================================
+"""
+Warm start: pre-place the saved timetable of every class being regenerated.
+
+Each saved session is checked against the current model (working days, time
+grid, required subjects and batches, qualified teachers, candidate rooms)
+and against what is already placed. Valid sessions are placed and taken off
+their demand, so the allocators only schedule the remaining hours; invalid
+ones are dropped and reported.
+"""
+from ..config import DAY_NAMES
+from ..core.conflict_checker import constraint_conflict, saved_room_conflict, saved_teacher_conflict
+
+
+def _batch_number(value):
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _saved_sessions(slot_map, slot_index):
+    """
+    Sessions in one saved day as (slot_keys, entry), in grid order.
+    Lab parts sharing a lab_session_id form one session.
+    """
+    order = sorted(slot_map or {}, key=lambda k: slot_index.get(k, len(slot_index)))
+    sessions = []
+    labs = {}
+    for slot_key in order:
+        for entry in slot_map.get(slot_key) or []:
+            if not isinstance(entry, dict):
+                continue
+            session_id = entry.get("lab_session_id")
+            if session_id:
+                lab_key = (session_id, entry.get("subject"), _batch_number(entry.get("batch")))
+                if lab_key not in labs:
+                    labs[lab_key] = ([], entry)
+                    sessions.append(labs[lab_key])
+                labs[lab_key][0].append(slot_key)
+            else:
+                sessions.append(([slot_key], entry))
+    return sessions
+
+
+def _rejection(ctx, demand, division, year, day, slot_keys, entry, slot_index):
+    """Why a saved session cannot be kept, or None. Also returns the teacher and room."""
+    model = ctx.model
+    if day not in year.working_days:
+        return "day is not a working day", None, None
+    if any(k not in slot_index for k in slot_keys):
+        return "slot is not in the current time grid", None, None
+    if any(year.slots[slot_index[k]].is_lunch for k in slot_keys):
+        return "slot falls in a break", None, None
+    if demand is None:
+        return "subject or batch is no longer required", None, None
+
+    req = demand.req
+    duration = req.lab_duration if req.kind == "lab" else 1
+    indexes = [slot_index[k] for k in slot_keys]
+    if len(slot_keys) != duration or indexes != list(range(indexes[0], indexes[0] + duration)):
+        return "session length does not match the subject", None, None
+    if demand.remaining < duration:
+        return "subject already has all its hours", None, None
+
+    teacher_id = model.teacher_ids.get(entry.get("teacher"))
+    if teacher_id not in req.teacher_ids:
+        return "teacher no longer teaches this subject", None, None
+    room_id = model.room_ids.get(entry.get("room"))
+    if room_id not in req.room_ids:
+        return "room is no longer available for this subject", None, None
+
+    for slot_key in slot_keys:
+        if ctx.teacher_at.get((teacher_id, day, slot_key)) or saved_teacher_conflict(ctx, teacher_id, day, slot_key):
+            return "teacher is busy at this time", None, None
+        if ctx.room_at.get((room_id, day, slot_key)) or saved_room_conflict(ctx, room_id, day, slot_key):
+            return "room is busy at this time", None, None
+        for occupant in ctx.class_at.get((division.id, day, slot_key), ()):
+            if req.batch is None or occupant.req.batch is None or occupant.req.batch == req.batch:
+                return "class already has a session at this time", None, None
+
+    teacher, room = model.teachers[teacher_id], model.rooms[room_id]
+    conflict = constraint_conflict(ctx, req, day, list(slot_keys), teacher, room)
+    if conflict:
+        return conflict["detail"], None, None
+    return None, teacher, room
+
+
+def apply_warm_start(ctx):
+    """Place valid saved sessions of the classes being regenerated. Returns the report."""
+    print("=== WARM START: RE-USING SAVED TIMETABLES ===")
+    model = ctx.model
+    demands = {
+        (d.req.division_id, d.req.code, d.req.batch): d
+        for d in ctx.demands.values()
+    }
+    report = {"kept": 0, "kept_hours": 0, "dropped": []}
+
+    for division_id, timetable in model.warm_timetables.items():
+        division = model.divisions[division_id]
+        year = model.years[division.year_id]
+        slot_index = {slot.key: slot.index for slot in year.slots}
+
+        for day in DAY_NAMES:
+            for slot_keys, entry in _saved_sessions(timetable.get(day), slot_index):
+                demand = demands.get((division_id, entry.get("subject"), _batch_number(entry.get("batch"))))
+                reason, teacher, room = _rejection(ctx, demand, division, year, day, slot_keys, entry, slot_index)
+                if reason:
+                    report["dropped"].append({
+                        "year": division.year,
+                        "division": division.number,
+                        "day": day,
+                        "slots": slot_keys,
+                        "subject": entry.get("subject"),
+                        "batch": entry.get("batch"),
+                        "reason": reason
+                    })
+                    continue
+
+                placement = ctx.place_session(demand.req, day, slot_keys, teacher, room, count_towards_limit=False)
+                # Kept sessions are what the warm start promises not to move
+                placement.fixed = True
+                demand.remaining -= len(slot_keys)
+                report["kept"] += 1
+                report["kept_hours"] += len(slot_keys)
+
+    ctx.stats.count("warm_start_kept", report["kept"])
+    ctx.stats.count("warm_start_dropped", len(report["dropped"]))
+    ctx.warm_start = report
+    return report
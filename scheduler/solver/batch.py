@@ -0,0 +1,190 @@
+# ============================================
+# FILE 27: solver/batch.py
+# ============================================
+"""
+Multi-department batch solve.
+
+Departments that share no room and no teacher are independent: they are
+solved in parallel worker processes, so an institution-wide run takes about
+as long as its largest group instead of the sum of all departments.
+
+Departments that do share rooms or teachers form one group. A group is
+solved in one worker, largest department first, and every timetable placed
+so far is kept in a common occupancy index that later departments in the
+group receive as saved timetables. A shared room or teacher is therefore
+never booked twice, without merging the departments into one payload.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from .core.deadline import Deadline
+from .core.model import PayloadError
+from .diff import response_result
+from .timetable_solver import solve_timetable
+
+STATUS_RANK = {"success": 0, "partial": 1, "error": 2}
+
+
+def _resource_names(payload):
+    """Room and teacher names a department payload can book."""
+    rooms = {r.get("name") for r in payload.get("rooms") or [] if isinstance(r, dict)}
+    teachers = {t.get("name") for t in payload.get("teachers") or [] if isinstance(t, dict)}
+    return {("room", name) for name in rooms if name} | {("teacher", name) for name in teachers if name}
+
+
+def _required_hours(payload):
+    total = 0
+    for year in (payload.get("years") or {}).values():
+        if not isinstance(year, dict):
+            continue
+        try:
+            divisions = int(year.get("divisions") or 1)
+            total += divisions * sum(
+                int(s.get("hours") or 0) * int(s.get("batches") or 1)
+                for s in year.get("subjects") or [] if isinstance(s, dict)
+            )
+        except (TypeError, ValueError):
+            continue
+    return total
+
+
+def group_departments(departments):
+    """
+    Split departments into groups connected by shared rooms or teachers.
+    Returns (groups, shared) where each group lists department names, largest
+    first, and shared maps "rooms"/"teachers" to names used by several departments.
+    """
+    parent = {name: name for name in departments}
+
+    def find(name):
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    owners = {}
+    for name, payload in departments.items():
+        for resource in _resource_names(payload):
+            owners.setdefault(resource, []).append(name)
+    for names in owners.values():
+        for other in names[1:]:
+            parent[find(other)] = find(names[0])
+
+    groups = {}
+    for name in departments:
+        groups.setdefault(find(name), []).append(name)
+    ordered = [
+        sorted(names, key=lambda n: -_required_hours(departments[n]))
+        for names in groups.values()
+    ]
+    ordered.sort(key=lambda names: -sum(_required_hours(departments[n]) for n in names))
+
+    shared = {"rooms": [], "teachers": []}
+    for (kind, resource), names in sorted(owners.items()):
+        if len(names) > 1:
+            shared[kind + "s"].append(resource)
+    return ordered, shared
+
+
+def _as_saved_timetables(department, class_timetable):
+    """A solved department's classes in saved-timetable form, for the next department."""
+    return [
+        {"year": f"{department}/{year}", "division": division, "timetableData": days}
+        for year, divisions in (class_timetable or {}).items()
+        for division, days in divisions.items()
+    ]
+
+
+def _solve_group(group, ends_at):
+    """
+    Solve one group's departments in order against their common occupancy.
+    Runs in a worker, ends_at being the batch's Deadline.ends_at().
+    """
+    deadline = Deadline.until(ends_at)
+    occupancy = []
+    results = {}
+    for name, payload in group:
+        department_payload = dict(
+            payload,
+            saved_timetables=list(payload.get("saved_timetables") or []) + occupancy
+        )
+        result = solve_timetable(department_payload, deadline.remaining())
+        results[name] = result
+        occupancy.extend(_as_saved_timetables(name, result.get("class_timetable")))
+    return results
+
+
+def _cross_department_conflicts(results):
+    """Rooms and teachers booked by more than one department in the same slot."""
+    booked = {}
+    for name, result in results.items():
+        for year, divisions in (result.get("class_timetable") or {}).items():
+            for division, days in divisions.items():
+                for day, slots in days.items():
+                    for slot_key, entries in slots.items():
+                        for entry in entries:
+                            for kind in ("room", "teacher"):
+                                if entry.get(kind):
+                                    key = (kind, entry[kind], day, slot_key)
+                                    booked.setdefault(key, set()).add(name)
+    return [
+        {"type": kind, "name": resource, "day": day, "slot": slot_key, "departments": sorted(names)}
+        for (kind, resource, day, slot_key), names in sorted(booked.items(), key=str)
+        if len(names) > 1
+    ]
+
+
+def process_pool_context():
+    # forkserver: workers never fork a threaded web worker mid-request
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def solve_departments(departments, deadline=None, max_workers=None):
+    """
+    Solve several department payloads ({name: payload}) together.
+    Independent groups run in parallel processes, at most max_workers at a
+    time (default: CPU count). Every department shares the one deadline.
+    """
+    if not isinstance(departments, dict) or not departments:
+        raise PayloadError([{"path": "departments", "message": "must be a non-empty object keyed by department", "value": None}])
+    errors = [
+        {"path": f"departments.{name}", "message": "must be a JSON object", "value": type(payload).__name__}
+        for name, payload in departments.items() if not isinstance(payload, dict)
+    ]
+    if errors:
+        raise PayloadError(errors)
+
+    deadline = Deadline.coerce(deadline)
+    groups, shared = group_departments(departments)
+    work = [[(name, departments[name]) for name in names] for names in groups]
+    workers = max(1, min(len(work), max_workers or os.cpu_count() or 1))
+    print(f"=== BATCH SOLVE === departments={len(departments)} groups={len(work)} workers={workers}")
+
+    results = {}
+    if workers == 1:
+        for group in work:
+            results.update(_solve_group(group, deadline.ends_at()))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=process_pool_context()) as pool:
+            # The end time, not the seconds left: a group queued behind
+            # max_workers starts late and must not get the full budget again
+            futures = [pool.submit(_solve_group, group, deadline.ends_at()) for group in work]
+            for future in futures:
+                results.update(future.result())
+
+    statuses = [r.get("status", "error") for r in results.values()]
+    return {
+        "status": max(statuses, key=lambda s: STATUS_RANK.get(s, 2)) if statuses else "success",
+        "departments": {name: response_result(results[name]) for name in departments},
+        "groups": groups,
+        "shared_rooms": shared["rooms"],
+        "shared_teachers": shared["teachers"],
+        "cross_department_conflicts": _cross_department_conflicts(results),
+        "workers": workers,
+        "seconds": round(deadline.elapsed(), 4)
+    }
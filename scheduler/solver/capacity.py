@@ -0,0 +1,388 @@
+# ============================================
+# FILE 28: solver/capacity.py
+# ============================================
+"""
+Capacity planning: the fewest rooms, teachers or teaching hours that still
+leave no unallocated hours.
+
+A sweep varies resource dimensions of one base payload:
+
+    {"resource": "rooms", "roomType": "Lab", "min": 1, "max": 8}
+        number of rooms of that type; extra rooms copy the first one as
+        unmapped "Shared" rooms, fewer keeps the first N
+    {"resource": "teachers", "subject": "CS301", "min": 0, "max": 4}
+        extra teachers qualified only for the subject
+    {"resource": "maxHoursPerDay", "min": 3, "max": 8, "subject": optional}
+        daily limit of every teacher (or of the subject's teachers)
+
+All dimensions start at their maximum. If that configuration meets the
+target, each dimension in turn is lowered to its smallest value that still
+meets it, with the others held at their current values. Dimensions are
+monotone by default (more resources never leave more hours unallocated), so
+each is searched by bisection; every round probes several values in parallel
+worker processes. "monotone": false evaluates every value instead, and
+"curve": true also evaluates the full range around the final configuration.
+
+Every variant is solved with the same seed, so results differ only by the
+resources. Each worker keeps the base payload and the process-wide slot grid
+and room index caches for the whole sweep.
+"""
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from .batch import process_pool_context
+from .core.deadline import Deadline
+from .core.model import DEFAULT_TEACHER_MAX_PER_DAY, PayloadError, compile_payload
+from .timetable_solver import solve_timetable
+
+RESOURCES = ("rooms", "teachers", "maxHoursPerDay")
+
+
+@dataclass(frozen=True)
+class Dimension:
+    resource: str
+    minimum: int
+    maximum: int
+    step: int = 1
+    room_type: str = None
+    subject: str = None
+    monotone: bool = True
+    curve: bool = False
+
+    @property
+    def label(self):
+        if self.resource == "rooms":
+            return f"rooms:{self.room_type}"
+        if self.subject:
+            return f"{self.resource}:{self.subject}"
+        return self.resource
+
+    def values(self, low=None, high=None):
+        low = self.minimum if low is None else low
+        high = self.maximum if high is None else high
+        return list(range(low, high + 1, self.step))
+
+    def apply(self, payload, value):
+        """payload with this dimension set to value (a shallow copy; the base is untouched)."""
+        if self.resource == "rooms":
+            rooms = payload.get("rooms") or []
+            matching = [r for r in rooms if r.get("type") == self.room_type]
+            others = [r for r in rooms if r.get("type") != self.room_type]
+            template = matching[0] if matching else {"type": self.room_type}
+            extra = [
+                {**template, "name": f"Extra {self.room_type} {k + 1}", "primaryYear": "Shared"}
+                for k in range(max(0, value - len(matching)))
+            ]
+            return dict(payload, rooms=others + matching[:value] + extra)
+
+        teachers = payload.get("teachers") or []
+        if self.resource == "teachers":
+            limits = [t.get("maxHoursPerDay") for t in teachers if _teaches(t, self.subject)]
+            limits = [int(v) for v in limits if v not in (None, "")]
+            extra = [
+                {"name": f"Extra {self.subject} teacher {k + 1}",
+                 "subjects": [{"code": self.subject}],
+                 "maxHoursPerDay": max(limits, default=DEFAULT_TEACHER_MAX_PER_DAY)}
+                for k in range(value)
+            ]
+            return dict(payload, teachers=list(teachers) + extra)
+
+        return dict(payload, teachers=[
+            dict(t, maxHoursPerDay=value) if self.subject is None or _teaches(t, self.subject) else t
+            for t in teachers
+        ])
+
+
+def _teaches(teacher, code):
+    return any(
+        (s.get("code") if isinstance(s, dict) else s) == code
+        for s in teacher.get("subjects") or []
+    )
+
+
+def parse_dimensions(raw):
+    """Dimension list from the request's "dimensions". Raises PayloadError."""
+    if not isinstance(raw, list) or not raw:
+        raise PayloadError([{"path": "dimensions", "message": "must be a non-empty list", "value": raw}])
+    errors = []
+    dimensions = []
+    for i, spec in enumerate(raw):
+        path = f"dimensions[{i}]"
+        if not isinstance(spec, dict):
+            errors.append({"path": path, "message": "must be an object", "value": spec})
+            continue
+        resource = spec.get("resource")
+        if resource not in RESOURCES:
+            errors.append({"path": f"{path}.resource", "message": f"must be one of {list(RESOURCES)}", "value": resource})
+            continue
+        if resource == "rooms" and not spec.get("roomType"):
+            errors.append({"path": f"{path}.roomType", "message": "is required for rooms", "value": None})
+            continue
+        if resource == "teachers" and not spec.get("subject"):
+            errors.append({"path": f"{path}.subject", "message": "is required for teachers", "value": None})
+            continue
+        try:
+            minimum = int(spec.get("min", 1 if resource == "maxHoursPerDay" else 0))
+            maximum = int(spec["max"])
+            step = int(spec.get("step", 1))
+        except (KeyError, TypeError, ValueError):
+            errors.append({"path": path, "message": "min, max and step must be integers (max is required)", "value": spec})
+            continue
+        if minimum < 0 or maximum < minimum or step < 1 or (resource == "maxHoursPerDay" and minimum < 1):
+            errors.append({"path": path, "message": "needs 0 <= min <= max and step >= 1", "value": spec})
+            continue
+        # Keep max on the step grid so the starting configuration is a probed value
+        maximum -= (maximum - minimum) % step
+        dimensions.append(Dimension(
+            resource, minimum, maximum, step,
+            room_type=spec.get("roomType"),
+            subject=spec.get("subject"),
+            monotone=spec.get("monotone", True) is not False,
+            curve=bool(spec.get("curve", False))
+        ))
+    labels = [d.label for d in dimensions]
+    for label in {l for l in labels if labels.count(l) > 1}:
+        errors.append({"path": "dimensions", "message": f"{label} is swept more than once", "value": label})
+    if errors:
+        raise PayloadError(errors)
+    return dimensions
+
+
+def build_variant(base, dimensions, config):
+    """base payload with every dimension set to its value in config."""
+    variant = base
+    for dimension, value in zip(dimensions, config):
+        variant = dimension.apply(variant, value)
+    return variant
+
+
+def evaluate_variant(base, dimensions, config, time_limit):
+    result = solve_timetable(build_variant(base, dimensions, config), time_limit)
+    counters = (result.get("stats") or {}).get("counters", {})
+    return {
+        "status": result["status"],
+        "unallocated_hours": counters.get("unallocated_hours", 0) if result["status"] != "error" else None,
+        "seconds": (result.get("stats") or {}).get("total_seconds"),
+        "deadline_reached": result["deadline_reached"],
+        "error": result.get("error")
+    }
+
+
+# ----- worker processes ---------------------------------------------------------
+
+_worker_sweep = None
+
+
+def _init_worker(base, dimensions):
+    """Keep the base payload for the whole sweep and warm the shared caches once."""
+    global _worker_sweep
+    _worker_sweep = (base, dimensions)
+    try:
+        compile_payload(base)
+    except PayloadError:
+        pass
+
+
+def _variant_limit(ends_at, variant_limit):
+    """
+    Seconds for a variant starting now: what is left of the sweep (ends_at
+    from Deadline.ends_at()), capped at variant_limit. None is no limit.
+    """
+    remaining = Deadline.until(ends_at).remaining()
+    if remaining is None:
+        return variant_limit
+    if variant_limit is None:
+        return remaining
+    return min(remaining, variant_limit)
+
+
+def _evaluate_in_worker(config, ends_at, variant_limit):
+    """Outcome of one variant, or None when the sweep's time ran out before it started."""
+    time_limit = _variant_limit(ends_at, variant_limit)
+    if time_limit == 0:
+        return None
+    base, dimensions = _worker_sweep
+    return evaluate_variant(base, dimensions, config, time_limit)
+
+
+class _Sweep:
+    def __init__(self, base, dimensions, target, deadline, variant_limit, pool, workers):
+        self.base = base
+        self.dimensions = dimensions
+        self.target = target
+        self.deadline = deadline
+        self.variant_limit = variant_limit
+        self.pool = pool
+        self.workers = workers
+        # config tuple -> outcome
+        self.outcomes = {}
+        # dimension index -> configuration its curve is read at
+        self.curve_at = {}
+
+    def evaluate(self, configs):
+        """
+        Solve every config not seen yet, in parallel when there is a pool.
+        Configs the sweep's time ran out before are left without an outcome.
+        """
+        todo = [c for c in dict.fromkeys(configs) if c not in self.outcomes]
+        if todo and not self.deadline.expired():
+            # Each variant's budget is read when it starts, not when it is queued
+            ends_at = self.deadline.ends_at()
+            if self.pool is None:
+                for config in todo:
+                    limit = _variant_limit(ends_at, self.variant_limit)
+                    if limit == 0:
+                        break
+                    self.outcomes[config] = evaluate_variant(self.base, self.dimensions, config, limit)
+            else:
+                futures = {c: self.pool.submit(_evaluate_in_worker, c, ends_at, self.variant_limit) for c in todo}
+                for config, future in futures.items():
+                    outcome = future.result()
+                    if outcome is not None:
+                        self.outcomes[config] = outcome
+        return [self.outcomes.get(c) for c in configs]
+
+    def meets_target(self, config):
+        outcome = self.outcomes.get(config)
+        return (outcome is not None and outcome["unallocated_hours"] is not None
+                and outcome["unallocated_hours"] <= self.target)
+
+    def lower(self, index, config):
+        """Smallest value of dimension index that meets the target, others fixed at config."""
+        dimension = self.dimensions[index]
+
+        def at(value):
+            return config[:index] + (value,) + config[index + 1:]
+
+        if not dimension.monotone:
+            candidates = dimension.values()
+            self.evaluate([at(v) for v in candidates])
+            feasible = [v for v in candidates if self.meets_target(at(v))]
+            return min(feasible) if feasible else config[index]
+
+        # Bisection over the step grid, probing up to `workers` values per round.
+        # Invariant: high meets the target; everything below low is known not to.
+        low, high = dimension.minimum, config[index]
+        while low < high and not self.deadline.expired():
+            below = dimension.values(low, high - dimension.step)
+            # k probes split the open range into k + 1 parts (k = 1 is plain bisection)
+            k = min(self.workers, len(below))
+            probes = sorted({below[(i + 1) * len(below) // (k + 1)] for i in range(k)})
+            self.evaluate([at(v) for v in probes])
+            for value in probes:
+                if self.meets_target(at(value)):
+                    high = value
+                    break
+                if self.outcomes.get(at(value)) is not None:
+                    low = value + dimension.step
+        return high
+
+    def curve(self, index):
+        config = self.curve_at.get(index)
+        if config is None:
+            return []
+        points = []
+        for c, outcome in self.outcomes.items():
+            if outcome is not None and all(c[i] == config[i] for i in range(len(config)) if i != index):
+                points.append({"value": c[index], **outcome})
+        return sorted(points, key=lambda p: p["value"])
+
+
+def _finite(value):
+    """value as a finite float, or None when it isn't one."""
+    if isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def sweep_capacity(payload, dimensions, deadline=None, max_workers=None, target=0, variant_time_limit=None):
+    """
+    Find the smallest configuration of the given dimensions whose solve leaves
+    at most target unallocated hours. Returns the configuration and, per
+    dimension, the unallocated-hours curve of every probed value.
+    Raises PayloadError for a malformed payload, dimension, target or
+    variant time limit.
+    """
+    if not isinstance(payload, dict):
+        raise PayloadError([{"path": "", "message": "payload must be a JSON object", "value": None}])
+    errors = []
+    try:
+        dimensions = parse_dimensions(dimensions)
+    except PayloadError as e:
+        errors.extend(e.errors)
+    hours = _finite(0 if target is None else target)
+    if hours is None or hours < 0:
+        errors.append({"path": "targetUnallocatedHours", "message": "must be a number >= 0", "value": target})
+    target = hours
+    if variant_time_limit == "":
+        variant_time_limit = None
+    if variant_time_limit is not None:
+        seconds = _finite(variant_time_limit)
+        if seconds is None or seconds <= 0:
+            errors.append({"path": "variantTimeLimit", "message": "must be a positive, finite number of seconds",
+                           "value": variant_time_limit})
+        variant_time_limit = seconds
+    if errors:
+        raise PayloadError(errors)
+    deadline = Deadline.coerce(deadline)
+    # A fixed seed so variants differ only by their resources
+    base = {k: v for k, v in payload.items() if k not in ("dimensions", "timeLimit")}
+    base.setdefault("seed", 0)
+    compile_payload(base)
+
+    workers = max(1, min(max_workers or os.cpu_count() or 1, 16))
+    print(f"=== CAPACITY SWEEP === dimensions={[d.label for d in dimensions]} workers={workers}")
+
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=process_pool_context(),
+            initializer=_init_worker, initargs=(base, dimensions)
+        )
+    try:
+        sweep = _Sweep(base, dimensions, target, deadline, variant_time_limit, pool, workers)
+        config = tuple(d.maximum for d in dimensions)
+        sweep.evaluate([config])
+        feasible = sweep.meets_target(config)
+        for index in range(len(dimensions)):
+            sweep.curve_at[index] = config
+        if feasible:
+            for index in range(len(dimensions)):
+                sweep.curve_at[index] = config
+                value = sweep.lower(index, config)
+                config = config[:index] + (value,) + config[index + 1:]
+        for index, dimension in enumerate(dimensions):
+            if dimension.curve:
+                sweep.curve_at[index] = config
+                sweep.evaluate([config[:index] + (v,) + config[index + 1:] for v in dimension.values()])
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    return {
+        "feasible": feasible,
+        "target_unallocated_hours": target,
+        "minimal": {d.label: v for d, v in zip(dimensions, config)} if feasible else None,
+        "dimensions": [
+            {
+                "label": d.label,
+                "min": d.minimum,
+                "max": d.maximum,
+                "step": d.step,
+                "monotone": d.monotone,
+                "minimal": config[i] if feasible else None,
+                "curve": sweep.curve(i)
+            }
+            for i, d in enumerate(dimensions)
+        ],
+        "evaluations": len(sweep.outcomes),
+        "workers": workers,
+        "deadline_reached": deadline.reached,
+        "seconds": round(deadline.elapsed(), 4)
+    }
@@ -0,0 +1,264 @@
+# ============================================
+# FILE 33: solver/cli.py
+# ============================================
+"""
+Offline batch solving from the command line.
+
+    python -m solver [INPUT ...] [--workers N] [--snapshot FILE]
+                     [--time-limit S] [--engine NAME] [--metrics-only]
+                     [--output FILE] [--verbose]
+
+Each INPUT is a .json file holding one payload, or an NDJSON file (.ndjson,
+.jsonl) with one payload per line; "-" or no INPUT reads NDJSON from stdin.
+Payloads are solved in a process pool and written to --output (default
+stdout) as NDJSON, one line per payload in the order the solves finish:
+
+    {"index", "source", "id", "status", "metrics": {...}, "result": {...}}
+
+"index" is the payload's position in the input and "id" its own "id" field,
+so results can be matched up whatever order they arrive in. "metrics" holds
+the solve's latency, phases, counters and quality score, and the worker that
+ran it; --metrics-only leaves out the result for what-if studies that only
+need the numbers.
+
+The parent process only reads lines: parsing and solving happen in the
+workers, and at most a few payloads per worker are in flight, so an input
+stream of any length runs in constant memory.
+
+Saved timetables can come from snapshot files instead of every payload:
+--snapshot for all payloads, or "snapshot": "path" in a payload. A snapshot
+is a JSON list of saved timetables (or an object with "saved_timetables"),
+or NDJSON with one saved timetable per line. Snapshots are memory-mapped and
+parsed once per worker, then shared by every payload that worker solves;
+NDJSON snapshots are decoded line by line straight from the mapping, without
+reading the file into memory first. Payload saved_timetables are kept after
+the snapshot's.
+
+Solver progress is discarded (written to stderr with --verbose); a summary
+goes to stderr at the end. Exits with status 1 when any payload failed.
+"""
+import argparse
+import contextlib
+import io
+import json
+import mmap
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .batch import STATUS_RANK, process_pool_context
+from .diff import response_result
+from .recommendations.deferred import RECOMMENDATIONS
+from .timetable_solver import build_error_result, solve_timetable
+
+NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+IN_FLIGHT_PER_WORKER = 2
+
+# Parsed snapshots of this process: (path, mtime, size) -> saved timetables
+_snapshots = {}
+_verbose = False
+
+
+# ----- snapshots -------------------------------------------------------------------
+
+def _decode_snapshot(mapped, path):
+    if path.endswith(NDJSON_SUFFIXES):
+        timetables = []
+        for line in iter(mapped.readline, b""):
+            if line.strip():
+                timetables.append(json.loads(line))
+        return timetables
+    document = json.loads(mapped[:])
+    if isinstance(document, dict):
+        document = document.get("saved_timetables")
+    if not isinstance(document, list):
+        raise ValueError("expected a list of saved timetables or an object with \"saved_timetables\"")
+    return document
+
+
+def load_snapshot(path):
+    """Saved timetables of a snapshot file, memory-mapped and parsed once per process."""
+    path = os.path.abspath(path)
+    info = os.stat(path)
+    key = (path, info.st_mtime_ns, info.st_size)
+    if key not in _snapshots:
+        if info.st_size == 0:
+            timetables = []
+        else:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                timetables = _decode_snapshot(mapped, path)
+        # A changed file replaces its old version
+        for old in [k for k in _snapshots if k[0] == path]:
+            del _snapshots[old]
+        _snapshots[key] = timetables
+    return _snapshots[key]
+
+
+# ----- one item --------------------------------------------------------------------
+
+def _init_worker(snapshot, verbose):
+    global _verbose
+    _verbose = verbose
+    # Nothing serves /recommendations here: deferred handles are rebuild-only
+    RECOMMENDATIONS.keep_handles = False
+    if snapshot:
+        load_snapshot(snapshot)
+
+
+def item_metrics(result, seconds):
+    stats = result.get("stats") or {}
+    return {
+        "seconds": round(seconds, 4),
+        "solver_seconds": stats.get("total_seconds"),
+        "engine": result.get("engine"),
+        "deadline_reached": result.get("deadline_reached"),
+        "phases": stats.get("phases", {}),
+        "counters": stats.get("counters", {}),
+        "quality_score": (result.get("quality") or {}).get("score"),
+        "worker": os.getpid(),
+    }
+
+
+def solve_item(text, snapshot=None, time_limit=None, engine=None):
+    """Parse and solve one payload. Returns (payload id, result, metrics). Runs in a worker."""
+    started = time.perf_counter()
+    payload_id = None
+    try:
+        payload = json.loads(text)
+        if not isinstance(payload, dict):
+            raise ValueError("a payload must be a JSON object")
+        payload_id = payload.get("id")
+        snapshot = payload.pop("snapshot", None) or snapshot
+        if snapshot:
+            payload["saved_timetables"] = load_snapshot(snapshot) + list(payload.get("saved_timetables") or [])
+        if engine:
+            payload["engine"] = engine
+        deadline = time_limit if time_limit is not None else payload.get("timeLimit")
+        log = sys.stderr if _verbose else io.StringIO()
+        with contextlib.redirect_stdout(log):
+            result = solve_timetable(payload, deadline)
+    except (ValueError, OSError) as e:
+        result = build_error_result([f"INVALID INPUT: {e}"], error=str(e))
+    return payload_id, result, item_metrics(result, time.perf_counter() - started)
+
+
+# ----- input -----------------------------------------------------------------------
+
+def read_inputs(paths, stdin=None):
+    """(source, payload text) for every payload of the inputs, read lazily."""
+    for path in paths or ["-"]:
+        if path == "-":
+            stream = stdin or sys.stdin
+            for number, line in enumerate(stream, 1):
+                if line.strip():
+                    yield f"stdin:{number}", line
+        elif path.endswith(NDJSON_SUFFIXES):
+            with open(path, encoding="utf-8") as f:
+                for number, line in enumerate(f, 1):
+                    if line.strip():
+                        yield f"{path}:{number}", line
+        else:
+            with open(path, encoding="utf-8") as f:
+                yield path, f.read()
+
+
+def _line(index, source, payload_id, result, metrics, metrics_only):
+    item = {"index": index, "source": source, "id": payload_id, "status": result.get("status"), "metrics": metrics}
+    if result.get("error"):
+        item["error"] = result["error"]
+    if not metrics_only:
+        item["result"] = response_result(result)
+    return json.dumps(item, separators=(",", ":"), default=str) + "\n"
+
+
+def run(inputs, output, workers=None, snapshot=None, time_limit=None, engine=None,
+        metrics_only=False, verbose=False):
+    """Solve every (source, text) of inputs, writing NDJSON lines to output as they finish. Returns a summary."""
+    workers = max(1, workers or os.cpu_count() or 1)
+    started = time.perf_counter()
+    statuses = {}
+
+    def emit(index, source, outcome):
+        payload_id, result, metrics = outcome
+        status = result.get("status", "error")
+        statuses[status] = statuses.get(status, 0) + 1
+        output.write(_line(index, source, payload_id, result, metrics, metrics_only))
+        output.flush()
+
+    if workers == 1:
+        _init_worker(snapshot, verbose)
+        for index, (source, text) in enumerate(inputs):
+            emit(index, source, solve_item(text, snapshot, time_limit, engine))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=process_pool_context(),
+                                 initializer=_init_worker, initargs=(snapshot, verbose)) as pool:
+            pending = {}
+            inputs = enumerate(inputs)
+            exhausted = False
+            while pending or not exhausted:
+                # Keep the pool busy without reading the whole input
+                while not exhausted and len(pending) < workers * IN_FLIGHT_PER_WORKER:
+                    try:
+                        index, (source, text) = next(inputs)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    future = pool.submit(solve_item, text, snapshot, time_limit, engine)
+                    pending[future] = (index, source)
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, source = pending.pop(future)
+                    try:
+                        outcome = future.result()
+                    except Exception as e:
+                        # The worker itself died (out of memory, killed)
+                        outcome = (None, build_error_result([f"System error: {e}"], error=str(e)), {"worker": None})
+                    emit(index, source, outcome)
+
+    total = sum(statuses.values())
+    seconds = time.perf_counter() - started
+    return {
+        "payloads": total,
+        "statuses": statuses,
+        "workers": workers,
+        "seconds": round(seconds, 4),
+        "payloads_per_second": round(total / seconds, 3) if seconds else 0.0,
+        "status": max(statuses, key=lambda s: STATUS_RANK.get(s, 2)) if statuses else "success",
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m solver",
+        description="Solve timetable payloads from files or an NDJSON stream in a process pool."
+    )
+    parser.add_argument("inputs", nargs="*", help=".json or .ndjson/.jsonl files, or - for stdin (default)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--snapshot", help="saved-timetable snapshot for every payload")
+    parser.add_argument("--time-limit", type=float, help="time budget per payload in seconds")
+    parser.add_argument("--engine", help="solver engine for every payload")
+    parser.add_argument("--metrics-only", action="store_true", help="leave the result out of each line")
+    parser.add_argument("--output", help="NDJSON output file (default: stdout)")
+    parser.add_argument("--verbose", action="store_true", help="solver progress to stderr")
+    args = parser.parse_args(argv)
+
+    if args.snapshot:
+        try:
+            load_snapshot(args.snapshot)
+        except (OSError, ValueError) as e:
+            parser.error(f"cannot load snapshot {args.snapshot}: {e}")
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        summary = run(read_inputs(args.inputs), output, args.workers, args.snapshot,
+                      args.time_limit, args.engine, args.metrics_only, args.verbose)
+    finally:
+        if args.output:
+            output.close()
+    print(f"=== BATCH CLI === {summary['payloads']} payloads in {summary['seconds']}s "
+          f"({summary['payloads_per_second']}/s, {summary['workers']} workers) {summary['statuses']}",
+          file=sys.stderr)
+    return 1 if summary["statuses"].get("error") else 0
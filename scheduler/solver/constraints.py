@@ -0,0 +1,342 @@
+# ============================================
+# FILE 30: solver/constraints.py
+# ============================================
+"""
+Declarative scheduling constraints.
+
+The payload's "constraints" list is compiled once per solve into bitmasks
+over each year's slot grid, so the allocators check any number of rules with
+the same few lookups:
+
+    {"type": "teacherUnavailable", "teacher": "A. Rao", "days": ["Fri"], "from": "14:00", "to": "17:00"}
+    {"type": "roomBlackout", "room": "Lab 2", "days": ["Mon"], "periods": [1, 2]}
+    {"type": "classUnavailable", "year": "SE", "division": 1, "days": ["Wed"], "from": "11:00", "to": "12:00"}
+    {"type": "latestEnd", "subjectType": "Lab", "time": "16:00"}      (or "period": 6)
+    {"type": "maxConsecutive", "resource": "teacher", "limit": 3}      (or "class"; "teacher"/"year" narrow it)
+
+"days" defaults to every day. A window is "from"/"to" clock times or a list
+of "periods". latestEnd may be narrowed with "subject", "subjectType" and "year"
+(one year name or a list of them).
+
+Hard rules (the default) become forbidden-slot masks per requirement,
+teacher or room and day. maxConsecutive depends on what is already placed,
+so it is checked against occupancy masks the SolverContext keeps.
+With "soft": true (and an optional "weight", default 1) a rule is never
+enforced. It becomes a penalty table instead, and the quality score adds
+weight × hours for every violation.
+"""
+from .config import DAY_NAMES
+from .utils import global_slot_order, run_starts, time_to_minutes
+
+RULE_TYPES = ("teacherUnavailable", "roomBlackout", "classUnavailable", "latestEnd", "maxConsecutive")
+
+
+class ConstraintSet:
+    """Compiled constraints of one payload. Read-only once compiled."""
+
+    def __init__(self, years):
+        # year_id -> slot key -> bit in that year's grid
+        self.year_bits = [{slot.key: 1 << slot.index for slot in year.slots} for year in years]
+        # Teachers can span years with different grids: one global slot order
+        self.teacher_bits = {key: 1 << i for i, key in enumerate(global_slot_order(years))}
+
+        # Hard: key -> (forbidden mask, rule type)
+        self.requirement_masks = {}     # (req_id, day)
+        self.teacher_masks = {}         # (teacher_id, year_id, day)
+        self.room_masks = {}            # (room_id, year_id, day)
+        self.class_limits = {}          # division_id -> most consecutive periods
+        self.teacher_limits = {}        # teacher_id -> most consecutive periods
+
+        # Soft: key -> penalty per slot index; limits -> [(limit, weight)]
+        self.penalty_tables = {}        # ("req", req_id, day) / ("teacher"|"room", id, year_id, day)
+        self.soft_class_limits = {}
+        self.soft_teacher_limits = {}
+
+    @property
+    def active(self):
+        """Any hard rule to check while placing."""
+        return bool(self.requirement_masks or self.teacher_masks or self.room_masks
+                    or self.class_limits or self.teacher_limits)
+
+    @property
+    def tracks_occupancy(self):
+        return bool(self.class_limits or self.teacher_limits)
+
+    @property
+    def soft(self):
+        return bool(self.penalty_tables or self.soft_class_limits or self.soft_teacher_limits)
+
+    # ----- checks -------------------------------------------------------------
+
+    def slot_bits(self, year_id, slot_keys):
+        bits = self.year_bits[year_id]
+        mask = 0
+        for key in slot_keys:
+            mask |= bits[key]
+        return mask
+
+    def global_bits(self, slot_keys):
+        mask = 0
+        for key in slot_keys:
+            mask |= self.teacher_bits[key]
+        return mask
+
+    def _blocked(self, masks, key, bits):
+        entry = masks.get(key)
+        return entry[1] if entry and entry[0] & bits else None
+
+    def requirement_blocked(self, req, day, bits):
+        return self._blocked(self.requirement_masks, (req.id, day), bits)
+
+    def teacher_blocked(self, teacher_id, year_id, day, bits):
+        return self._blocked(self.teacher_masks, (teacher_id, year_id, day), bits)
+
+    def room_blocked(self, room_id, year_id, day, bits):
+        return self._blocked(self.room_masks, (room_id, year_id, day), bits)
+
+    def class_too_long(self, ctx, req, day, slot_keys):
+        limit = self.class_limits.get(req.division_id)
+        if limit is None:
+            return False
+        busy = ctx.class_busy.get((req.division_id, day), 0) | self.slot_bits(req.year_id, slot_keys)
+        return bool(run_starts(busy, limit + 1))
+
+    def teacher_too_long(self, ctx, teacher_id, day, slot_keys):
+        limit = self.teacher_limits.get(teacher_id)
+        if limit is None:
+            return False
+        busy = ctx.teacher_busy.get((teacher_id, day), 0) | self.global_bits(slot_keys)
+        return bool(run_starts(busy, limit + 1))
+
+    def static_penalty(self, req, day, slot_keys, teacher_id, room_id):
+        """Soft window penalty of one session."""
+        indexes = [self.year_bits[req.year_id][key].bit_length() - 1 for key in slot_keys]
+        penalty = 0.0
+        for key in (("req", req.id, day),
+                    ("teacher", teacher_id, req.year_id, day),
+                    ("room", room_id, req.year_id, day)):
+            table = self.penalty_tables.get(key)
+            if table:
+                penalty += sum(table[i] for i in indexes)
+        return penalty
+
+
+# ----- compilation ----------------------------------------------------------------
+
+def _window_mask(rule, year, path, errors):
+    """Slots of year inside the rule's window; every slot when it gives none."""
+    periods = rule.get("periods")
+    if periods is not None:
+        if not isinstance(periods, list):
+            errors.add(f"{path}.periods", "must be a list of period numbers", periods)
+            return 0
+        wanted = {str(p) for p in periods}
+        return sum(1 << s.index for s in year.slots if str(s.period) in wanted)
+    if rule.get("from") is None and rule.get("to") is None:
+        return sum(1 << s.index for s in year.slots)
+    try:
+        start = time_to_minutes(rule.get("from", "00:00"))
+        end = time_to_minutes(rule.get("to", "24:00"))
+    except ValueError:
+        errors.add(path, "from/to must be HH:MM times", [rule.get("from"), rule.get("to")])
+        return 0
+    if any(s.start is None for s in year.slots):
+        errors.add(path, "clock times need real time slots; use periods instead", rule.get("from"))
+        return 0
+    return sum(
+        1 << s.index for s in year.slots
+        if time_to_minutes(s.start) < end and time_to_minutes(s.end) > start
+    )
+
+
+def _late_mask(rule, year, path, errors):
+    """Slots of year ending after the rule's latest end."""
+    if rule.get("period") is not None:
+        try:
+            last = int(rule["period"])
+        except (TypeError, ValueError):
+            errors.add(f"{path}.period", "must be a period number", rule.get("period"))
+            return 0
+        return sum(1 << s.index for s in year.slots
+                   if isinstance(s.period, int) and s.period > last)
+    try:
+        latest = time_to_minutes(rule.get("time"))
+    except ValueError:
+        errors.add(f"{path}.time", "must be an HH:MM time (or give a period)", rule.get("time"))
+        return 0
+    if any(s.end is None for s in year.slots):
+        errors.add(path, "clock times need real time slots; use period instead", rule.get("time"))
+        return 0
+    return sum(1 << s.index for s in year.slots if time_to_minutes(s.end) > latest)
+
+
+def _days(rule, path, errors):
+    days = rule.get("days")
+    if days is None:
+        return DAY_NAMES
+    if not isinstance(days, list) or any(d not in DAY_NAMES for d in days):
+        errors.add(f"{path}.days", f"must be a list of {list(DAY_NAMES)}", days)
+        return []
+    return days
+
+
+def _weight(rule, path, errors):
+    try:
+        weight = float(rule.get("weight", 1.0))
+    except (TypeError, ValueError):
+        errors.add(f"{path}.weight", "must be a number", rule.get("weight"))
+        return 0.0
+    return weight
+
+
+def _add_mask(masks, key, mask, rule_type):
+    if mask:
+        current, label = masks.get(key, (0, rule_type))
+        masks[key] = (current | mask, label)
+
+
+def _add_penalty(tables, key, mask, weight, size):
+    if mask and weight:
+        table = list(tables.get(key) or [0.0] * size)
+        for i in range(size):
+            if mask >> i & 1:
+                table[i] += weight
+        tables[key] = tuple(table)
+
+
+def _lookup(ids, name):
+    """ids[name], or None for an unknown name (or one that is not a valid key at all)."""
+    try:
+        return ids.get(name)
+    except TypeError:
+        return None
+
+
+def _rule_years(rule, path, year_names, errors):
+    """Years a rule's "year" (one name, a list of names, or absent for all) covers, or None if invalid."""
+    years = rule.get("year")
+    if years is None:
+        return set(year_names)
+    if isinstance(years, str):
+        years = [years]
+    if not isinstance(years, list) or not all(isinstance(y, str) for y in years):
+        errors.add(f"{path}.year", "must be a year name or a list of year names", years)
+        return None
+    unknown = [y for y in years if y not in year_names]
+    if unknown:
+        errors.add(f"{path}.year", "unknown year", unknown[0])
+        return None
+    return set(years)
+
+
+def _matching_requirements(rule, requirements, years):
+    return [
+        req for req in requirements
+        if req.year in years
+        and rule.get("subject") in (None, req.code)
+        and rule.get("subjectType") in (None, req.type)
+        and (rule.get("division") is None or str(rule["division"]) == str(req.div))
+    ]
+
+
+def compile_constraints(raw_rules, years, teacher_ids, room_ids, divisions, requirements, errors):
+    """ConstraintSet for the payload's "constraints". Problems are added to errors."""
+    constraints = ConstraintSet(years)
+    if raw_rules in (None, []):
+        return constraints
+    if not isinstance(raw_rules, list):
+        errors.add("constraints", "must be a list", type(raw_rules).__name__)
+        return constraints
+
+    year_names = [year.name for year in years]
+    for i, rule in enumerate(raw_rules):
+        path = f"constraints[{i}]"
+        if not isinstance(rule, dict) or rule.get("type") not in RULE_TYPES:
+            errors.add(f"{path}.type", f"must be one of {list(RULE_TYPES)}",
+                       rule.get("type") if isinstance(rule, dict) else rule)
+            continue
+        rule_type = rule["type"]
+        soft = bool(rule.get("soft", False))
+        weight = _weight(rule, path, errors) if soft else None
+        days = _days(rule, path, errors)
+
+        if rule_type in ("teacherUnavailable", "roomBlackout"):
+            kind, field, ids = (("teacher", "teacher", teacher_ids) if rule_type == "teacherUnavailable"
+                                else ("room", "room", room_ids))
+            resource_id = _lookup(ids, rule.get(field))
+            if resource_id is None:
+                errors.add(f"{path}.{field}", f"unknown {field}", rule.get(field))
+                continue
+            masks = constraints.teacher_masks if kind == "teacher" else constraints.room_masks
+            reported = len(errors.items)
+            for year in years:
+                mask = _window_mask(rule, year, path, errors)
+                if len(errors.items) > reported:
+                    break
+                for day in days:
+                    if soft:
+                        _add_penalty(constraints.penalty_tables, (kind, resource_id, year.id, day),
+                                     mask, weight, len(year.slots))
+                    else:
+                        _add_mask(masks, (resource_id, year.id, day), mask, rule_type)
+
+        elif rule_type in ("classUnavailable", "latestEnd"):
+            if rule_type == "classUnavailable" and rule.get("year") not in year_names:
+                errors.add(f"{path}.year", "unknown year", rule.get("year"))
+                continue
+            rule_years = _rule_years(rule, path, year_names, errors)
+            if rule_years is None:
+                continue
+            matching = _matching_requirements(rule, requirements, rule_years)
+            year_masks = {}
+            reported = len(errors.items)
+            for req in matching:
+                if req.year_id not in year_masks:
+                    year = years[req.year_id]
+                    if rule_type == "latestEnd":
+                        year_masks[req.year_id] = _late_mask(rule, year, path, errors)
+                    else:
+                        year_masks[req.year_id] = _window_mask(rule, year, path, errors)
+                    # One report per rule, not one per year
+                    if len(errors.items) > reported:
+                        break
+                for day in days:
+                    if soft:
+                        _add_penalty(constraints.penalty_tables, ("req", req.id, day), year_masks[req.year_id],
+                                     weight, len(years[req.year_id].slots))
+                    else:
+                        _add_mask(constraints.requirement_masks, (req.id, day), year_masks[req.year_id], rule_type)
+
+        else:
+            try:
+                limit = int(rule.get("limit"))
+            except (TypeError, ValueError):
+                limit = 0
+            if limit < 1:
+                errors.add(f"{path}.limit", "must be a whole number of periods, at least 1", rule.get("limit"))
+                continue
+            resource = rule.get("resource")
+            if resource == "teacher":
+                if rule.get("teacher") is not None and _lookup(teacher_ids, rule["teacher"]) is None:
+                    errors.add(f"{path}.teacher", "unknown teacher", rule.get("teacher"))
+                    continue
+                targets = [teacher_ids[rule["teacher"]]] if rule.get("teacher") is not None else teacher_ids.values()
+                hard, soft_limits = constraints.teacher_limits, constraints.soft_teacher_limits
+            elif resource == "class":
+                if rule.get("year") is not None and rule["year"] not in year_names:
+                    errors.add(f"{path}.year", "unknown year", rule.get("year"))
+                    continue
+                targets = [d.id for d in divisions
+                           if rule.get("year") in (None, d.year)
+                           and (rule.get("division") is None or str(rule["division"]) == str(d.number))]
+                hard, soft_limits = constraints.class_limits, constraints.soft_class_limits
+            else:
+                errors.add(f"{path}.resource", "must be teacher or class", resource)
+                continue
+            for target in targets:
+                if soft:
+                    soft_limits.setdefault(target, []).append((limit, weight))
+                else:
+                    hard[target] = min(limit, hard.get(target, limit))
+
+    return constraints
@@ -3,6 +3,7 @@
 # ============================================
 
 from ..config import CHECK_ROOM_CONFLICTS
+from .probe_cache import class_key, room_key, teacher_key
 
 def check_global_conflicts(teacher_name, day, slot_key, saved_timetables):
     """Check if teacher is busy in saved timetables."""
@@ -46,11 +47,10 @@ def is_batch_available(class_tt, yname, div, day, slot_key, batch):
     Check if a specific batch is free at this time slot.
     Returns True if batch is available, False if busy.
     """
-    if slot_key not in class_tt[yname][div][day]:
+    current_occupants = class_tt[yname][div][day].get(slot_key)
+    if not current_occupants:
         return True
     
-    current_occupants = class_tt[yname][div][day][slot_key]
-    
     for entry in current_occupants:
         if entry.get("batch") == batch:
             return False
@@ -60,25 +60,92 @@ def is_batch_available(class_tt, yname, div, day, slot_key, batch):
     return True
 
 
-def check_continuous_slots_available(class_tt, teacher_tt, room_tt, yname, div, day, 
-                                     start_slot_idx, duration, teacher, room, batch, 
-                                     time_slots, saved_timetables):
+def saved_teacher_conflict(ctx, teacher_id, day, slot_key):
+    """Saved-timetable entry occupying this teacher, or None (indexed lookup)."""
+    return ctx.model.saved_teacher_busy.get((teacher_id, day, slot_key))
+
+
+def saved_room_conflict(ctx, room_id, day, slot_key):
+    """Saved-timetable entry occupying this room, or None (indexed lookup)."""
+    if not ctx.options.check_room_conflicts:
+        return None
+    return ctx.model.saved_room_busy.get((room_id, day, slot_key))
+
+
+def constraint_conflict(ctx, req, day, slot_keys, teacher=None, room=None):
+    """
+    Hard declarative constraint (solver/constraints.py) the session would break,
+    or None. reason "constraint_blocked" never changes during a solve;
+    "consecutive_limit" depends on what is placed around the session.
     """
-    Check if 'duration' continuous slots are available for multi-hour labs.
+    constraints = ctx.model.constraints
+    if not constraints.active:
+        return None
+    bits = constraints.slot_bits(req.year_id, slot_keys)
+    rule = (
+        constraints.requirement_blocked(req, day, bits)
+        or (teacher is not None and constraints.teacher_blocked(teacher.id, req.year_id, day, bits))
+        or (room is not None and constraints.room_blocked(room.id, req.year_id, day, bits))
+    )
+    if rule:
+        return {"reason": "constraint_blocked", "detail": f"{rule} rule forbids {day} {slot_keys[0]}", "rule": rule}
+    if constraints.class_too_long(ctx, req, day, slot_keys):
+        return {"reason": "consecutive_limit", "detail": f"{req.year} Div {req.div} would exceed its consecutive periods limit"}
+    if teacher is not None and constraints.teacher_too_long(ctx, teacher.id, day, slot_keys):
+        return {"reason": "consecutive_limit", "detail": f"Teacher {teacher.name} would exceed their consecutive periods limit"}
+    return None
+
+
+def check_continuous_slots_available(ctx, req, day, start_slot_idx, teacher, room):
+    """
+    Check if req.lab_duration continuous slots are available for multi-hour labs.
     Returns: (success: bool, slot_keys: list, conflict_reason: dict)
+    Failures are remembered in ctx.probe_failures until their slots are freed.
     """
+    # Per requirement: constraint rules can forbid one subject's lab and not another's
+    probe = ("lab", req.id, teacher.id, room.id, day, start_slot_idx)
+    cached = ctx.probe_failures.get(probe)
+    if cached is not None:
+        return False, [], cached
+    
+    success, slots_to_check, conflict_info = _check_continuous_slots(ctx, req, day, start_slot_idx, teacher, room)
+    if not success and conflict_info.get("reason") != "consecutive_limit":
+        ctx.probe_failures.fail(probe, conflict_info, _conflict_dependencies(req, day, teacher, room, conflict_info))
+    return success, slots_to_check, conflict_info
+
+
+def _conflict_dependencies(req, day, teacher, room, conflict_info):
+    """Occupancy keys a lab probe failure depends on; none for permanent failures."""
+    reason = conflict_info.get("reason")
+    slot_key = conflict_info.get("conflicting_slot")
+    if reason == "batch_conflict":
+        return [class_key(req.division_id, day, slot_key)]
+    if reason == "teacher_conflict":
+        return [teacher_key(teacher.id, day, slot_key)]
+    if reason == "room_conflict":
+        return [room_key(room.id, day, slot_key)]
+    return []
+
+
+def _check_continuous_slots(ctx, req, day, start_slot_idx, teacher, room):
+    time_slots = ctx.model.years[req.year_id].slots
+    duration = req.lab_duration
+    batch = req.batch
+    
     if start_slot_idx + duration > len(time_slots):
         return False, [], {"reason": "insufficient_slots", "detail": "Not enough slots remaining in day"}
     
     slots_to_check = []
     conflict_info = {"reason": None, "detail": None}
+    teacher_day = ctx.teacher_tt[teacher.name][day]
+    room_day = ctx.room_tt[room.name][day]
     
     for i in range(duration):
         slot_info = time_slots[start_slot_idx + i]
-        slot_key = slot_info["slot_key"]
+        slot_key = slot_info.key
         
         # Check for lunch break interruption
-        if slot_info.get("is_lunch"):
+        if slot_info.is_lunch:
             conflict_info = {
                 "reason": "break_interruption",
                 "detail": f"Break/Lunch at slot {slot_key} interrupts continuous lab",
@@ -92,7 +159,7 @@ def check_continuous_slots_available(class_tt, teacher_tt, room_tt, yname, div,
         slots_to_check.append(slot_key)
         
         # Check batch availability
-        if not is_batch_available(class_tt, yname, div, day, slot_key, batch):
+        if not is_batch_available(ctx.class_tt, req.year, req.div, day, slot_key, batch):
             conflict_info = {
                 "reason": "batch_conflict",
                 "detail": f"Batch {batch} already scheduled at {slot_key}",
@@ -101,44 +168,46 @@ def check_continuous_slots_available(class_tt, teacher_tt, room_tt, yname, div,
             return False, [], conflict_info
         
         # Check teacher availability
-        if teacher_tt[teacher][day].get(slot_key, []):
+        if teacher_day.get(slot_key):
             conflict_info = {
                 "reason": "teacher_conflict",
-                "detail": f"Teacher {teacher} busy at {slot_key}",
+                "detail": f"Teacher {teacher.name} busy at {slot_key}",
                 "conflicting_slot": slot_key
             }
             return False, [], conflict_info
         
         # Check teacher in saved timetables
-        if saved_timetables:
-            global_check = check_global_conflicts(teacher, day, slot_key, saved_timetables)
-            if global_check["conflict"]:
-                conflict_info = {
-                    "reason": "teacher_conflict_global",
-                    "detail": f"Teacher {teacher} busy in {global_check['with_year']} Div {global_check['with_division']}",
-                    "conflicting_slot": slot_key
-                }
-                return False, [], conflict_info
+        global_check = saved_teacher_conflict(ctx, teacher.id, day, slot_key)
+        if global_check:
+            conflict_info = {
+                "reason": "teacher_conflict_global",
+                "detail": f"Teacher {teacher.name} busy in {global_check['with_year']} Div {global_check['with_division']}",
+                "conflicting_slot": slot_key
+            }
+            return False, [], conflict_info
         
         # Check room availability
-        if room_tt[room][day].get(slot_key, []):
+        if room_day.get(slot_key):
             conflict_info = {
                 "reason": "room_conflict",
-                "detail": f"Room {room} occupied at {slot_key}",
+                "detail": f"Room {room.name} occupied at {slot_key}",
                 "conflicting_slot": slot_key
             }
             return False, [], conflict_info
         
         # Check room in saved timetables
-        if saved_timetables and CHECK_ROOM_CONFLICTS:
-            room_check = check_room_availability(room, day, slot_key, saved_timetables)
-            if room_check["conflict"]:
-                conflict_info = {
-                    "reason": "room_conflict_global",
-                    "detail": f"Room {room} occupied by {room_check['with_year']}",
-                    "conflicting_slot": slot_key
-                }
-                return False, [], conflict_info
+        room_check = saved_room_conflict(ctx, room.id, day, slot_key)
+        if room_check:
+            conflict_info = {
+                "reason": "room_conflict_global",
+                "detail": f"Room {room.name} occupied by {room_check['with_year']}",
+                "conflicting_slot": slot_key
+            }
+            return False, [], conflict_info
+    
+    # Declarative constraints, checked once for the whole block
+    blocked = constraint_conflict(ctx, req, day, slots_to_check, teacher, room)
+    if blocked:
+        return False, [], dict(blocked, conflicting_slot=slots_to_check[0])
     
     return True, slots_to_check, conflict_info
-
@@ -0,0 +1,308 @@
+# ============================================
+# FILE 19: solver/core/context.py
+# ============================================
+"""
+Per-solve state.
+
+Everything a solve mutates (RNG, demands, teacher ledgers, timetables) lives
+on a SolverContext, so solve_timetable is re-entrant and several solves can
+run concurrently in threads of one process. The compiled model and the
+shared caches it was built from are read-only.
+"""
+import json
+import random
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from ..config import CHECK_ROOM_CONFLICTS, USE_REAL_TIME_SLOTS
+from ..helpers.demands import build_demand_pools
+from ..helpers.quality import DEFAULT_WEIGHTS
+from ..helpers.stats import SolveStats
+from ..helpers.teachers import initialize_teacher_daily_limits, increment_teacher_daily_count
+from ..helpers.timetable import initialize_complete_structure
+from .deadline import Deadline
+from .model import PayloadError, _Errors
+from .probe_cache import ProbeCache, class_key, room_key, teacher_key
+
+
+LAB_PLACEMENTS = ("matching", "first-fit")
+
+
+def _quality_weights(weights, errors):
+    """qualityWeights overrides, checked against the known metrics."""
+    if weights is None:
+        return None
+    if not isinstance(weights, dict):
+        errors.add("qualityWeights", "must be an object of metric weights", type(weights).__name__)
+        return None
+    checked = {}
+    for name in weights:
+        if name not in DEFAULT_WEIGHTS:
+            errors.add(f"qualityWeights.{name}", f"unknown metric, expected one of {sorted(DEFAULT_WEIGHTS)}", name)
+            continue
+        checked[name] = errors.number_field(weights, name, "qualityWeights", DEFAULT_WEIGHTS[name])
+    return checked
+
+
+@dataclass(frozen=True)
+class SolverOptions:
+    check_room_conflicts: bool = CHECK_ROOM_CONFLICTS
+    use_real_time_slots: bool = USE_REAL_TIME_SLOTS
+    # With a seed, tie-breaking orders (theory days, classes and subjects, labs)
+    # are shuffled by it; without one they stay in payload order
+    seed: object = None
+    # Engine from solver.engines.ENGINES, and how many runs "multistart" may make
+    engine: str = "greedy"
+    multistart_runs: int = 8
+    # Pre-place the saved timetables of the classes being regenerated
+    warm_start: bool = False
+    # Overrides of solver.helpers.quality.DEFAULT_WEIGHTS
+    quality_weights: object = None
+    # Attach class timetables to phase_end progress events
+    progress_timetables: bool = False
+    # "matching" (maximum matching per day) or "first-fit" (original walk over lab_pool)
+    lab_placement: str = "matching"
+    # Optional local-search repair after the fallback pass; a time limit of 0 skips it
+    repair: bool = False
+    repair_time_limit: float = 2.0
+    # Optional exact backtracking over classes the greedy phases left unfinished;
+    # a time limit of 0 skips it
+    exact: bool = False
+    exact_node_limit: int = 20000
+    exact_time_limit: float = 2.0
+    # Return a recommendation handle instead of computing recommendations
+    defer_recommendations: bool = False
+
+    @classmethod
+    def from_payload(cls, payload):
+        """Solver flags of a payload. Raises PayloadError for malformed values."""
+        errors = _Errors()
+        lab_placement = payload.get("labPlacement", "matching")
+        if lab_placement not in LAB_PLACEMENTS:
+            errors.add("labPlacement", f"must be one of {list(LAB_PLACEMENTS)}", lab_placement)
+        options = cls(
+            check_room_conflicts=bool(payload.get("checkRoomConflicts", CHECK_ROOM_CONFLICTS)),
+            use_real_time_slots=bool(payload.get("useRealTimeSlots", USE_REAL_TIME_SLOTS)),
+            seed=payload.get("seed"),
+            engine=payload.get("engine", "greedy"),
+            multistart_runs=errors.int_field(payload, "multistartRuns", "", 8, 1),
+            warm_start=bool(payload.get("warmStart", False)),
+            quality_weights=_quality_weights(payload.get("qualityWeights"), errors),
+            progress_timetables=bool(payload.get("progressTimetables", False)),
+            lab_placement=lab_placement,
+            repair=bool(payload.get("repair", False)),
+            repair_time_limit=errors.number_field(payload, "repairTimeLimit", "", 2.0, minimum=0),
+            exact=bool(payload.get("exact", False)),
+            exact_node_limit=errors.int_field(payload, "exactNodeLimit", "", 20000, 1),
+            exact_time_limit=errors.number_field(payload, "exactTimeLimit", "", 2.0, minimum=0),
+            defer_recommendations=bool(payload.get("deferRecommendations", False))
+        )
+        if errors.items:
+            raise PayloadError(errors.items)
+        return options
+
+
+class Placement:
+    """One placed session and the timetable entries written for it."""
+    __slots__ = ("id", "req", "day", "slot_keys", "teacher", "room", "entries", "counted", "fixed")
+
+    def __init__(self, placement_id, req, day, slot_keys, teacher, room, counted):
+        self.id = placement_id
+        self.req = req
+        self.day = day
+        self.slot_keys = tuple(slot_keys)
+        self.teacher = teacher
+        self.room = room
+        self.entries = []
+        self.counted = counted
+        # Fixed placements stay where they are when a search re-solves their class
+        self.fixed = False
+
+
+class SolverContext:
+    def __init__(self, model, options=None, deadline=None, stats=None):
+        self.model = model
+        self.options = options or SolverOptions()
+        self.rng = random.Random(self.options.seed)
+        self.deadline = Deadline.coerce(deadline)
+        self.stats = stats or SolveStats()
+
+        self.class_tt, self.teacher_tt, self.room_tt = initialize_complete_structure(model)
+        self.teacher_limits = initialize_teacher_daily_limits(model)
+        self.theory_pool, self.lab_pool, self.practical_pool = build_demand_pools(model)
+        self.demands = {d.req.id: d for d in self.theory_pool + self.lab_pool + self.practical_pool}
+        self.lab_conflicts = []
+        # Kept/dropped report when the solve started from saved timetables
+        self.warm_start = None
+        # Phases run_greedy_phases will go through, for progress and ETA
+        self.planned_phases = []
+        self.phases_done = 0
+        self.phase_seconds = 0.0
+        self.total_hours = sum(d.remaining for d in self.demands.values())
+
+        # Occupancy indexes over placements made in this solve:
+        # (teacher_id | room_id, day, slot_key) -> Placement, (division_id, day, slot_key) -> [Placement]
+        self.placements = {}
+        self.teacher_at = {}
+        self.room_at = {}
+        self.class_at = {}
+        self._next_placement_id = 0
+        # Occupied-slot bitmasks per (division_id | teacher_id, day), kept only
+        # while maxConsecutive constraints need them
+        self.class_busy = {}
+        self.teacher_busy = {}
+        self._track_busy = model.constraints.tracks_occupancy
+        # Failed placement probes, invalidated when remove_session frees their slots
+        self.probe_failures = ProbeCache(self.stats)
+
+    def expired(self):
+        return self.deadline.expired()
+
+    def seeded_order(self, items):
+        """items as a list, shuffled by the solve's rng when the options carry a seed."""
+        items = list(items)
+        if self.options.seed is not None:
+            self.rng.shuffle(items)
+        return items
+
+    def progress(self):
+        """Placements so far, unallocated hours and a rough ETA for the remaining phases."""
+        unallocated = sum(d.remaining for d in self.demands.values() if d.remaining > 0)
+        phases_left = max(0, len(self.planned_phases) - self.phases_done)
+        eta = None
+        if self.phases_done:
+            eta = self.phase_seconds / self.phases_done * phases_left
+        remaining = self.deadline.remaining()
+        if remaining is not None:
+            eta = remaining if eta is None else min(eta, remaining)
+        return {
+            "placements": len(self.placements),
+            "placed_hours": self.total_hours - unallocated,
+            "unallocated_hours": unallocated,
+            "phases_done": self.phases_done,
+            "phases_total": len(self.planned_phases),
+            "eta_seconds": round(eta, 3) if eta is not None else None
+        }
+
+    @contextmanager
+    def phase(self, name):
+        """Time a phase in stats and report its start and end to the progress listener."""
+        self.stats.emit("phase_start", phase=name, **self.progress())
+        before = self.stats.phases.get(name, 0.0)
+        with self.stats.phase(name):
+            yield
+        seconds = self.stats.phases[name] - before
+        self.phases_done += 1
+        self.phase_seconds += seconds
+        if self.stats.listener is None:
+            return
+        event = {"phase": name, "seconds": round(seconds, 4), **self.progress()}
+        if self.options.progress_timetables:
+            # Snapshot, since the solve keeps mutating the timetable
+            event["class_timetable"] = json.loads(json.dumps(self.class_tt))
+        self.stats.emit("phase_end", **event)
+
+    def place_session(self, req, day, slot_keys, teacher, room, count_towards_limit=True):
+        """
+        Write one session (one slot, or a continuous lab block) into all three
+        timetables and the occupancy indexes. Returns the Placement.
+        """
+        yname, div, code, batch = req.year, req.div, req.code, req.batch
+        duration = len(slot_keys)
+        multi_slot = req.kind == "lab"
+        session_id = f"{day}-{slot_keys[0]}"
+        placement = Placement(self._next_placement_id, req, day, slot_keys, teacher, room, count_towards_limit)
+        self._next_placement_id += 1
+
+        for i, slot_key in enumerate(slot_keys):
+            entry = {
+                "subject": code,
+                "teacher": teacher.name,
+                "room": room.name,
+                "batch": batch,
+                "type": req.type
+            }
+            teacher_entry = {
+                "subject": code,
+                "year": yname,
+                "division": div,
+                "room": room.name,
+                "batch": batch
+            }
+            if multi_slot:
+                entry["lab_part"] = teacher_entry["lab_part"] = f"{i+1}/{duration}"
+                entry["lab_session_id"] = session_id
+
+            room_entry = {
+                "subject": code,
+                "year": yname,
+                "division": div
+            }
+
+            self.class_tt[yname][div][day].setdefault(slot_key, []).append(entry)
+            self.teacher_tt[teacher.name][day].setdefault(slot_key, []).append(teacher_entry)
+            self.room_tt[room.name][day].setdefault(slot_key, []).append(room_entry)
+            placement.entries.append((slot_key, entry, teacher_entry, room_entry))
+
+            self.teacher_at[(teacher.id, day, slot_key)] = placement
+            self.room_at[(room.id, day, slot_key)] = placement
+            self.class_at.setdefault((req.division_id, day, slot_key), []).append(placement)
+
+        if count_towards_limit:
+            increment_teacher_daily_count(teacher.id, day, self.teacher_limits, duration)
+
+        if self._track_busy:
+            constraints = self.model.constraints
+            class_day = (req.division_id, day)
+            teacher_day = (teacher.id, day)
+            self.class_busy[class_day] = self.class_busy.get(class_day, 0) | constraints.slot_bits(req.year_id, slot_keys)
+            self.teacher_busy[teacher_day] = self.teacher_busy.get(teacher_day, 0) | constraints.global_bits(slot_keys)
+
+        self.placements[placement.id] = placement
+        return placement
+
+    def remove_session(self, placement):
+        """Undo place_session."""
+        req, day = placement.req, placement.day
+        freed = []
+        for slot_key, entry, teacher_entry, room_entry in placement.entries:
+            _remove_identical(self.class_tt[req.year][req.div][day][slot_key], entry)
+            _remove_identical(self.teacher_tt[placement.teacher.name][day][slot_key], teacher_entry)
+            _remove_identical(self.room_tt[placement.room.name][day][slot_key], room_entry)
+
+            del self.teacher_at[(placement.teacher.id, day, slot_key)]
+            del self.room_at[(placement.room.id, day, slot_key)]
+            occupants_key = (req.division_id, day, slot_key)
+            self.class_at[occupants_key].remove(placement)
+            if not self.class_at[occupants_key]:
+                del self.class_at[occupants_key]
+            freed += [
+                teacher_key(placement.teacher.id, day, slot_key),
+                room_key(placement.room.id, day, slot_key),
+                class_key(req.division_id, day, slot_key)
+            ]
+        self.probe_failures.invalidate(freed)
+
+        if self._track_busy:
+            constraints = self.model.constraints
+            teacher_day = (placement.teacher.id, day)
+            self.teacher_busy[teacher_day] &= ~constraints.global_bits(placement.slot_keys)
+            # Other batches may still hold some of the class's slots
+            vacated = [k for k in placement.slot_keys if (req.division_id, day, k) not in self.class_at]
+            self.class_busy[(req.division_id, day)] &= ~constraints.slot_bits(req.year_id, vacated)
+
+        if placement.counted:
+            limit_data = self.teacher_limits.get(placement.teacher.id)
+            if limit_data:
+                count = limit_data["daily_count"][day] - len(placement.slot_keys)
+                limit_data["daily_count"][day] = max(0, count)
+
+        del self.placements[placement.id]
+
+
+def _remove_identical(entries, target):
+    """Remove target by identity (equal-looking entries may belong to other sessions)."""
+    for i, entry in enumerate(entries):
+        if entry is target:
+            del entries[i]
+            return
@@ -0,0 +1,74 @@
+# ============================================
+# FILE 14: solver/core/deadline.py
+# ============================================
+
+import math
+import time
+
+
+class Deadline:
+    """
+    Wall-clock budget for a single solve.
+    A Deadline without a limit never expires, so callers can always pass one.
+    """
+
+    def __init__(self, seconds=None):
+        self.started = time.monotonic()
+        self.limit = float(seconds) if seconds is not None else None
+        self.reached = False
+        self.cancelled = False
+
+    @classmethod
+    def coerce(cls, value):
+        """
+        Accept an existing Deadline, a number of seconds, or None/"" for no
+        limit. Zero seconds is a budget already used up, not an unlimited one.
+        Raises ValueError for negative, infinite or NaN seconds.
+        """
+        if isinstance(value, Deadline):
+            return value
+        if value is None or value == "":
+            return cls(None)
+        seconds = float(value)
+        if not math.isfinite(seconds) or seconds < 0:
+            raise ValueError(f"a time limit must be a finite number of seconds, not {value!r}")
+        return cls(seconds)
+
+    @classmethod
+    def until(cls, ends_at):
+        """A Deadline ending at a wall-clock time from ends_at(), or unlimited for None."""
+        if ends_at is None:
+            return cls(None)
+        return cls(max(0.0, ends_at - time.time()))
+
+    def ends_at(self):
+        """
+        Wall-clock time (time.time()) the budget runs out, or None without a
+        limit. Unlike remaining(), it stays right however late another process
+        picks it up.
+        """
+        if self.limit is None:
+            return None
+        return time.time() + self.remaining()
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def remaining(self):
+        """Seconds left, or None when there is no limit."""
+        if self.limit is None:
+            return None
+        return max(0.0, self.limit - self.elapsed())
+
+    def cancel(self):
+        """Stop the solve at its next deadline check, as if the limit had been hit."""
+        self.cancelled = True
+        self.reached = True
+
+    def expired(self):
+        """Check the budget; once reached it stays reached."""
+        if self.reached:
+            return True
+        if self.limit is not None and self.elapsed() >= self.limit:
+            self.reached = True
+        return self.reached
@@ -0,0 +1,550 @@
+# ============================================
+# FILE 16: solver/core/model.py
+# ============================================
+"""
+Compiled solver input.
+
+compile_payload() validates the raw /generate payload once and turns it into
+an immutable model: integer ids for years, divisions, subjects, teachers and
+rooms, frozenset holidays, per-year slot grids, precomputed class/lab keys,
+eligible teachers and candidate rooms per requirement, and an index of the
+occupancy in saved timetables. Allocators only read from this model.
+"""
+import hashlib
+import json
+import math
+from dataclasses import dataclass
+from types import MappingProxyType
+
+from ..config import DAY_NAMES, DEFAULT_LUNCH_PERIOD, DEFAULT_PERIODS_PER_DAY, USE_REAL_TIME_SLOTS
+from .time_slots import generate_time_slots
+from .room_manager import CapacityIndex, get_compatible_rooms_for_subject, room_priority
+from .shared_cache import ROOM_INDEXES, SLOT_GRIDS
+from ..constraints import ConstraintSet, compile_constraints
+
+SUBJECT_TYPES = ("Theory", "Lab", "Tutorial")
+DEFAULT_TEACHER_MAX_PER_DAY = 4
+# How room capacity orders candidate rooms: smallest sufficient room first,
+# never an undersized one, or candidate order as given
+CAPACITY_MODES = ("best-fit", "strict", "ignore")
+
+
+class PayloadError(ValueError):
+    """
+    Raised when a payload cannot be compiled.
+    errors is a list of {"path", "message", "value"} dicts, one per problem.
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        summary = "; ".join(f"{e['path']}: {e['message']}" for e in errors[:5])
+        if len(errors) > 5:
+            summary += f" (+{len(errors) - 5} more)"
+        super().__init__(f"Invalid payload: {summary}")
+
+
+@dataclass(frozen=True)
+class TimeSlot:
+    index: int
+    key: str
+    period: object
+    start: object
+    end: object
+    is_lunch: bool
+
+
+@dataclass(frozen=True)
+class Year:
+    id: int
+    name: str
+    slots: tuple
+    holidays: frozenset
+    working_days: tuple
+    division_ids: tuple
+    subject_ids: tuple
+
+
+@dataclass(frozen=True)
+class Division:
+    id: int
+    year_id: int
+    year: str
+    number: int
+    key: str
+
+
+@dataclass(frozen=True)
+class Subject:
+    id: int
+    year_id: int
+    code: str
+    name: str
+    type: str
+    hours: int
+    batches: int
+    lab_duration: int
+
+
+@dataclass(frozen=True)
+class Teacher:
+    id: int
+    name: str
+    subject_codes: frozenset
+    max_per_day: int
+
+
+@dataclass(frozen=True)
+class Room:
+    id: int
+    name: str
+    type: str
+    capacity: object
+    lab_category: str
+    primary_year: str
+
+
+@dataclass(frozen=True)
+class Requirement:
+    """Weekly hours one class (or one batch of it) needs for one subject component."""
+    id: int
+    kind: str               # "theory", "lab" (multi-hour) or "practical"
+    year_id: int
+    year: str
+    division_id: int
+    div: int
+    subject_id: int
+    code: str
+    type: str
+    batch: object           # batch number, None for theory
+    hours: int
+    lab_duration: int
+    max_per_day: int
+    class_key: str
+    key: str
+    teacher_ids: tuple
+    room_ids: tuple         # best fit first when the strength is known
+    strength: object        # students in the class or batch, None when unknown
+
+
+@dataclass(frozen=True)
+class CompiledModel:
+    years: tuple
+    year_ids: MappingProxyType
+    divisions: tuple
+    subjects: tuple
+    teachers: tuple
+    teacher_ids: MappingProxyType
+    rooms: tuple
+    room_ids: MappingProxyType
+    requirements: tuple
+    # (teacher_id | room_id, day, slot_key) -> details of the saved entry
+    saved_teacher_busy: MappingProxyType
+    saved_room_busy: MappingProxyType
+    # division_id -> saved timetableData of that class, only when compiled for a warm start
+    warm_timetables: MappingProxyType
+    # Declarative hard/soft rules from the payload's "constraints"
+    constraints: ConstraintSet
+    # Raw sections still consumed by validators and recommendations
+    raw_years: MappingProxyType
+    raw_teachers: tuple
+    raw_rooms: tuple
+
+    def requirements_of_kind(self, kind):
+        return [req for req in self.requirements if req.kind == kind]
+
+
+class _Errors:
+    def __init__(self):
+        self.items = []
+
+    def add(self, path, message, value=None):
+        self.items.append({"path": path, "message": message, "value": value})
+
+    def int_field(self, container, field, path, default, minimum=0):
+        return self._number_field(container, field, path, default, minimum, int, "an integer")
+
+    def number_field(self, container, field, path, default, minimum=0):
+        return self._number_field(container, field, path, default, minimum, float, "a number")
+
+    def _number_field(self, container, field, path, default, minimum, convert, kind):
+        value = container.get(field, default)
+        if value is None:
+            value = default
+        field_path = f"{path}.{field}" if path else field
+        try:
+            if isinstance(value, bool):
+                raise TypeError
+            number = convert(value)
+            if not math.isfinite(number):
+                raise ValueError
+        except (TypeError, ValueError, OverflowError):
+            self.add(field_path, f"must be {kind}", value)
+            return default
+        if number < minimum:
+            self.add(field_path, f"must be at least {minimum}", value)
+            return default
+        return number
+
+
+def _real_time_grid(start_time, end_time, period_duration, lunch_start, lunch_duration):
+    raw_slots = generate_time_slots(start_time, end_time, period_duration, lunch_start, lunch_duration)
+    return tuple(
+        TimeSlot(i, s["slot_key"], s["period"], s["start"], s["end"], s["is_lunch"])
+        for i, s in enumerate(raw_slots)
+    )
+
+
+def _period_grid(periods_per_day, lunch_break):
+    return tuple(
+        TimeSlot(i - 1, str(i), i, None, None, i == lunch_break)
+        for i in range(1, periods_per_day + 1)
+    )
+
+
+def _compile_time_slots(ydata, path, errors, use_real_time_slots, stats=None):
+    """Slot grid for one year, shared across solves with the same time configuration."""
+    time_config = ydata.get("timeConfig") or {}
+    if time_config and use_real_time_slots:
+        config_path = f"{path}.timeConfig"
+        checked = len(errors.items)
+        period_duration = errors.int_field(time_config, "periodDuration", config_path, 60, 1)
+        lunch_duration = errors.int_field(time_config, "lunchDuration", config_path, 0, 0)
+        if len(errors.items) > checked:
+            return ()
+        try:
+            grid_args = (
+                time_config.get("startTime", "09:00"),
+                time_config.get("endTime", "17:00"),
+                period_duration,
+                time_config.get("lunchStart"),
+                lunch_duration or None
+            )
+            slots = SLOT_GRIDS.get_or_build(("time",) + grid_args, lambda: _real_time_grid(*grid_args), stats)
+        except (TypeError, ValueError) as e:
+            errors.add(f"{path}.timeConfig", f"invalid time configuration ({e})", time_config)
+            return ()
+        if not slots:
+            errors.add(f"{path}.timeConfig", "produces no periods", time_config)
+        return slots
+
+    periods_per_day = errors.int_field(ydata, "periodsPerDay", path, DEFAULT_PERIODS_PER_DAY, 1)
+    lunch_break = errors.int_field(ydata, "lunchBreak", path, DEFAULT_LUNCH_PERIOD)
+    return SLOT_GRIDS.get_or_build(
+        ("periods", periods_per_day, lunch_break),
+        lambda: _period_grid(periods_per_day, lunch_break),
+        stats
+    )
+
+
+def _teacher_subject_codes(teacher):
+    codes = set()
+    for s in teacher.get("subjects") or []:
+        code = s.get("code") if isinstance(s, dict) else s
+        if code:
+            codes.add(code)
+    return codes
+
+
+def _index_saved_timetables(saved_timetables, id_by_name, field):
+    index = {}
+    for tt in saved_timetables:
+        for day, slots in (tt.get("timetableData") or {}).items():
+            for slot_key, entries in (slots or {}).items():
+                for entry in entries or []:
+                    resource_id = id_by_name.get(entry.get(field))
+                    if resource_id is None:
+                        continue
+                    index.setdefault((resource_id, day, slot_key), {
+                        "with_year": tt.get("year"),
+                        "with_division": tt.get("division"),
+                        "subject": entry.get("subject"),
+                        "teacher": entry.get("teacher"),
+                        "room": entry.get("room")
+                    })
+    return MappingProxyType(index)
+
+
+def _fallback_rooms(rooms, stype):
+    if stype == "Lab":
+        return [r for r in rooms if r.type == "Lab"]
+    if stype == "Tutorial":
+        return [r for r in rooms if r.type in ["Tutorial", "Classroom"]]
+    return [r for r in rooms if r.type == "Classroom"]
+
+
+def _candidate_room_names(raw_rooms, room_mappings, code, room_type, yname, div, batch):
+    """(name, priority tier) of every compatible room, in priority order."""
+    compatible = get_compatible_rooms_for_subject(raw_rooms, code, room_type, yname, div, room_mappings, batch)
+    return tuple((r.get("name"), room_priority(r, yname, div)) for r in compatible)
+
+
+def _division_strengths(ydata, path, division_count, errors):
+    """
+    Students per division from the year's "strength": one number for every
+    division or {division number: number}. None where not given.
+    """
+    raw = ydata.get("strength")
+    if raw in (None, ""):
+        return {number: None for number in range(1, division_count + 1)}
+    if not isinstance(raw, dict):
+        raw = {str(number): raw for number in range(1, division_count + 1)}
+    strengths = {}
+    for number in range(1, division_count + 1):
+        value = raw.get(str(number), raw.get(number))
+        if value in (None, ""):
+            strengths[number] = None
+            continue
+        try:
+            strengths[number] = int(value)
+        except (TypeError, ValueError):
+            errors.add(f"{path}.strength", "must be a number or an object of numbers per division", value)
+            strengths[number] = None
+            continue
+        if strengths[number] < 1:
+            errors.add(f"{path}.strength", "must be at least 1", value)
+            strengths[number] = None
+    return strengths
+
+
+def _split_warm_timetables(saved_timetables, divisions):
+    """
+    Separate the saved timetables of classes being regenerated from the rest.
+    Returns (division_id -> timetableData, remaining saved timetables).
+    """
+    division_ids = {(d.year, str(d.number)): d.id for d in divisions}
+    warm, others = {}, []
+    for tt in saved_timetables:
+        division_id = division_ids.get((tt.get("year"), str(tt.get("division"))))
+        if division_id is not None and isinstance(tt.get("timetableData"), dict):
+            warm[division_id] = tt["timetableData"]
+        else:
+            others.append(tt)
+    return warm, others
+
+
+def compile_payload(payload, use_real_time_slots=USE_REAL_TIME_SLOTS, stats=None, warm_start=False):
+    """
+    Validate and normalize a raw payload. Raises PayloadError on malformed input.
+    With warm_start, saved timetables of the classes being generated are kept
+    as warm_timetables instead of blocking their own teachers and rooms.
+    """
+    errors = _Errors()
+    if not isinstance(payload, dict):
+        raise PayloadError([{"path": "", "message": "payload must be a JSON object", "value": None}])
+
+    raw_years = payload.get("years") or {}
+    raw_teachers = payload.get("teachers") or []
+    raw_rooms = payload.get("rooms") or []
+    room_mappings = payload.get("roomMappings") or {}
+    capacity_mode = payload.get("roomCapacityMode") or "best-fit"
+    if capacity_mode not in CAPACITY_MODES:
+        errors.add("roomCapacityMode", f"must be one of {list(CAPACITY_MODES)}", capacity_mode)
+
+    if not isinstance(raw_years, dict):
+        errors.add("years", "must be an object keyed by year name", type(raw_years).__name__)
+        raw_years = {}
+    if not isinstance(raw_teachers, list):
+        errors.add("teachers", "must be a list", type(raw_teachers).__name__)
+        raw_teachers = []
+    if not isinstance(raw_rooms, list):
+        errors.add("rooms", "must be a list", type(raw_rooms).__name__)
+        raw_rooms = []
+
+    # Teachers: duplicates by name share one timetable, so merge them
+    teachers = []
+    teacher_ids = {}
+    merged_codes = {}
+    for i, t in enumerate(raw_teachers):
+        path = f"teachers[{i}]"
+        if not isinstance(t, dict) or not t.get("name"):
+            errors.add(f"{path}.name", "teacher needs a name", t if not isinstance(t, dict) else t.get("name"))
+            continue
+        name = t["name"]
+        max_per_day = errors.int_field(t, "maxHoursPerDay", path, DEFAULT_TEACHER_MAX_PER_DAY, 1)
+        if name in teacher_ids:
+            merged_codes[name] |= _teacher_subject_codes(t)
+            continue
+        teacher_ids[name] = len(teachers)
+        merged_codes[name] = _teacher_subject_codes(t)
+        teachers.append((name, max_per_day))
+    teachers = tuple(
+        Teacher(tid, name, frozenset(merged_codes[name]), max_per_day)
+        for tid, (name, max_per_day) in enumerate(teachers)
+    )
+    teachers_by_code = {}
+    for t in teachers:
+        for code in t.subject_codes:
+            teachers_by_code.setdefault(code, []).append(t.id)
+
+    # Rooms
+    rooms = []
+    room_ids = {}
+    for i, r in enumerate(raw_rooms):
+        if not isinstance(r, dict) or not r.get("name"):
+            errors.add(f"rooms[{i}].name", "room needs a name", r if not isinstance(r, dict) else r.get("name"))
+            continue
+        if r["name"] in room_ids:
+            continue
+        room_ids[r["name"]] = len(rooms)
+        rooms.append(Room(
+            len(rooms), r["name"], r.get("type", "Classroom"), r.get("capacity"),
+            r.get("labCategory") or "None", r.get("primaryYear") or "Shared"
+        ))
+    rooms = tuple(rooms)
+    capacity_index = CapacityIndex(rooms)
+    valid_raw_rooms = [r for r in raw_rooms if isinstance(r, dict) and r.get("name")]
+    # Candidate rooms depend only on the room list and mappings; share them across solves
+    rooms_signature = hashlib.sha1(
+        json.dumps([valid_raw_rooms, room_mappings], sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+    # Years, divisions, subjects and requirements
+    years = []
+    divisions = []
+    subjects = []
+    requirements = {"theory": [], "lab": [], "practical": []}
+    candidate_rooms_cache = {}
+    # Priority tier of each candidate, so best fit never outranks primaryYear/division
+    candidate_tiers = {}
+    best_fit_cache = {}
+
+    for year_id, (yname, ydata) in enumerate(raw_years.items()):
+        path = f"years.{yname}"
+        if not isinstance(ydata, dict):
+            errors.add(path, "must be an object", type(ydata).__name__)
+            continue
+
+        slots = _compile_time_slots(ydata, path, errors, use_real_time_slots, stats)
+        holidays = frozenset(ydata.get("holidays") or [])
+        unknown_days = sorted(holidays - set(DAY_NAMES))
+        if unknown_days:
+            errors.add(f"{path}.holidays", f"unknown day names {unknown_days}", list(holidays))
+        working_days = tuple(d for d in DAY_NAMES if d not in holidays)
+
+        division_count = errors.int_field(ydata, "divisions", path, 1, 1)
+        strengths = _division_strengths(ydata, path, division_count, errors)
+        batch_strength = errors.int_field(ydata, "batchStrength", path, None, 1) if ydata.get("batchStrength") is not None else None
+        division_ids = []
+        for number in range(1, division_count + 1):
+            division_ids.append(len(divisions))
+            divisions.append(Division(len(divisions), year_id, yname, number, f"{yname}_Div{number}"))
+
+        subject_ids = []
+        for s_idx, subj in enumerate(ydata.get("subjects") or []):
+            spath = f"{path}.subjects[{s_idx}]"
+            if not isinstance(subj, dict) or not subj.get("code"):
+                errors.add(f"{spath}.code", "subject needs a code", subj if not isinstance(subj, dict) else subj.get("code"))
+                continue
+            stype = subj.get("type", "Theory")
+            if stype not in SUBJECT_TYPES:
+                errors.add(f"{spath}.type", f"must be one of {list(SUBJECT_TYPES)}", stype)
+                continue
+            hours = errors.int_field(subj, "hours", spath, 1)
+            batches = errors.int_field(subj, "batches", spath, 1, 1) if stype != "Theory" else 1
+            lab_duration = errors.int_field(subj, "labDuration", spath, 1, 1) if stype == "Lab" else 1
+
+            subject = Subject(len(subjects), year_id, subj["code"], subj.get("name") or subj["code"],
+                              stype, hours, batches, lab_duration)
+            subject_ids.append(subject.id)
+            subjects.append(subject)
+
+        years.append(Year(year_id, yname, slots, holidays, working_days,
+                          tuple(division_ids), tuple(subject_ids)))
+
+        for div_id in division_ids:
+            division = divisions[div_id]
+            for subject_id in subject_ids:
+                subject = subjects[subject_id]
+                room_type = subject.type if subject.type in ("Lab", "Tutorial") else "Theory"
+
+                for b_idx in range(1, subject.batches + 1):
+                    batch = b_idx if subject.type != "Theory" else None
+
+                    cache_key = (subject.code, room_type, yname, division.number, batch)
+                    if cache_key not in candidate_rooms_cache:
+                        ranked = ROOM_INDEXES.get_or_build(
+                            (rooms_signature,) + cache_key,
+                            lambda: _candidate_room_names(valid_raw_rooms, room_mappings, *cache_key),
+                            stats
+                        )
+                        candidates = [(room_ids[name], tier) for name, tier in ranked if name in room_ids]
+                        if not candidates:
+                            candidates = [(r.id, 0) for r in _fallback_rooms(rooms, subject.type)]
+                        candidate_rooms_cache[cache_key] = tuple(rid for rid, _ in candidates)
+                        candidate_tiers[cache_key] = tuple(tier for _, tier in candidates)
+
+                    # Batches split the division evenly unless the year gives their size
+                    strength = strengths[division.number]
+                    if batch is not None and strength is not None:
+                        strength = batch_strength or -(-strength // subject.batches)
+                    elif batch is not None:
+                        strength = batch_strength
+                    fit_key = (cache_key, strength)
+                    if fit_key not in best_fit_cache:
+                        best_fit_cache[fit_key] = (
+                            candidate_rooms_cache[cache_key] if capacity_mode == "ignore"
+                            else capacity_index.best_fit(candidate_rooms_cache[cache_key], strength,
+                                                         strict=capacity_mode == "strict",
+                                                         tiers=candidate_tiers[cache_key])
+                        )
+
+                    if subject.type == "Theory":
+                        kind = "theory"
+                    elif subject.type == "Lab" and subject.lab_duration > 1:
+                        kind = "lab"
+                    else:
+                        kind = "practical"
+
+                    requirements[kind].append(dict(
+                        kind=kind,
+                        year_id=year_id,
+                        year=yname,
+                        division_id=div_id,
+                        div=division.number,
+                        subject_id=subject_id,
+                        code=subject.code,
+                        type=subject.type,
+                        batch=batch,
+                        hours=subject.hours,
+                        lab_duration=subject.lab_duration,
+                        max_per_day=min(subject.hours, 2),
+                        class_key=division.key,
+                        key=f"{division.key}_{subject.code}_Batch{batch}",
+                        teacher_ids=tuple(teachers_by_code.get(subject.code, ())),
+                        room_ids=best_fit_cache[fit_key],
+                        strength=strength
+                    ))
+
+    # Pool order is theory, then multi-hour labs, then practicals
+    ordered = requirements["theory"] + requirements["lab"] + requirements["practical"]
+    compiled_requirements = tuple(Requirement(id=i, **fields) for i, fields in enumerate(ordered))
+    constraints = compile_constraints(
+        payload.get("constraints"), years, teacher_ids, room_ids, divisions, compiled_requirements, errors
+    )
+
+    if errors.items:
+        raise PayloadError(errors.items)
+
+    saved_timetables = payload.get("saved_timetables") or []
+    warm_timetables = {}
+    if warm_start:
+        warm_timetables, saved_timetables = _split_warm_timetables(saved_timetables, divisions)
+
+    return CompiledModel(
+        years=tuple(years),
+        year_ids=MappingProxyType({y.name: y.id for y in years}),
+        divisions=tuple(divisions),
+        subjects=tuple(subjects),
+        teachers=teachers,
+        teacher_ids=MappingProxyType(teacher_ids),
+        rooms=rooms,
+        room_ids=MappingProxyType(room_ids),
+        requirements=compiled_requirements,
+        saved_teacher_busy=_index_saved_timetables(saved_timetables, teacher_ids, "teacher"),
+        saved_room_busy=_index_saved_timetables(saved_timetables, room_ids, "room"),
+        warm_timetables=MappingProxyType(warm_timetables),
+        constraints=constraints,
+        raw_years=MappingProxyType(raw_years),
+        raw_teachers=tuple(raw_teachers),
+        raw_rooms=tuple(raw_rooms)
+    )
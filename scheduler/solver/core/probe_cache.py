@@ -0,0 +1,64 @@
+# ============================================
+# FILE 26: solver/core/probe_cache.py
+# ============================================
+"""
+Per-solve cache of failed placement probes.
+
+The allocators probe the same (class, teacher, room, day, window)
+combinations again and again: across the day loop, the start-index loop,
+the theory candidate pools and the fallback pass. A failure is either
+
+* permanent: a break inside the window, a saved-timetable conflict, too few
+  slots left in the day. Nothing in this solve can change it.
+* caused by occupancy: a teacher, room or class slot already taken in this
+  solve. Placing more sessions never frees anything, so the failure stays
+  valid until one of the slots it depends on is released by remove_session.
+
+Occupancy keys are ("teacher", teacher_id, day, slot_key), ("room", room_id,
+day, slot_key) and ("class", division_id, day, slot_key).
+"""
+
+
+def teacher_key(teacher_id, day, slot_key):
+    return ("teacher", teacher_id, day, slot_key)
+
+
+def room_key(room_id, day, slot_key):
+    return ("room", room_id, day, slot_key)
+
+
+def class_key(division_id, day, slot_key):
+    return ("class", division_id, day, slot_key)
+
+
+class ProbeCache:
+    def __init__(self, stats=None):
+        self.stats = stats
+        self.permanent = {}
+        self.occupancy = {}
+        # occupancy key -> probe keys whose failure depends on it
+        self.dependents = {}
+
+    def get(self, probe):
+        """Cached failure for probe, or None if it has to be checked."""
+        value = self.permanent.get(probe)
+        if value is None:
+            value = self.occupancy.get(probe)
+        if self.stats:
+            self.stats.cache_lookup("probe_failures", value is not None)
+        return value
+
+    def fail(self, probe, value=True, depends_on=()):
+        """Record a failed probe. Without dependencies the failure is permanent."""
+        if not depends_on:
+            self.permanent[probe] = value
+            return
+        self.occupancy[probe] = value
+        for key in depends_on:
+            self.dependents.setdefault(key, set()).add(probe)
+
+    def invalidate(self, freed_keys):
+        """Drop occupancy failures that depended on any of the freed keys."""
+        for key in freed_keys:
+            for probe in self.dependents.pop(key, ()):
+                self.occupancy.pop(probe, None)
@@ -1,6 +1,8 @@
 # ============================================
 # FILE 5: solver/core/room_manager.py
 # ============================================
+from bisect import bisect_left
+
 
 def get_room_for_subject(subject_code, component_type, batch, room_mappings, rooms, year=None):
     """Get assigned room from wizard room mappings."""
@@ -58,6 +60,21 @@ def get_room_for_subject(subject_code, component_type, batch, room_mappings, roo
     return None
 
 
+def room_priority(room, year=None, division=None):
+    """Priority tier of a raw room for a class: primaryYear match, then "Shared", plus division fit."""
+    score = 0
+    primary_year = room.get("primaryYear", "Shared")
+    if primary_year == year:
+        score += 50
+    elif primary_year == "Shared":
+        score += 10
+
+    primary_div = room.get("primaryDivision")
+    if primary_div is None or (division and primary_div == division):
+        score += 25
+    return score
+
+
 def get_compatible_rooms_for_subject(rooms, subject_code, room_type, year=None, division=None, 
                                      room_mappings=None, batch=None):
     """
@@ -94,16 +111,7 @@ def get_compatible_rooms_for_subject(rooms, subject_code, room_type, year=None,
             continue
         
         # Calculate priority score
-        score = 0
-        
-        if primary_year == year:
-            score += 50
-        elif primary_year == "Shared":
-            score += 10
-        
-        primary_div = room.get("primaryDivision")
-        if primary_div is None or (division and primary_div == division):
-            score += 25
+        score = room_priority(room, year, division)
         
         if score > 0:
             compatible.append({
@@ -120,4 +128,59 @@ def get_compatible_rooms_for_subject(rooms, subject_code, room_type, year=None,
     else:
         print(f" Found {len(result)} compatible rooms for {room_type} - {subject_code}")
     
-    return result
\ No newline at end of file
+    return result
+
+
+def room_capacity(room):
+    """Numeric capacity of a compiled Room, or None when unknown."""
+    try:
+        return int(room.capacity)
+    except (TypeError, ValueError):
+        return None
+
+
+class CapacityIndex:
+    """
+    Rooms of each type sorted by capacity, for best-fit room choice.
+    Rooms without a known capacity sort last, as if they fit anything.
+    """
+
+    def __init__(self, rooms):
+        self.rooms = rooms
+        by_type = {}
+        for room in rooms:
+            capacity = room_capacity(room)
+            by_type.setdefault(room.type, []).append(
+                (float("inf") if capacity is None else capacity, room.id)
+            )
+        self.capacities = {}
+        self.room_ids = {}
+        for room_type, entries in by_type.items():
+            entries.sort()
+            self.capacities[room_type] = [c for c, _ in entries]
+            self.room_ids[room_type] = [rid for _, rid in entries]
+
+    def best_fit(self, candidate_ids, strength, strict=False, tiers=None):
+        """
+        candidate_ids reordered for a group of strength students: rooms that fit,
+        then (unless strict) undersized rooms. Within each, a higher priority
+        tier (tiers[i] is candidate_ids[i]'s room_priority) comes first, then
+        the smallest fitting or largest undersized room. Ties keep the
+        candidates' original (mapping/score) order.
+        """
+        if strength is None:
+            return tuple(candidate_ids)
+        position = {rid: i for i, rid in enumerate(candidate_ids)}
+        rank = {rid: -tiers[i] for i, rid in enumerate(candidate_ids)} if tiers else dict.fromkeys(candidate_ids, 0)
+        fitting, undersized = [], []
+        for room_type in {self.rooms[rid].type for rid in candidate_ids}:
+            capacities, ids = self.capacities[room_type], self.room_ids[room_type]
+            split = bisect_left(capacities, strength)
+            fitting += [(rank[ids[i]], capacities[i], position[ids[i]], ids[i])
+                        for i in range(split, len(ids)) if ids[i] in position]
+            undersized += [(rank[ids[i]], -capacities[i], position[ids[i]], ids[i])
+                           for i in range(split) if ids[i] in position]
+        ordered = [entry[-1] for entry in sorted(fitting)]
+        if not strict:
+            ordered += [entry[-1] for entry in sorted(undersized)]
+        return tuple(ordered)
@@ -0,0 +1,48 @@
+# ============================================
+# FILE 18: solver/core/shared_cache.py
+# ============================================
+"""
+Process-wide caches of read-only solver data (slot grids, room candidate
+indexes). Values must never be mutated after insertion, so concurrent solves
+in different threads can share them.
+"""
+import threading
+from collections import OrderedDict
+
+
+class SharedCache:
+    """Small thread-safe LRU cache."""
+
+    def __init__(self, name, max_entries=128):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build, stats=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                if stats:
+                    stats.cache_lookup(self.name, True)
+                return self._entries[key]
+
+        # Build outside the lock; a concurrent duplicate build is harmless
+        value = build()
+        if stats:
+            stats.cache_lookup(self.name, False)
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+SLOT_GRIDS = SharedCache("slot_grids", max_entries=64)
+ROOM_INDEXES = SharedCache("room_indexes", max_entries=4096)
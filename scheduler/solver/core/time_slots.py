@@ -5,7 +5,9 @@
 from datetime import datetime, timedelta
 
 def generate_time_slots(start_time, end_time, period_duration, lunch_start=None, lunch_duration=None):
-    """Generate time slots INCLUDING breaks."""
+    """Generate time slots INCLUDING breaks. Raises ValueError unless periods last at least a minute."""
+    if period_duration < 1:
+        raise ValueError(f"periodDuration must be at least 1 minute, not {period_duration}")
     start = datetime.strptime(start_time, "%H:%M")
     end = datetime.strptime(end_time, "%H:%M")
     
@@ -0,0 +1,193 @@
+# ============================================
+# FILE 32: solver/diff.py
+# ============================================
+"""
+Timetable deltas for re-generation.
+
+With "diff" in the payload, the result gains the changes of the new class
+timetables against a reference:
+
+    "diff": "saved"                                   the saved timetables of the
+                                                      classes being generated
+    "diff": {"against": "previous", "previous": {...}}  a previous result's class_timetable
+    "diff": {..., "full": true}                       keep the full timetables too
+
+A session is one placed class session (all parts of a continuous lab
+together). Sessions at the same day, slots, teacher and room on both sides
+are unchanged. Of the rest, a removed and an added session of the same
+subject, type and batch of one class pair up as "moved", with the fields
+that changed; what is left is "added" or "removed". The response lists the
+changes once, with indexes into that list per class, teacher and room, and
+without the full class and teacher timetables unless "full" is set, so it
+grows with the amount of change rather than the size of the timetable.
+
+The result itself keeps its timetables: batch occupancy and calendar exports
+read them. Only response_result, applied where a result is sent to a
+client, leaves them out.
+"""
+from .config import DAY_NAMES
+from .core.model import PayloadError
+
+REFERENCES = ("saved", "previous")
+
+
+def parse_diff_option(option):
+    """{"against", "previous", "full"} from the payload's "diff", or None. Raises PayloadError."""
+    if option in (None, False):
+        return None
+    if isinstance(option, str):
+        option = {"against": option}
+    if not isinstance(option, dict):
+        raise PayloadError([{"path": "diff", "message": "must be \"saved\" or an object", "value": option}])
+    against = option.get("against", "previous" if "previous" in option else "saved")
+    if against not in REFERENCES:
+        raise PayloadError([{"path": "diff.against", "message": f"must be one of {list(REFERENCES)}", "value": against}])
+    previous = option.get("previous")
+    if against == "previous" and not isinstance(previous, dict):
+        raise PayloadError([{"path": "diff.previous", "message": "must be a class_timetable object", "value": None}])
+    return {"against": against, "previous": previous, "full": bool(option.get("full", False))}
+
+
+def _sessions(class_timetable, classes=None):
+    """(year, division) -> {(identity, position): count}; lab parts are merged into one session."""
+    sessions = {}
+    for year, divisions in (class_timetable or {}).items():
+        for division, days in (divisions or {}).items():
+            class_key = (str(year), str(division))
+            if classes is not None and class_key not in classes:
+                continue
+            labs = {}
+            counts = sessions.setdefault(class_key, {})
+            for day in DAY_NAMES:
+                for slot_key, entries in ((days or {}).get(day) or {}).items():
+                    for entry in entries or []:
+                        if not isinstance(entry, dict):
+                            continue
+                        identity = (entry.get("subject"), entry.get("type"), entry.get("batch"))
+                        if entry.get("lab_session_id"):
+                            lab = labs.setdefault((entry["lab_session_id"], identity), {
+                                "day": day, "slots": [], "teacher": entry.get("teacher"), "room": entry.get("room")
+                            })
+                            lab["slots"].append(slot_key)
+                            continue
+                        position = (day, (slot_key,), entry.get("teacher"), entry.get("room"))
+                        counts[(identity, position)] = counts.get((identity, position), 0) + 1
+            for (_, identity), lab in labs.items():
+                position = (lab["day"], tuple(lab["slots"]), lab["teacher"], lab["room"])
+                counts[(identity, position)] = counts.get((identity, position), 0) + 1
+    return sessions
+
+
+def _expand(counts):
+    return [key for key, count in sorted(counts.items(), key=_order) for _ in range(count)]
+
+
+def _order(item):
+    (identity, (day, slots, teacher, room)) = item[0]
+    return (tuple(str(v) for v in identity), DAY_NAMES.index(day), slots, str(teacher), str(room))
+
+
+def _place(position):
+    day, slots, teacher, room = position
+    return {"day": day, "slots": list(slots), "teacher": teacher, "room": room}
+
+
+def diff_timetables(old, new, classes=None):
+    """
+    Changes from old to new (class_timetable dicts), restricted to classes
+    ((year, division) string pairs) when given.
+    """
+    old_sessions = _sessions(old, classes)
+    new_sessions = _sessions(new, classes)
+    changes = []
+    unchanged = 0
+    for class_key in sorted(set(old_sessions) | set(new_sessions)):
+        before = old_sessions.get(class_key, {})
+        after = new_sessions.get(class_key, {})
+        removed, added = {}, {}
+        for key in set(before) | set(after):
+            common = min(before.get(key, 0), after.get(key, 0))
+            unchanged += common
+            if before.get(key, 0) > common:
+                removed[key] = before[key] - common
+            if after.get(key, 0) > common:
+                added[key] = after[key] - common
+
+        # Same subject, type and batch on both sides: a move
+        added_by_identity = {}
+        for identity, position in _expand(added):
+            added_by_identity.setdefault(identity, []).append(position)
+        year, division = class_key
+        for identity, position in _expand(removed):
+            subject, session_type, batch = identity
+            base = {"year": year, "division": division, "subject": subject, "type": session_type, "batch": batch}
+            targets = added_by_identity.get(identity)
+            if targets:
+                target = targets.pop(0)
+                fields = [name for name, a, b in zip(("day", "slots", "teacher", "room"), position, target) if a != b]
+                changes.append({"change": "moved", **base, "from": _place(position), "to": _place(target), "fields": fields})
+            else:
+                changes.append({"change": "removed", **base, "from": _place(position)})
+        for identity, positions in added_by_identity.items():
+            subject, session_type, batch = identity
+            for position in positions:
+                changes.append({"change": "added", "year": year, "division": division, "subject": subject,
+                                "type": session_type, "batch": batch, "to": _place(position)})
+
+    by_class, by_teacher, by_room = {}, {}, {}
+    for index, change in enumerate(changes):
+        by_class.setdefault(f"{change['year']}/{change['division']}", []).append(index)
+        for side in ("from", "to"):
+            place = change.get(side)
+            if place is None:
+                continue
+            for name, index_map in ((place["teacher"], by_teacher), (place["room"], by_room)):
+                if name and index not in index_map.get(name, ()):
+                    index_map.setdefault(name, []).append(index)
+
+    summary = {"unchanged": unchanged}
+    for kind in ("added", "removed", "moved"):
+        summary[kind] = sum(1 for change in changes if change["change"] == kind)
+    return {
+        "summary": summary,
+        "changes": changes,
+        "by_class": by_class,
+        "by_teacher": by_teacher,
+        "by_room": by_room,
+    }
+
+
+def _saved_reference(saved_timetables, classes):
+    reference = {}
+    for tt in saved_timetables or []:
+        if not isinstance(tt, dict):
+            continue
+        key = (str(tt.get("year")), str(tt.get("division")))
+        if key in classes and isinstance(tt.get("timetableData"), dict):
+            reference.setdefault(key[0], {})[key[1]] = tt["timetableData"]
+    return reference
+
+
+def attach_diff(result, payload, option):
+    """Add result["diff"] for a parsed diff option; mark the timetables for omission unless asked to keep them."""
+    class_tt = result.get("class_timetable") or {}
+    classes = {(str(year), str(division)) for year, divisions in class_tt.items() for division in divisions}
+    if option["against"] == "saved":
+        reference = _saved_reference(payload.get("saved_timetables"), classes)
+    else:
+        reference = option["previous"]
+    diff = diff_timetables(reference, class_tt, classes)
+    diff["against"] = option["against"]
+    if option["against"] == "saved":
+        diff["missing_reference"] = sorted(f"{y}/{d}" for y, d in classes if d not in reference.get(y, {}))
+    result["diff"] = diff
+    if not option["full"]:
+        result["timetables_omitted"] = True
+    return result
+
+
+def response_result(result):
+    """The result as sent to a client: without the full timetables when its diff replaces them."""
+    if not result.get("timetables_omitted"):
+        return result
+    return dict(result, class_timetable=None, teacher_timetable=None)
@@ -0,0 +1,159 @@
+# ============================================
+# FILE 23: solver/engines.py
+# ============================================
+"""
+Solver engines.
+
+An engine takes the compiled model and returns a finished SolverContext plus
+the failed lab attempts build_result needs. Every engine works on the same
+model, the same occupancy structures and the same result format, so the
+caller picks one per request with "engine" and can compare them on one
+payload.
+
+    greedy        theory, labs, practicals and fallback (the default)
+    repair        greedy, then local-search repair of leftovers
+    exact-hybrid  greedy, then exact search on unfinished classes, then repair
+    multistart    greedy from several seeds, keeping the best timetable
+"""
+import random
+import time
+from dataclasses import replace
+
+from .core.context import SolverContext
+from .core.model import PayloadError
+from .allocators.theory import allocate_theory_lectures
+from .allocators.labs import allocate_multi_hour_labs
+from .allocators.lab_matching import allocate_labs_by_matching
+from .allocators.practicals import allocate_practicals
+from .allocators.base import allocate_fallback
+from .allocators.warm_start import apply_warm_start
+from .helpers.quality import QualityEvaluator
+from .helpers.stats import SolveStats
+from .search.exact import solve_unfinished_exactly
+from .search.repair import repair_unallocated
+
+ENGINES = {}
+
+
+def register_engine(name):
+    """Decorator adding an engine to the registry under name."""
+    def decorator(engine):
+        ENGINES[name] = engine
+        return engine
+    return decorator
+
+
+def get_engine(name):
+    engine = ENGINES.get(name)
+    if engine is None:
+        raise PayloadError([{
+            "path": "engine",
+            "message": f"unknown engine, expected one of {sorted(ENGINES)}",
+            "value": name
+        }])
+    return engine
+
+
+def run_greedy_phases(ctx):
+    """
+    Optional warm start, theory, multi-hour labs, practicals, fallback,
+    optional exact search and repair. Returns failed lab attempts.
+    """
+    # Announce the phases up front so progress events can estimate what is left
+    ctx.planned_phases = ["theory", "labs", "practicals", "fallback"]
+    if ctx.options.warm_start:
+        ctx.planned_phases.insert(0, "warm_start")
+    if ctx.options.exact and ctx.options.exact_time_limit > 0:
+        ctx.planned_phases.append("exact")
+    if ctx.options.repair and ctx.options.repair_time_limit > 0:
+        ctx.planned_phases.append("repair")
+
+    # WARM START: keep valid sessions of the saved timetables being regenerated
+    if ctx.options.warm_start:
+        with ctx.phase("warm_start"):
+            apply_warm_start(ctx)
+
+    # PHASE 1: Theory Lectures
+    with ctx.phase("theory"):
+        allocate_theory_lectures(ctx)
+
+    # PHASE 2: Multi-hour Labs
+    with ctx.phase("labs"):
+        if ctx.options.lab_placement == "first-fit":
+            failed_lab_attempts = allocate_multi_hour_labs(ctx)
+        else:
+            failed_lab_attempts = allocate_labs_by_matching(ctx)
+
+    # PHASE 3: Practicals
+    with ctx.phase("practicals"):
+        allocate_practicals(ctx)
+
+    # FALLBACK ALLOCATION
+    with ctx.phase("fallback"):
+        allocate_fallback(ctx, ctx.theory_pool + ctx.practical_pool)
+
+    # OPTIONAL EXACT SEARCH: re-solve unfinished batches/divisions completely
+    if ctx.options.exact and ctx.options.exact_time_limit > 0:
+        with ctx.phase("exact"):
+            solve_unfinished_exactly(ctx, ctx.options.exact_node_limit, ctx.options.exact_time_limit)
+
+    # OPTIONAL REPAIR: move placed sessions to fit leftovers
+    if ctx.options.repair and ctx.options.repair_time_limit > 0:
+        with ctx.phase("repair"):
+            repair_unallocated(ctx, ctx.options.repair_time_limit)
+
+    return failed_lab_attempts
+
+
+@register_engine("greedy")
+def greedy_engine(model, options, deadline, stats):
+    ctx = SolverContext(model, options, deadline, stats)
+    return ctx, run_greedy_phases(ctx)
+
+
+@register_engine("repair")
+def repair_engine(model, options, deadline, stats):
+    return greedy_engine(model, replace(options, repair=True), deadline, stats)
+
+
+@register_engine("exact-hybrid")
+def exact_hybrid_engine(model, options, deadline, stats):
+    return greedy_engine(model, replace(options, exact=True, repair=True), deadline, stats)
+
+
+@register_engine("multistart")
+def multistart_engine(model, options, deadline, stats):
+    """
+    Greedy runs from different seeds on the same compiled model.
+    Another run starts only while the deadline leaves room for one more
+    (twice the slowest run so far). Runs are ranked by quality score, which
+    weighs unallocated hours far above everything else. Each run counts into
+    its own SolveStats; only the winner's are added to stats.
+    """
+    seeds = random.Random(options.seed)
+    best = None
+    slowest = 0.0
+    for run in range(max(1, options.multistart_runs)):
+        remaining = deadline.remaining()
+        if run and remaining is not None and remaining < 2 * slowest:
+            break
+        started = time.perf_counter()
+        # Progress events keep going to the solve's listener, on its clock
+        run_stats = SolveStats(stats.listener)
+        run_stats.started = stats.started
+        ctx, failed_lab_attempts = greedy_engine(
+            model, replace(options, seed=seeds.getrandbits(32)), deadline, run_stats
+        )
+        slowest = max(slowest, time.perf_counter() - started)
+        stats.count("multistart_runs")
+
+        score = QualityEvaluator.from_context(ctx, options.quality_weights).score()
+        if best is None or score < best[0]:
+            best = (score, ctx, failed_lab_attempts, run_stats)
+        if ctx.expired():
+            break
+
+    _, ctx, failed_lab_attempts, run_stats = best
+    stats.merge(run_stats)
+    ctx.stats = ctx.probe_failures.stats = stats
+    return ctx, failed_lab_attempts
@@ -0,0 +1,428 @@
+# ============================================
+# FILE 31: solver/export.py
+# ============================================
+"""
+Calendar export of solved or saved timetables.
+
+Sessions are read from a solve result's class_timetable or from saved
+timetables ([{year, division, timetableData}]) and written for one teacher,
+one room, or every teacher/room:
+
+    csv   one row per resource and session
+    ics   one iCalendar feed with a weekly recurring event per session
+
+Both are generators of text chunks of about CHUNK_SIZE characters. Sessions
+are written in timetable order as they are read, never collected or sorted,
+so an export of every teacher keeps one chunk in memory however many
+calendars it holds.
+
+Start and end times come from generate_time_slots with each year's
+timeConfig (from "years" or the saved timetable itself); slots without one
+fall back to the "HH:MM-HH:MM" slot key. A continuous lab is one event from
+its first part's start to its last part's end.
+
+The request is checked in full before the first chunk is produced, so a
+malformed timetable is a PayloadError rather than a broken download.
+"""
+import csv
+import io
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from .config import DAY_NAMES
+from .core.model import PayloadError, _Errors
+from .core.time_slots import generate_time_slots
+
+CHUNK_SIZE = 64 * 1024
+FORMATS = ("csv", "ics")
+RESOURCES = ("teacher", "room")
+CSV_COLUMNS = ("resource", "day", "start", "end", "period", "subject", "type",
+               "year", "division", "batch", "teacher", "room")
+ICS_DAYS = {"Mon": "MO", "Tue": "TU", "Wed": "WE", "Thu": "TH", "Fri": "FR", "Sat": "SA", "Sun": "SU"}
+
+
+def _duration_errors(time_config, path):
+    """PayloadError items for a timeConfig whose period or lunch length generate_time_slots can't use."""
+    checks = _Errors()
+    checks.int_field(time_config, "periodDuration", path, 60, 1)
+    checks.int_field(time_config, "lunchDuration", path, 0, 0)
+    return checks.items
+
+
+def _grid_times(time_config, cache):
+    """slot key -> (start, end, period) for one timeConfig."""
+    args = (
+        time_config.get("startTime", "09:00"),
+        time_config.get("endTime", "17:00"),
+        int(time_config.get("periodDuration", 60)),
+        time_config.get("lunchStart"),
+        int(time_config["lunchDuration"]) if time_config.get("lunchDuration") else None
+    )
+    if args not in cache:
+        slots = [s for s in generate_time_slots(*args) if not s["is_lunch"]]
+        cache[args] = {
+            "times": {s["slot_key"]: (s["start"], s["end"], s["period"]) for s in slots},
+            "order": [s["slot_key"] for s in slots],
+        }
+    return cache[args]
+
+
+def _lab_part(entry):
+    """(index, length) strings of an entry's "i/n" lab_part, or None when it isn't one."""
+    index, _, length = str(entry.get("lab_part") or "1/1").partition("/")
+    if length and not (length.isdecimal() and int(length) >= 1):
+        return None
+    return index, length
+
+
+def _key_times(slot_key):
+    """(start, end, None) from an "HH:MM-HH:MM" key, or None."""
+    start, _, end = str(slot_key).partition("-")
+    try:
+        datetime.strptime(start, "%H:%M")
+        datetime.strptime(end, "%H:%M")
+    except ValueError:
+        return None
+    return start, end, None
+
+
+def iter_sessions(source, years=None):
+    """
+    (year, division, day, start, end, period, entry) for every session of
+    source: a class_timetable dict or a list of saved timetables. Lab parts
+    after the first are folded into the first part's session.
+    """
+    years = years or {}
+    grids = {}
+    if isinstance(source, dict):
+        tables = (
+            (year, division, days, None)
+            for year, divisions in source.items()
+            for division, days in (divisions or {}).items()
+        )
+    else:
+        tables = (
+            (t.get("year"), t.get("division"), t.get("timetableData") or {}, t.get("timeConfig"))
+            for t in source or [] if isinstance(t, dict)
+        )
+
+    for year, division, days, saved_config in tables:
+        year_config = years.get(year)
+        time_config = (year_config.get("timeConfig") if isinstance(year_config, dict) else None) or saved_config
+        grid = None
+        if time_config:
+            try:
+                grid = _grid_times(time_config, grids)
+            except (TypeError, ValueError):
+                grid = None
+        for day in DAY_NAMES:
+            for slot_key, entries in ((days or {}).get(day) or {}).items():
+                for entry in entries or []:
+                    if not isinstance(entry, dict):
+                        continue
+                    index, length = _lab_part(entry)
+                    if index != "1":
+                        continue
+                    times = (grid["times"].get(slot_key) if grid else None) or _key_times(slot_key)
+                    if times is None:
+                        yield year, division, day, None, None, slot_key, entry
+                        continue
+                    start, end, period = times
+                    if length not in ("", "1") and grid and slot_key in grid["times"]:
+                        # The lab's last part ends the session
+                        order = grid["order"]
+                        last = order.index(slot_key) + int(length) - 1
+                        if last < len(order):
+                            end = grid["times"][order[last]][1]
+                    elif length not in ("", "1"):
+                        last_start = datetime.strptime(start, "%H:%M")
+                        duration = datetime.strptime(end, "%H:%M") - last_start
+                        end = (last_start + duration * int(length)).strftime("%H:%M")
+                    yield year, division, day, start, end, period, entry
+
+
+def _shape_errors(source, path):
+    """PayloadError items for the parts of a class_timetable or saved_timetables iter_sessions can't read."""
+    errors = []
+
+    def check(value, value_path, kind, message):
+        if value is None or isinstance(value, kind):
+            return True
+        errors.append({"path": value_path, "message": message, "value": value})
+        return False
+
+    def check_days(days, days_path):
+        if not check(days, days_path, dict, "must be an object of days"):
+            return
+        for day in DAY_NAMES:
+            slots = (days or {}).get(day)
+            day_path = f"{days_path}.{day}"
+            if not check(slots, day_path, dict, "must be an object of slots"):
+                continue
+            for slot_key, entries in (slots or {}).items():
+                slot_path = f"{day_path}.{slot_key}"
+                if not check(entries, slot_path, list, "must be a list of sessions"):
+                    continue
+                for k, entry in enumerate(entries or []):
+                    if isinstance(entry, dict) and _lab_part(entry) is None:
+                        errors.append({"path": f"{slot_path}[{k}].lab_part",
+                                       "message": 'must be "part/parts"', "value": entry.get("lab_part")})
+
+    if isinstance(source, dict):
+        for year, divisions in source.items():
+            if check(divisions, f"{path}.{year}", dict, "must be an object of divisions"):
+                for division, days in (divisions or {}).items():
+                    check_days(days, f"{path}.{year}.{division}")
+    else:
+        for i, saved in enumerate(source):
+            if not isinstance(saved, dict):
+                continue
+            saved_path = f"{path}[{i}]"
+            check(saved.get("year"), f"{saved_path}.year", (str, int), "must be a year name")
+            check(saved.get("timeConfig"), f"{saved_path}.timeConfig", dict, "must be an object")
+            check_days(saved.get("timetableData"), f"{saved_path}.timetableData")
+    return errors
+
+
+def _resources(entry, kind, name):
+    """Resources of kind this session is exported for."""
+    value = entry.get(kind)
+    if not value or (name is not None and value != name):
+        return ()
+    return (value,)
+
+
+def _chunks(lines):
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield "".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+# ----- CSV -------------------------------------------------------------------------
+
+def _csv_lines(sessions, kind, name):
+    out = io.StringIO()
+    writer = csv.writer(out)
+
+    def take(row):
+        writer.writerow(row)
+        line = out.getvalue()
+        out.seek(0)
+        out.truncate()
+        return line
+
+    yield take(CSV_COLUMNS)
+    for year, division, day, start, end, period, entry in sessions:
+        for resource in _resources(entry, kind, name):
+            yield take((
+                resource, day, start or "", end or "", period if period is not None else "",
+                entry.get("subject", ""), entry.get("type", ""), year, division,
+                entry.get("batch") if entry.get("batch") is not None else "",
+                entry.get("teacher", ""), entry.get("room", "")
+            ))
+
+
+# ----- iCalendar -------------------------------------------------------------------
+
+def _escape(text):
+    return (str(text).replace("\\", "\\\\").replace(";", "\\;")
+            .replace(",", "\\,").replace("\n", "\\n"))
+
+
+def _fold(line):
+    """RFC 5545 line: at most 75 octets, continuation lines start with a space."""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(encoded))
+        # Never split a UTF-8 sequence
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _first_date(term_start, day):
+    offset = (DAY_NAMES.index(day) - term_start.weekday()) % 7
+    return term_start + timedelta(days=offset)
+
+
+def _utc_offset(delta):
+    seconds = int(delta.total_seconds())
+    sign = "-" if seconds < 0 else "+"
+    minutes, second = divmod(abs(seconds), 60)
+    hours, minute = divmod(minutes, 60)
+    return f"{sign}{hours:02d}{minute:02d}" + (f"{second:02d}" if second else "")
+
+
+def _offset_changes(zone, start, end):
+    """(utc instant, offset before, offset after) for each offset change of zone in [start, end)."""
+    instant = start
+    offset = start.astimezone(zone).utcoffset()
+    while instant < end:
+        step = instant + timedelta(hours=1)
+        after = step.astimezone(zone).utcoffset()
+        if after != offset:
+            # Zones change on the minute: bisect the hour down to it
+            low, high = 0, 60
+            while high - low > 1:
+                middle = (low + high) // 2
+                if (instant + timedelta(minutes=middle)).astimezone(zone).utcoffset() == offset:
+                    low = middle
+                else:
+                    high = middle
+            yield instant + timedelta(minutes=high), offset, after
+            offset = after
+        instant = step
+
+
+def _vtimezone_lines(tzid, term_start, weeks):
+    """
+    VTIMEZONE for the events' TZID (RFC 5545 3.6.5): the offset in force when
+    the term starts and every change until its last week ends.
+    """
+    zone = ZoneInfo(tzid)
+    begin = datetime.combine(term_start, time.min, zone)
+    start = begin.astimezone(timezone.utc)
+    end = datetime.combine(term_start + timedelta(weeks=weeks), time.min, zone).astimezone(timezone.utc)
+    observances = [(start, begin.utcoffset(), begin.utcoffset())]
+    observances.extend(_offset_changes(zone, start, end))
+    yield _fold("BEGIN:VTIMEZONE")
+    yield _fold(f"TZID:{tzid}")
+    for instant, before, after in observances:
+        local = instant.astimezone(zone)
+        component = "DAYLIGHT" if local.dst() else "STANDARD"
+        yield _fold(f"BEGIN:{component}")
+        # An observance starts at its onset written in the offset it replaces
+        yield _fold(f"DTSTART:{(instant + before).strftime('%Y%m%dT%H%M%S')}")
+        yield _fold(f"TZOFFSETFROM:{_utc_offset(before)}")
+        yield _fold(f"TZOFFSETTO:{_utc_offset(after)}")
+        if local.tzname():
+            yield _fold(f"TZNAME:{_escape(local.tzname())}")
+        yield _fold(f"END:{component}")
+    yield _fold("END:VTIMEZONE")
+
+
+def _ics_lines(sessions, kind, name, term_start, weeks, tzid, calendar_name):
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    tz_param = f";TZID={tzid}" if tzid else ""
+    yield _fold("BEGIN:VCALENDAR")
+    yield _fold("VERSION:2.0")
+    yield _fold("PRODID:-//Resource Optimization//Timetable Scheduler//EN")
+    yield _fold("CALSCALE:GREGORIAN")
+    yield _fold(f"X-WR-CALNAME:{_escape(calendar_name)}")
+    if tzid:
+        yield _fold(f"X-WR-TIMEZONE:{tzid}")
+        yield from _vtimezone_lines(tzid, term_start, weeks)
+    for year, division, day, start, end, period, entry in sessions:
+        if start is None or day not in ICS_DAYS:
+            continue
+        first = _first_date(term_start, day).strftime("%Y%m%d")
+        begin = f"{first}T{start.replace(':', '')}00"
+        finish = f"{first}T{end.replace(':', '')}00"
+        subject = entry.get("subject", "")
+        batch = entry.get("batch")
+        who = f"{year} Div {division}" + (f" Batch {batch}" if batch is not None else "")
+        for resource in _resources(entry, kind, name):
+            uid = "-".join(str(part) for part in (year, division, batch, day, start, subject, kind, resource))
+            yield _fold("BEGIN:VEVENT")
+            yield _fold(f"UID:{_escape(uid).replace(' ', '_')}@timetable-scheduler")
+            yield _fold(f"DTSTAMP:{stamp}")
+            yield _fold(f"DTSTART{tz_param}:{begin}")
+            yield _fold(f"DTEND{tz_param}:{finish}")
+            yield _fold(f"RRULE:FREQ=WEEKLY;BYDAY={ICS_DAYS[day]};COUNT={weeks}")
+            summary = f"{subject} ({entry.get('type') or 'Session'}) - {who}"
+            yield _fold(f"SUMMARY:{_escape(summary)}")
+            if entry.get("room"):
+                yield _fold(f"LOCATION:{_escape(entry['room'])}")
+            details = [f"Teacher: {entry['teacher']}" if entry.get("teacher") else None,
+                       f"Period: {period}" if period is not None else None]
+            yield _fold(f"DESCRIPTION:{_escape(chr(10).join(d for d in details if d))}")
+            yield _fold(f"CATEGORIES:{_escape(resource)}")
+            yield _fold("END:VEVENT")
+    yield _fold("END:VCALENDAR")
+
+
+# ----- entry point -----------------------------------------------------------------
+
+def export_calendar(request):
+    """
+    Validate an export request and return (media type, file name, chunk generator).
+    request: {"format", "resource", "name"?, "class_timetable" | "saved_timetables",
+    "years"?, "termStart"?, "weeks"?, "timezone"?}. Raises PayloadError.
+    """
+    errors = []
+    fmt = request.get("format")
+    kind = request.get("resource")
+    name = request.get("name") or None
+    if fmt not in FORMATS:
+        errors.append({"path": "format", "message": f"must be one of {list(FORMATS)}", "value": fmt})
+    if kind not in RESOURCES:
+        errors.append({"path": "resource", "message": f"must be one of {list(RESOURCES)}", "value": kind})
+
+    source = request.get("class_timetable")
+    if source is None:
+        source = request.get("saved_timetables")
+    if not isinstance(source, (dict, list)):
+        errors.append({"path": "class_timetable", "message": "a class_timetable or saved_timetables is required", "value": None})
+
+    term_start = date.today() + timedelta(days=(7 - date.today().weekday()) % 7)
+    if request.get("termStart"):
+        try:
+            term_start = date.fromisoformat(str(request["termStart"]))
+        except ValueError:
+            errors.append({"path": "termStart", "message": "must be a YYYY-MM-DD date", "value": request["termStart"]})
+    try:
+        weeks = int(request.get("weeks", 15))
+        if weeks < 1:
+            raise ValueError
+    except (TypeError, ValueError):
+        errors.append({"path": "weeks", "message": "must be a positive whole number", "value": request.get("weeks")})
+        weeks = 1
+    tzid = request.get("timezone") or None
+    if tzid is not None:
+        try:
+            ZoneInfo(tzid)
+        except (ZoneInfoNotFoundError, TypeError, ValueError):
+            errors.append({"path": "timezone", "message": "must be an IANA time zone name", "value": tzid})
+            tzid = None
+
+    years = request.get("years") if isinstance(request.get("years"), dict) else {}
+    for year, year_config in years.items():
+        time_config = year_config.get("timeConfig") if isinstance(year_config, dict) else None
+        if time_config is None:
+            continue
+        if not isinstance(time_config, dict):
+            errors.append({"path": f"years.{year}.timeConfig", "message": "must be an object", "value": time_config})
+            continue
+        errors.extend(_duration_errors(time_config, f"years.{year}.timeConfig"))
+    if isinstance(source, dict):
+        errors.extend(_shape_errors(source, "class_timetable"))
+    elif isinstance(source, list):
+        errors.extend(_shape_errors(source, "saved_timetables"))
+        for i, saved in enumerate(source):
+            if isinstance(saved, dict) and isinstance(saved.get("timeConfig"), dict):
+                errors.extend(_duration_errors(saved["timeConfig"], f"saved_timetables[{i}].timeConfig"))
+    if errors:
+        raise PayloadError(errors)
+
+    sessions = iter_sessions(source, years)
+    label = name or f"all-{kind}s"
+    filename = "".join(c if c.isalnum() or c in "-_." else "_" for c in label) + "." + fmt
+    if fmt == "csv":
+        return "text/csv; charset=utf-8", filename, _chunks(_csv_lines(sessions, kind, name))
+    calendar_name = name or f"All {kind}s"
+    lines = _ics_lines(sessions, kind, name, term_start, weeks, tzid, calendar_name)
+    return "text/calendar; charset=utf-8", filename, _chunks(lines)
@@ -0,0 +1,37 @@
+# ============================================
+# FILE 17: solver/helpers/demands.py
+# ============================================
+
+
+class Demand:
+    """Mutable per-solve progress of one compiled Requirement."""
+    __slots__ = ("req", "remaining", "count_today", "attempted")
+
+    def __init__(self, req):
+        self.req = req
+        self.remaining = req.hours
+        self.count_today = 0
+        self.attempted = False
+
+
+def build_demand_pools(model):
+    """Split fresh demands into (theory_pool, lab_pool, practical_pool)."""
+    pools = {"theory": [], "lab": [], "practical": []}
+    for req in model.requirements:
+        pools[req.kind].append(Demand(req))
+    return pools["theory"], pools["lab"], pools["practical"]
+
+
+def build_session_summary(demand):
+    """Describe a requirement that still has hours left."""
+    req = demand.req
+    return {
+        "subject": req.code,
+        "type": req.type,
+        "year": req.year,
+        "division": req.div,
+        "batch": f"{req.year} - Div {req.div}",
+        "batch_num": req.batch,
+        "missing": demand.remaining,
+        "lab_duration": req.lab_duration
+    }
@@ -0,0 +1,290 @@
+# ============================================
+# FILE 25: solver/helpers/quality.py
+# ============================================
+"""
+Timetable quality evaluator.
+
+Every row of the timetable (one class, batch, teacher or subject on one day)
+is an int bitmask over slot positions, so each metric is a handful of bit
+operations per row instead of a walk over slots:
+
+* student_gaps        free teaching slots between a class's first and last session
+* teacher_gaps        the same for every teacher
+* teacher_load_variance  variance of each teacher's hours across the week, summed
+* back_to_back        adjacent hours of the same non-lab subject
+* labs_after_lunch    lab hours placed after the lunch break
+* room_type_mismatch  hours in a room of the wrong type
+* over_capacity       hours in a room smaller than the class or batch
+* soft_constraints    weighted violations of soft declarative constraints
+* unallocated_hours   required hours left unplaced
+
+The score is the weighted sum of these penalties; lower is better. A
+QualityEvaluator loaded from a SolverContext also scores single moves
+incrementally: delta() only re-evaluates the rows a move touches.
+"""
+from ..config import DAY_NAMES
+from ..core.room_manager import room_capacity
+from ..utils import consecutive_excess, global_slot_order, popcount
+
+DEFAULT_WEIGHTS = {
+    "unallocated_hours": 100.0,
+    "student_gaps": 3.0,
+    "teacher_gaps": 1.0,
+    "teacher_load_variance": 1.0,
+    "back_to_back": 2.0,
+    "labs_after_lunch": 0.5,
+    "room_type_mismatch": 5.0,
+    "over_capacity": 5.0,
+    "soft_constraints": 1.0,
+}
+
+# Room types a subject type is expected to use
+EXPECTED_ROOM_TYPES = {
+    "Theory": ("Classroom",),
+    "Lab": ("Lab",),
+    "Tutorial": ("Tutorial", "Classroom"),
+}
+
+
+def span_mask(mask):
+    """All bits from the lowest to the highest set bit of mask."""
+    if not mask:
+        return 0
+    low = mask & -mask
+    return (1 << mask.bit_length()) - low
+
+
+def gaps(mask, teaching):
+    """Free teaching slots strictly inside the span of mask."""
+    return popcount(span_mask(mask) & teaching & ~mask)
+
+
+def adjacent_pairs(mask):
+    return popcount(mask & (mask >> 1))
+
+
+def variance(values):
+    if not values:
+        return 0.0
+    mean = sum(values) / len(values)
+    return sum((v - mean) ** 2 for v in values) / len(values)
+
+
+class QualityEvaluator:
+    """Bitmask view of one solve's placements, with full and incremental scoring."""
+
+    def __init__(self, model, weights=None):
+        self.model = model
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+
+        # Per year: slot key -> bit, teaching (non-lunch) bits, bits after the first lunch
+        self.year_bits = []
+        for year in model.years:
+            bits = {slot.key: 1 << slot.index for slot in year.slots}
+            teaching = sum(1 << slot.index for slot in year.slots if not slot.is_lunch)
+            lunch = [slot.index for slot in year.slots if slot.is_lunch]
+            after_lunch = 0
+            if lunch:
+                after_lunch = sum(1 << slot.index for slot in year.slots
+                                  if slot.index > lunch[0] and not slot.is_lunch)
+            self.year_bits.append((bits, teaching, after_lunch))
+
+        # Teachers can span years with different grids: one global slot order
+        lunch_everywhere = {}
+        for year in model.years:
+            for slot in year.slots:
+                lunch_everywhere[slot.key] = lunch_everywhere.get(slot.key, True) and slot.is_lunch
+        ordered = global_slot_order(model.years)
+        self.teacher_bits = {key: 1 << i for i, key in enumerate(ordered)}
+        self.teacher_teaching = sum(self.teacher_bits[k] for k in ordered if not lunch_everywhere[k])
+
+        week = set()
+        for year in model.years:
+            week.update(year.working_days)
+        self.week = [day for day in DAY_NAMES if day in week]
+
+        self.unallocated = 0
+        # (division_id, day) -> {batch: mask}; (teacher_id, day) -> mask
+        self.class_rows = {}
+        self.teacher_rows = {}
+        # (division_id, day, code, batch) -> mask of non-lab hours
+        self.subject_rows = {}
+        # (division_id, day, batch) -> mask of lab hours
+        self.lab_rows = {}
+        self.mismatch_hours = 0
+        self.over_capacity_hours = 0
+        # Soft window rules are fixed per session; soft run limits are read off the rows
+        self.constraints = model.constraints
+        self.soft_windows = 0.0
+
+    # ----- loading and moves --------------------------------------------------
+
+    @classmethod
+    def from_context(cls, ctx, weights=None):
+        evaluator = cls(ctx.model, weights)
+        for placement in ctx.placements.values():
+            evaluator._toggle(placement.req, placement.day, placement.slot_keys, placement.teacher, placement.room, True)
+        evaluator.unallocated = sum(d.remaining for d in ctx.demands.values() if d.remaining > 0)
+        return evaluator
+
+    def _masks(self, req, slot_keys):
+        bits = self.year_bits[req.year_id][0]
+        class_mask = 0
+        teacher_mask = 0
+        for key in slot_keys:
+            class_mask |= bits[key]
+            teacher_mask |= self.teacher_bits[key]
+        return class_mask, teacher_mask
+
+    def _mismatch(self, req, room, hours):
+        expected = EXPECTED_ROOM_TYPES.get(req.type)
+        return hours if expected and room.type not in expected else 0
+
+    def _over_capacity(self, req, room, hours):
+        capacity = room_capacity(room)
+        return hours if req.strength is not None and capacity is not None and capacity < req.strength else 0
+
+    def _toggle(self, req, day, slot_keys, teacher, room, adding):
+        """Add or remove one session's bits (sessions never overlap within a row)."""
+        class_mask, teacher_mask = self._masks(req, slot_keys)
+        op = (lambda row, mask: row | mask) if adding else (lambda row, mask: row & ~mask)
+
+        batches = self.class_rows.setdefault((req.division_id, day), {})
+        batches[req.batch] = op(batches.get(req.batch, 0), class_mask)
+        teacher_key = (teacher.id, day)
+        self.teacher_rows[teacher_key] = op(self.teacher_rows.get(teacher_key, 0), teacher_mask)
+        if req.type == "Lab":
+            lab_key = (req.division_id, day, req.batch)
+            self.lab_rows[lab_key] = op(self.lab_rows.get(lab_key, 0), class_mask)
+        else:
+            subject_key = (req.division_id, day, req.code, req.batch)
+            self.subject_rows[subject_key] = op(self.subject_rows.get(subject_key, 0), class_mask)
+        mismatch = self._mismatch(req, room, len(slot_keys))
+        self.mismatch_hours += mismatch if adding else -mismatch
+        over = self._over_capacity(req, room, len(slot_keys))
+        self.over_capacity_hours += over if adding else -over
+        if self.constraints.penalty_tables:
+            penalty = self.constraints.static_penalty(req, day, slot_keys, teacher.id, room.id)
+            self.soft_windows += penalty if adding else -penalty
+
+    def apply(self, remove=(), add=()):
+        """
+        Apply a move. remove: Placements taken out; add: (req, day, slot_keys,
+        teacher, room) tuples put in. Unallocated hours follow the move.
+        """
+        for p in remove:
+            self._toggle(p.req, p.day, p.slot_keys, p.teacher, p.room, False)
+            self.unallocated += len(p.slot_keys)
+        for req, day, slot_keys, teacher, room in add:
+            self._toggle(req, day, slot_keys, teacher, room, True)
+            self.unallocated -= len(slot_keys)
+
+    def delta(self, remove=(), add=()):
+        """Score change of a move, evaluating only the rows it touches."""
+        sessions = [(p.req, p.day, p.slot_keys, p.teacher, p.room) for p in remove] + list(add)
+        class_keys = {(req.division_id, day) for req, day, _, _, _ in sessions}
+        teachers = {teacher.id for _, _, _, teacher, _ in sessions}
+        subject_keys = {(req.division_id, day, req.code, req.batch) for req, day, _, _, _ in sessions if req.type != "Lab"}
+        lab_keys = {(req.division_id, day, req.batch) for req, day, _, _, _ in sessions if req.type == "Lab"}
+
+        before = self._partial(class_keys, teachers, subject_keys, lab_keys)
+        self.apply(remove, add)
+        after = self._partial(class_keys, teachers, subject_keys, lab_keys)
+        # Undo: add back what was removed, remove what was added
+        for req, day, slot_keys, teacher, room in add:
+            self._toggle(req, day, slot_keys, teacher, room, False)
+            self.unallocated += len(slot_keys)
+        for p in remove:
+            self._toggle(p.req, p.day, p.slot_keys, p.teacher, p.room, True)
+            self.unallocated -= len(p.slot_keys)
+        return after - before
+
+    # ----- metrics ------------------------------------------------------------
+
+    def _class_gaps(self, key):
+        division_id, _ = key
+        teaching = self.year_bits[self.model.divisions[division_id].year_id][1]
+        occupied = 0
+        for mask in self.class_rows.get(key, {}).values():
+            occupied |= mask
+        return gaps(occupied, teaching)
+
+    def _class_runs(self, key):
+        """Soft maxConsecutive penalty of one class day."""
+        limits = self.constraints.soft_class_limits.get(key[0])
+        if not limits:
+            return 0.0
+        occupied = 0
+        for mask in self.class_rows.get(key, {}).values():
+            occupied |= mask
+        return sum(weight * consecutive_excess(occupied, limit) for limit, weight in limits)
+
+    def _teacher_runs(self, teacher_id):
+        limits = self.constraints.soft_teacher_limits.get(teacher_id)
+        if not limits:
+            return 0.0
+        return sum(
+            weight * consecutive_excess(self.teacher_rows.get((teacher_id, day), 0), limit)
+            for limit, weight in limits for day in self.week
+        )
+
+    def _teacher_terms(self, teacher_id):
+        """(gaps over the week, load variance) of one teacher."""
+        rows = [self.teacher_rows.get((teacher_id, day), 0) for day in self.week]
+        total_gaps = sum(gaps(mask, self.teacher_teaching) for mask in rows)
+        loads = [popcount(mask) for mask in rows]
+        return total_gaps, (variance(loads) if any(loads) else 0.0)
+
+    def _lab_after_lunch(self, key):
+        division_id, _, _ = key
+        after_lunch = self.year_bits[self.model.divisions[division_id].year_id][2]
+        return popcount(self.lab_rows.get(key, 0) & after_lunch)
+
+    def _partial(self, class_keys, teachers, subject_keys, lab_keys):
+        """Weighted score restricted to the given rows (plus the global terms)."""
+        w = self.weights
+        score = w["unallocated_hours"] * self.unallocated
+        score += w["room_type_mismatch"] * self.mismatch_hours
+        score += w["over_capacity"] * self.over_capacity_hours
+        score += w["student_gaps"] * sum(self._class_gaps(key) for key in class_keys)
+        for teacher_id in teachers:
+            teacher_gaps, load_variance = self._teacher_terms(teacher_id)
+            score += w["teacher_gaps"] * teacher_gaps + w["teacher_load_variance"] * load_variance
+        if self.constraints.soft:
+            soft = self.soft_windows
+            soft += sum(self._class_runs(key) for key in class_keys)
+            soft += sum(self._teacher_runs(teacher_id) for teacher_id in teachers)
+            score += w["soft_constraints"] * soft
+        score += w["back_to_back"] * sum(adjacent_pairs(self.subject_rows.get(key, 0)) for key in subject_keys)
+        score += w["labs_after_lunch"] * sum(self._lab_after_lunch(key) for key in lab_keys)
+        return score
+
+    def metrics(self):
+        teacher_ids = {teacher_id for teacher_id, _ in self.teacher_rows}
+        teacher_terms = [self._teacher_terms(tid) for tid in teacher_ids]
+        return {
+            "unallocated_hours": self.unallocated,
+            "student_gaps": sum(self._class_gaps(key) for key in self.class_rows),
+            "teacher_gaps": sum(t[0] for t in teacher_terms),
+            "teacher_load_variance": round(sum(t[1] for t in teacher_terms), 4),
+            "back_to_back": sum(adjacent_pairs(mask) for mask in self.subject_rows.values()),
+            "labs_after_lunch": sum(self._lab_after_lunch(key) for key in self.lab_rows),
+            "room_type_mismatch": self.mismatch_hours,
+            "over_capacity": self.over_capacity_hours,
+            "soft_constraints": round(
+                self.soft_windows
+                + sum(self._class_runs(key) for key in self.class_rows)
+                + sum(self._teacher_runs(tid) for tid in teacher_ids), 4),
+        }
+
+    def score(self):
+        return self._partial(self.class_rows, {tid for tid, _ in self.teacher_rows},
+                             self.subject_rows, self.lab_rows)
+
+    def report(self):
+        """Full evaluation in the shape returned as result["quality"]."""
+        return {"score": round(self.score(), 4), "metrics": self.metrics(), "weights": dict(self.weights)}
+
+
+def evaluate_context(ctx, weights=None):
+    return QualityEvaluator.from_context(ctx, weights).report()
@@ -0,0 +1,64 @@
+# ============================================
+# FILE 15: solver/helpers/stats.py
+# ============================================
+
+import time
+from contextlib import contextmanager
+
+
+class SolveStats:
+    """
+    Per-solve timings and counters, returned to the caller as result["stats"].
+    An optional listener receives progress events as dicts (see emit).
+    """
+
+    def __init__(self, listener=None):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.counters = {}
+        self.caches = {}
+        self.listener = listener
+
+    def emit(self, event, **data):
+        """Send a progress event to the listener. A failing listener never breaks the solve."""
+        if self.listener is None:
+            return
+        try:
+            self.listener({"event": event, "elapsed": round(time.perf_counter() - self.started, 4), **data})
+        except Exception as e:
+            print(f"Progress listener failed: {e}")
+
+    @contextmanager
+    def phase(self, name):
+        """Time a solver phase; repeated phases accumulate."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def cache_lookup(self, cache_name, hit):
+        entry = self.caches.setdefault(cache_name, {"hits": 0, "misses": 0})
+        entry["hits" if hit else "misses"] += 1
+
+    def merge(self, other):
+        """Add the phases, counters and cache lookups of another SolveStats."""
+        for name, seconds in other.phases.items():
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+        for name, amount in other.counters.items():
+            self.count(name, amount)
+        for cache_name, values in other.caches.items():
+            entry = self.caches.setdefault(cache_name, {"hits": 0, "misses": 0})
+            for key in ("hits", "misses"):
+                entry[key] += values[key]
+
+    def to_dict(self):
+        return {
+            "total_seconds": time.perf_counter() - self.started,
+            "phases": dict(self.phases),
+            "counters": dict(self.counters),
+            "caches": {name: dict(values) for name, values in self.caches.items()}
+        }
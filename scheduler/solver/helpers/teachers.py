@@ -4,28 +4,32 @@
 
 from ..config import DAY_NAMES
 
-def initialize_teacher_daily_limits(teachers):
-    """Initialize teacher daily load tracking with configurable limits."""
+def initialize_teacher_daily_limits(model):
+    """Initialize teacher daily load tracking, keyed by teacher id."""
     teacher_limits = {}
-    for t in teachers:
-        max_daily = t.get("maxHoursPerDay", 4)
-        teacher_limits[t["name"]] = {
-            "max_per_day": max_daily,
+    for t in model.teachers:
+        teacher_limits[t.id] = {
+            "max_per_day": t.max_per_day,
             "daily_count": {day: 0 for day in DAY_NAMES}
         }
     return teacher_limits
 
 
-def can_teacher_take_slot(teacher_name, day, teacher_limits):
-    """Check if teacher can take another slot today."""
-    if teacher_name not in teacher_limits:
+def reset_teacher_daily_counts(day, teacher_limits):
+    """Start a fresh day for every teacher."""
+    for limit_data in teacher_limits.values():
+        limit_data["daily_count"][day] = 0
+
+
+def can_teacher_take_slot(teacher_id, day, teacher_limits, hours=1):
+    """Check if teacher can take `hours` more slots today."""
+    if teacher_id not in teacher_limits:
         return True
-    limit_data = teacher_limits[teacher_name]
-    return limit_data["daily_count"][day] < limit_data["max_per_day"]
+    limit_data = teacher_limits[teacher_id]
+    return limit_data["daily_count"][day] + hours <= limit_data["max_per_day"]
 
 
-def increment_teacher_daily_count(teacher_name, day, teacher_limits):
+def increment_teacher_daily_count(teacher_id, day, teacher_limits, hours=1):
     """Increment teacher's daily hour count."""
-    if teacher_name in teacher_limits:
-        teacher_limits[teacher_name]["daily_count"][day] += 1
-
+    if teacher_id in teacher_limits:
+        teacher_limits[teacher_id]["daily_count"][day] += hours
@@ -4,38 +4,29 @@
 
 from ..config import DAY_NAMES
 
-def initialize_complete_structure(years, teachers, rooms, year_time_slots):
+def initialize_complete_structure(model):
     """Initialize COMPLETE timetable structures with ALL time slots."""
     class_tt = {}
     teacher_tt = {}
     room_tt = {}
     
-    for yname, ydata in years.items():
-        divs = int(ydata.get("divisions", 1))
-        class_tt[yname] = {}
+    for year in model.years:
+        class_tt[year.name] = {}
         
-        for div in range(1, divs + 1):
-            class_tt[yname][div] = {}
+        for div_id in year.division_ids:
+            div = model.divisions[div_id].number
+            class_tt[year.name][div] = {}
             for day in DAY_NAMES:
-                class_tt[yname][div][day] = {}
-                for slot in year_time_slots[yname]:
-                    class_tt[yname][div][day][slot["slot_key"]] = []
-    
-    for t in teachers:
-        teacher_tt[t["name"]] = {}
-        for day in DAY_NAMES:
-            teacher_tt[t["name"]][day] = {}
-            first_year = list(years.keys())[0]
-            for slot in year_time_slots[first_year]:
-                teacher_tt[t["name"]][day][slot["slot_key"]] = []
-    
-    for r in rooms:
-        room_tt[r["name"]] = {}
-        for day in DAY_NAMES:
-            room_tt[r["name"]][day] = {}
-            first_year = list(years.keys())[0]
-            for slot in year_time_slots[first_year]:
-                room_tt[r["name"]][day][slot["slot_key"]] = []
+                class_tt[year.name][div][day] = {slot.key: [] for slot in year.slots}
+    
+    # Teacher and room grids start from the first year's slots; other keys are added on demand
+    first_slots = model.years[0].slots if model.years else ()
+    
+    for t in model.teachers:
+        teacher_tt[t.name] = {day: {slot.key: [] for slot in first_slots} for day in DAY_NAMES}
+    
+    for r in model.rooms:
+        room_tt[r.name] = {day: {slot.key: [] for slot in first_slots} for day in DAY_NAMES}
     
     return class_tt, teacher_tt, room_tt
 
@@ -45,14 +36,12 @@ def get_previous_slot_subject(class_tt, yname, div, day, current_slot_idx, time_
     if current_slot_idx == 0:
         return None
     
-    prev_slot_idx = current_slot_idx - 1
-    prev_slot_info = time_slots[prev_slot_idx]
+    prev_slot_info = time_slots[current_slot_idx - 1]
     
-    if prev_slot_info.get("is_lunch"):
+    if prev_slot_info.is_lunch:
         return None
     
-    prev_slot_key = prev_slot_info["slot_key"]
-    prev_entries = class_tt[yname][div][day].get(prev_slot_key, [])
+    prev_entries = class_tt[yname][div][day].get(prev_slot_info.key, [])
     
     for entry in prev_entries:
         if entry.get("type") == "Theory":
@@ -0,0 +1,133 @@
+# ============================================
+# FILE 35: solver/recommendations/deferred.py
+# ============================================
+"""
+Recommendations computed on demand instead of with every solve.
+
+With "deferRecommendations" in the payload a solve returns no
+recommendations, only a "recommendation_handle". The handle names a
+DeferredRecommendations kept in this process's RECOMMENDATIONS store: the
+result's unallocated sessions and a RecommendationIndex built when the solve
+finished. Recommendations are then computed per session (by index
+into the result's "unallocated" list) or all at once when asked for, and
+each one is cached on the handle.
+
+Handles live in the process that solved. A caller whose handle is unknown
+(expired, or answered by another worker) can send the result's
+"unallocated" and "lab_conflicts" with the payload's "teachers" and "rooms"
+instead; from_context rebuilds the same recommendations from them and keeps
+them under that handle. Solves outside the serving process (pool workers,
+the batch CLI) keep nothing: their handles are rebuild-only.
+"""
+import multiprocessing
+import threading
+import uuid
+from collections import OrderedDict
+
+from ..core.model import PayloadError
+from .sessions import RecommendationIndex, recommend_session
+
+
+class DeferredRecommendations:
+    """Lazily computed, cached recommendations of one solve result."""
+
+    def __init__(self, unallocated, lab_conflicts, teachers, rooms, handle=None):
+        self.id = handle or uuid.uuid4().hex
+        self.unallocated = list(unallocated)
+        self.index = RecommendationIndex(lab_conflicts, teachers, rooms)
+        self._computed = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_context(cls, context, handle=None):
+        """Rebuild from a result's unallocated/lab_conflicts and the payload's teachers/rooms. Raises PayloadError."""
+        errors = [
+            {"path": field, "message": "must be a list", "value": type(context.get(field)).__name__}
+            for field in ("unallocated", "lab_conflicts", "teachers", "rooms")
+            if not isinstance(context.get(field, []), list)
+        ]
+        if "unallocated" not in context:
+            errors.append({"path": "unallocated", "message": "is required without a known handle", "value": None})
+        elif not errors:
+            errors = [
+                {"path": f"unallocated.{i}", "message": "must be a session object", "value": session}
+                for i, session in enumerate(context["unallocated"])
+                if not isinstance(session, dict) or not {"subject", "type", "year"} <= session.keys()
+            ]
+        if errors:
+            raise PayloadError(errors)
+        teachers = [t for t in context.get("teachers") or [] if isinstance(t, dict)]
+        rooms = [r for r in context.get("rooms") or [] if isinstance(r, dict)]
+        lab_conflicts = [c for c in context.get("lab_conflicts") or [] if isinstance(c, dict)]
+        return cls(context["unallocated"], lab_conflicts, teachers, rooms, handle)
+
+    def eligible(self):
+        """Indexes of the sessions recommendations are made for: those the solver tried."""
+        return [i for i, session in enumerate(self.unallocated) if not session.get("not_attempted")]
+
+    def get(self, sessions=None):
+        """
+        Recommendations for the given indexes into "unallocated" (default:
+        every session the solver tried), each with its "index".
+        Raises PayloadError for an index out of range or never attempted.
+        """
+        eligible = self.eligible()
+        if sessions is None:
+            sessions = eligible
+        elif not isinstance(sessions, list):
+            raise PayloadError([{"path": "sessions", "message": "must be a list of indexes", "value": sessions}])
+        allowed = set(eligible)
+        errors = [
+            {"path": f"sessions.{n}", "message": "not an unallocated session the solver attempted", "value": i}
+            for n, i in enumerate(sessions) if not isinstance(i, int) or isinstance(i, bool) or i not in allowed
+        ]
+        if errors:
+            raise PayloadError(errors)
+
+        recommendations = []
+        for i in sessions:
+            with self._lock:
+                recommendation = self._computed.get(i)
+            if recommendation is None:
+                recommendation = {"index": i, **recommend_session(self.unallocated[i], self.index)}
+                with self._lock:
+                    self._computed[i] = recommendation
+            recommendations.append(recommendation)
+        return recommendations
+
+    def summary(self):
+        with self._lock:
+            computed = len(self._computed)
+        return {"handle": self.id, "sessions": len(self.eligible()), "computed": computed}
+
+
+class RecommendationStore:
+    """Deferred recommendations by handle; the least recently used are dropped."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Off where no /recommendations request can ever reach this store
+        self.keep_handles = True
+
+    def keeps_handles(self):
+        """Whether a handle added now can be answered later: never in a pool worker, whose store dies with it."""
+        return self.keep_handles and multiprocessing.parent_process() is None
+
+    def add(self, deferred):
+        with self._lock:
+            self._entries[deferred.id] = deferred
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return deferred.id
+
+    def get(self, handle):
+        with self._lock:
+            deferred = self._entries.get(handle)
+            if deferred is not None:
+                self._entries.move_to_end(handle)
+            return deferred
+
+
+RECOMMENDATIONS = RecommendationStore()
@@ -0,0 +1,375 @@
+# ============================================
+# FILE 22: solver/search/exact.py
+# ============================================
+"""
+Exact backtracking for small sub-problems the greedy phases leave unfinished.
+
+A sub-problem is one batch of a division, or a whole division: every session
+of its requirements is taken out of the timetable and scheduled again by a
+complete search, with everything else held fixed. Fixed placements (such as
+warm-started ones) of the sub-problem stay put and count as placed. The search is a plain
+depth-first backtracking over requirements:
+
+* MRV: branch on the requirement with the least slack (live values minus
+  sessions still to place);
+* forward checking: each value watches the teacher, room, batch and class
+  keys it needs, so placing a session kills every value that now clashes
+  and a requirement whose live values drop below its open sessions fails
+  immediately;
+* nogood caching: the residual problem is fully described by the open
+  session counts, the occupied keys and the per-day subject counts, so its
+  hash is kept once its subtree is exhausted and never searched again. This
+  also removes the symmetry between sessions of the same requirement.
+
+Every attempt runs under a node budget, and the whole phase under its own
+time budget and the solve deadline. An attempt that fails or runs out of
+budget puts the greedy placements back unchanged.
+"""
+import math
+from collections import Counter
+
+from ..core.conflict_checker import constraint_conflict, saved_room_conflict, saved_teacher_conflict
+from ..core.deadline import Deadline
+
+
+class BudgetExhausted(Exception):
+    """Raised inside the search when the node or time budget runs out."""
+
+
+class Value:
+    """One way to place one session: day, window, teacher and room."""
+    __slots__ = ("day", "slot_keys", "teacher", "room", "occupies", "blocked_by")
+
+    def __init__(self, day, slot_keys, teacher, room, occupies, blocked_by):
+        self.day = day
+        self.slot_keys = slot_keys
+        self.teacher = teacher
+        self.room = room
+        self.occupies = occupies
+        self.blocked_by = blocked_by
+
+
+def _value_keys(req, day, slot_keys, teacher, room):
+    """(keys the session occupies, keys that must be free for it)."""
+    occupies, blocked_by = [], []
+    for slot_key in slot_keys:
+        teacher_key = ("teacher", teacher.id, day, slot_key)
+        room_key = ("room", room.id, day, slot_key)
+        class_key = ("class", day, slot_key)
+        occupies += [teacher_key, room_key, class_key]
+        blocked_by += [teacher_key, room_key]
+        if req.batch is None:
+            # Theory needs the whole class free
+            occupies.append(("theory", day, slot_key))
+            blocked_by.append(class_key)
+        else:
+            # A batch only clashes with theory and with itself
+            batch_key = ("batch", req.batch, day, slot_key)
+            occupies.append(batch_key)
+            blocked_by += [("theory", day, slot_key), batch_key]
+    return tuple(occupies), tuple(blocked_by)
+
+
+class ExactSearch:
+    """Complete search for the sessions of a fixed set of demands."""
+
+    def __init__(self, ctx, demands, node_limit, budget):
+        self.ctx = ctx
+        self.demands = demands
+        self.node_limit = node_limit
+        self.budget = budget
+        self.nodes = 0
+
+        model = ctx.model
+        self.reqs = [d.req for d in demands]
+        # Sessions still in the timetable (the fixed ones) are not searched for
+        req_ids = {req.id for req in self.reqs}
+        kept = [p for p in ctx.placements.values() if p.req.id in req_ids]
+        kept_sessions = Counter(p.req.id for p in kept)
+        self.open = [
+            max(0, (math.ceil(req.hours / req.lab_duration) if req.kind == "lab" else req.hours) - kept_sessions[req.id])
+            for req in self.reqs
+        ]
+
+        # Load each teacher already carries per day from placements outside the sub-problem
+        self.teacher_load = {}
+        for tid, day, _ in ctx.teacher_at:
+            self.teacher_load[(tid, day)] = self.teacher_load.get((tid, day), 0) + 1
+
+        # Consecutive-period limits read these like a SolverContext's occupancy masks
+        self.constraints = model.constraints
+        self.check_runs = self.constraints.tracks_occupancy
+        self.class_busy = dict(ctx.class_busy)
+        self.teacher_busy = dict(ctx.teacher_busy)
+        self.busy_trail = []
+
+        self.values = [self._domain(req) for req in self.reqs]
+        self.kills = [[0] * len(values) for values in self.values]
+        self.alive = [len(values) for values in self.values]
+
+        # key -> [(requirement index, value index)] of values blocked by that key
+        self.watchers = {}
+        for r, values in enumerate(self.values):
+            for v, value in enumerate(values):
+                for key in value.blocked_by:
+                    self.watchers.setdefault(key, []).append((r, v))
+
+        self.occupied = {}
+        self.subject_day = dict(Counter((p.req.id, p.day) for p in kept))
+        self.trail = []
+        self.nogoods = set()
+        self.state = 0
+        for r, count in enumerate(self.open):
+            self.state ^= hash(("open", r, count))
+
+        self.max_per_day = [
+            req.max_per_day if req.kind != "lab" else None for req in self.reqs
+        ]
+        self.teacher_max = {t.id: t.max_per_day for t in model.teachers}
+
+    def _domain(self, req):
+        """Statically feasible values, ordered by start slot then day to spread sessions."""
+        ctx = self.ctx
+        model = ctx.model
+        year = model.years[req.year_id]
+        duration = req.lab_duration if req.kind == "lab" else 1
+        slots = year.slots
+        values = []
+        for start in range(len(slots) - duration + 1):
+            window = slots[start:start + duration]
+            if any(slot.is_lunch for slot in window):
+                continue
+            slot_keys = tuple(slot.key for slot in window)
+            for day in year.working_days:
+                if not self._class_free(req, day, slot_keys):
+                    continue
+                for tid in req.teacher_ids:
+                    teacher = model.teachers[tid]
+                    if any(ctx.teacher_at.get((tid, day, k)) or saved_teacher_conflict(ctx, tid, day, k)
+                           for k in slot_keys):
+                        continue
+                    for room_id in req.room_ids:
+                        room = model.rooms[room_id]
+                        if any(ctx.room_at.get((room_id, day, k)) or saved_room_conflict(ctx, room_id, day, k)
+                               for k in slot_keys):
+                            continue
+                        conflict = constraint_conflict(ctx, req, day, list(slot_keys), teacher, room)
+                        if conflict and conflict["reason"] == "constraint_blocked":
+                            continue
+                        occupies, blocked_by = _value_keys(req, day, slot_keys, teacher, room)
+                        values.append(Value(day, slot_keys, teacher, room, occupies, blocked_by))
+        return values
+
+    def _class_free(self, req, day, slot_keys):
+        """The class is free of placements outside the sub-problem."""
+        for slot_key in slot_keys:
+            for occupant in self.ctx.class_at.get((req.division_id, day, slot_key), ()):
+                if req.batch is None or occupant.req.batch is None or occupant.req.batch == req.batch:
+                    return False
+        return True
+
+    # ----- propagation --------------------------------------------------------
+
+    def _allowed(self, r, value):
+        req = self.reqs[r]
+        duration = len(value.slot_keys)
+        limit = self.teacher_max.get(value.teacher.id)
+        if limit is not None and self.teacher_load.get((value.teacher.id, value.day), 0) + duration > limit:
+            return False
+        cap = self.max_per_day[r]
+        if cap is not None and self.subject_day.get((req.id, value.day), 0) >= cap:
+            return False
+        if self.check_runs and (
+                self.constraints.class_too_long(self, req, value.day, value.slot_keys)
+                or self.constraints.teacher_too_long(self, value.teacher.id, value.day, value.slot_keys)):
+            return False
+        return True
+
+    def _assign(self, r, v):
+        """Place value v of requirement r. Returns False on a domain wipeout."""
+        value = self.values[r][v]
+        self.trail.append((r, v))
+        self.state ^= hash(("open", r, self.open[r])) ^ hash(("open", r, self.open[r] - 1))
+        self.open[r] -= 1
+
+        teacher_day = (value.teacher.id, value.day)
+        self.teacher_load[teacher_day] = self.teacher_load.get(teacher_day, 0) + len(value.slot_keys)
+        subject_day = (self.reqs[r].id, value.day)
+        count = self.subject_day.get(subject_day, 0)
+        self.state ^= hash(("day", subject_day, count)) ^ hash(("day", subject_day, count + 1))
+        self.subject_day[subject_day] = count + 1
+
+        if self.check_runs:
+            req = self.reqs[r]
+            class_day = (req.division_id, value.day)
+            self.busy_trail.append((self.class_busy.get(class_day, 0), self.teacher_busy.get(teacher_day, 0)))
+            self.class_busy[class_day] = self.busy_trail[-1][0] | self.constraints.slot_bits(req.year_id, value.slot_keys)
+            self.teacher_busy[teacher_day] = self.busy_trail[-1][1] | self.constraints.global_bits(value.slot_keys)
+
+        touched = {r}
+        for key in value.occupies:
+            count = self.occupied.get(key, 0)
+            self.occupied[key] = count + 1
+            if count:
+                continue
+            self.state ^= hash(("key", key))
+            for other, w in self.watchers.get(key, ()):
+                self.kills[other][w] += 1
+                if self.kills[other][w] == 1:
+                    self.alive[other] -= 1
+                    touched.add(other)
+
+        return all(self.alive[t] >= self.open[t] for t in touched)
+
+    def _unassign(self):
+        r, v = self.trail.pop()
+        value = self.values[r][v]
+        self.state ^= hash(("open", r, self.open[r])) ^ hash(("open", r, self.open[r] + 1))
+        self.open[r] += 1
+
+        self.teacher_load[(value.teacher.id, value.day)] -= len(value.slot_keys)
+        subject_day = (self.reqs[r].id, value.day)
+        count = self.subject_day[subject_day]
+        self.state ^= hash(("day", subject_day, count)) ^ hash(("day", subject_day, count - 1))
+        self.subject_day[subject_day] = count - 1
+
+        if self.check_runs:
+            class_mask, teacher_mask = self.busy_trail.pop()
+            self.class_busy[(self.reqs[r].division_id, value.day)] = class_mask
+            self.teacher_busy[(value.teacher.id, value.day)] = teacher_mask
+
+        for key in value.occupies:
+            count = self.occupied[key] - 1
+            self.occupied[key] = count
+            if count:
+                continue
+            self.state ^= hash(("key", key))
+            for other, w in self.watchers.get(key, ()):
+                self.kills[other][w] -= 1
+                if self.kills[other][w] == 0:
+                    self.alive[other] += 1
+
+    # ----- search -------------------------------------------------------------
+
+    def _search(self):
+        self.nodes += 1
+        if self.nodes > self.node_limit or (self.nodes % 256 == 0 and (self.budget.expired() or self.ctx.expired())):
+            raise BudgetExhausted()
+
+        # MRV: least slack first; ties go to longer sessions
+        best, best_key = None, None
+        for r, count in enumerate(self.open):
+            if count <= 0:
+                continue
+            key = (self.alive[r] - count, -self.reqs[r].lab_duration)
+            if best_key is None or key < best_key:
+                best, best_key = r, key
+        if best is None:
+            return True
+
+        if self.state in self.nogoods:
+            self.ctx.stats.count("exact_nogood_hits")
+            return False
+
+        kills = self.kills[best]
+        for v, value in enumerate(self.values[best]):
+            if kills[v] or not self._allowed(best, value):
+                continue
+            consistent = self._assign(best, v)
+            if consistent and self._search():
+                return True
+            self._unassign()
+
+        self.nogoods.add(self.state)
+        return False
+
+    def solve(self):
+        """List of (req, Value) for every session, or None if none was found in budget."""
+        if any(alive < count for alive, count in zip(self.alive, self.open)):
+            return None
+        try:
+            found = self._search()
+        except BudgetExhausted:
+            self.ctx.stats.count("exact_budget_exhausted")
+            found = False
+        finally:
+            self.ctx.stats.count("exact_nodes", self.nodes)
+        if not found:
+            return None
+        return [(self.reqs[r], self.values[r][v]) for r, v in self.trail]
+
+
+def _subproblems(ctx):
+    """Demand groups to re-solve: unfinished batches first, then whole divisions."""
+    by_division = {}
+    for demand in ctx.demands.values():
+        by_division.setdefault(demand.req.division_id, []).append(demand)
+
+    groups = []
+    for division_id in sorted(by_division):
+        demands = by_division[division_id]
+        if not any(d.remaining > 0 for d in demands):
+            continue
+        batches = sorted({d.req.batch for d in demands if d.remaining > 0 and d.req.batch is not None})
+        for batch in batches:
+            groups.append([d for d in demands if d.req.batch == batch])
+        groups.append(demands)
+    return groups
+
+
+def _resolve(ctx, demands, node_limit, budget):
+    """Re-solve one group in place. Keeps the greedy placements when no full solution is found."""
+    if not all(d.req.teacher_ids and d.req.room_ids for d in demands):
+        return False
+    req_ids = {d.req.id for d in demands}
+    removed = [p for p in ctx.placements.values() if p.req.id in req_ids and not p.fixed]
+    remaining = [d.remaining for d in demands]
+    for placement in removed:
+        ctx.remove_session(placement)
+
+    solution = ExactSearch(ctx, demands, node_limit, budget).solve()
+
+    if solution is None:
+        for p in removed:
+            ctx.place_session(p.req, p.day, list(p.slot_keys), p.teacher, p.room, count_towards_limit=p.counted)
+        for demand, left in zip(demands, remaining):
+            demand.remaining = left
+        return False
+
+    for req, value in solution:
+        ctx.place_session(req, value.day, list(value.slot_keys), value.teacher, value.room,
+                          count_towards_limit=False)
+    for demand in demands:
+        req = demand.req
+        if req.kind == "lab":
+            demand.remaining = req.hours - math.ceil(req.hours / req.lab_duration) * req.lab_duration
+        else:
+            demand.remaining = 0
+        demand.attempted = True
+    return True
+
+
+def solve_unfinished_exactly(ctx, node_limit=20000, time_budget=None):
+    """
+    Hybrid phase: run the exact search on every unfinished batch or division.
+    Returns the number of sub-problems solved.
+    """
+    print("=== EXACT: BACKTRACKING OVER UNFINISHED CLASSES ===")
+    budget = Deadline.coerce(time_budget)
+    solved = 0
+    done = set()
+    for demands in _subproblems(ctx):
+        if ctx.expired() or budget.expired():
+            break
+        # A division whose batches were all fixed already needs no second pass
+        if not any(d.remaining > 0 for d in demands):
+            continue
+        key = tuple(sorted(d.req.id for d in demands))
+        if key in done:
+            continue
+        done.add(key)
+        ctx.stats.count("exact_attempts")
+        if _resolve(ctx, demands, node_limit, budget):
+            solved += 1
+            ctx.stats.count("exact_solved")
+    return solved
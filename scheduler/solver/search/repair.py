@@ -0,0 +1,221 @@
+# ============================================
+# FILE 21: solver/search/repair.py
+# ============================================
+"""
+Local-search repair of leftover sessions.
+
+Runs after the greedy phases. For every requirement that still has hours
+left it tries each (day, slot or window, teacher, room) option. The option's
+blockers are looked up in the context's occupancy indexes, which is a
+constant number of dict lookups per option:
+
+* no blockers: place directly. Up to DIRECT_CANDIDATES such options are
+  collected and the one that adds least to the quality score (an
+  incremental QualityEvaluator delta) is taken;
+* exactly one movable blocker (a single-slot session placed in this solve):
+  eject it, place the leftover session, then re-insert the ejected session
+  elsewhere, recursively up to max_depth (an ejection chain). If the chain
+  fails, every step is undone. Chains are only tried when no option can be
+  placed directly.
+
+Moves respect the same daily limits as the greedy phases: the teacher's
+hours per day and the requirement's sessions per day. Sessions moved
+recently are tabu so chains do not undo each other, and the whole phase
+stops at its own time budget or the solve deadline.
+"""
+from collections import Counter, deque
+
+from ..core.conflict_checker import constraint_conflict, saved_room_conflict, saved_teacher_conflict
+from ..core.deadline import Deadline
+from ..helpers.quality import QualityEvaluator
+
+TABU_TENURE = 16
+DIRECT_CANDIDATES = 32
+
+
+class RepairSearch:
+    def __init__(self, ctx, time_budget=None, max_depth=2):
+        self.ctx = ctx
+        self.budget = Deadline.coerce(time_budget)
+        self.max_depth = max_depth
+        self.recently_moved = deque(maxlen=TABU_TENURE)
+        # Placements made earlier in the current chain must not be ejected again
+        self.pinned = set()
+        # Kept in step with every move to score direct insertions
+        self.quality = QualityEvaluator.from_context(ctx, ctx.options.quality_weights)
+        # Daily limits, counted over every placement: the phases' own counts restart each day
+        self.teacher_load = Counter((tid, day) for tid, day, _ in ctx.teacher_at)
+        self.per_day = Counter((p.req.id, p.day) for p in ctx.placements.values())
+
+    def stopped(self):
+        return self.ctx.expired() or self.budget.expired()
+
+    # ----- option enumeration -------------------------------------------------
+
+    def options(self, req):
+        """(day, slot_keys) options for one session of req, in timetable order."""
+        year = self.ctx.model.years[req.year_id]
+        duration = req.lab_duration if req.kind == "lab" else 1
+        slots = year.slots
+        for day in year.working_days:
+            for start in range(len(slots) - duration + 1):
+                window = slots[start:start + duration]
+                if any(slot.is_lunch for slot in window):
+                    continue
+                yield day, [slot.key for slot in window]
+
+    def blockers(self, req, day, slot_keys, teacher, room):
+        """
+        Placements that stand in the way, or None when a hard constraint
+        (saved timetable, declarative constraint, same class theory clash that
+        cannot move) blocks it.
+        """
+        ctx = self.ctx
+        if constraint_conflict(ctx, req, day, list(slot_keys), teacher, room):
+            return None
+        found = {}
+        for slot_key in slot_keys:
+            if saved_teacher_conflict(ctx, teacher.id, day, slot_key):
+                return None
+            if saved_room_conflict(ctx, room.id, day, slot_key):
+                return None
+
+            occupant = ctx.teacher_at.get((teacher.id, day, slot_key))
+            if occupant:
+                found[occupant.id] = occupant
+            occupant = ctx.room_at.get((room.id, day, slot_key))
+            if occupant:
+                found[occupant.id] = occupant
+            for occupant in ctx.class_at.get((req.division_id, day, slot_key), ()):
+                if req.batch is None or occupant.req.batch is None or occupant.req.batch == req.batch:
+                    found[occupant.id] = occupant
+        return list(found.values())
+
+    def within_limits(self, req, day, slot_keys, teacher):
+        """The daily limits allocate_slot enforces: teacher hours and sessions of req."""
+        if req.kind != "lab" and self.per_day[(req.id, day)] >= req.max_per_day:
+            return False
+        return self.teacher_load[(teacher.id, day)] + len(slot_keys) <= teacher.max_per_day
+
+    def movable(self, placement):
+        return (
+            placement.req.kind != "lab"
+            and placement.id not in self.pinned
+            and placement.req.id not in self.recently_moved
+        )
+
+    # ----- moves ------------------------------------------------------------
+
+    def probes(self, req):
+        """(day, slot_keys, teacher, room, blockers) of every option of req, in timetable order."""
+        ctx = self.ctx
+        model = ctx.model
+        for day, slot_keys in self.options(req):
+            if self.stopped():
+                return
+            for tid in req.teacher_ids:
+                teacher = model.teachers[tid]
+                for room_id in req.room_ids:
+                    room = model.rooms[room_id]
+                    ctx.stats.count("repair_probes")
+                    blocking = self.blockers(req, day, slot_keys, teacher, room)
+                    if blocking is not None:
+                        yield day, slot_keys, teacher, room, blocking
+
+    def insert(self, demand, depth):
+        """Place one session of demand, ejecting at most one blocker per level."""
+        req = demand.req
+
+        best, best_delta, found = None, None, 0
+        for day, slot_keys, teacher, room, blocking in self.probes(req):
+            if blocking or not self.within_limits(req, day, slot_keys, teacher):
+                continue
+            option = (day, slot_keys, teacher, room)
+            delta = self.quality.delta(add=[(req, *option)])
+            if best is None or delta < best_delta:
+                best, best_delta = option, delta
+            found += 1
+            if found >= DIRECT_CANDIDATES:
+                break
+        if best is not None:
+            self.place(demand, *best)
+            return True
+        if depth == 0:
+            return False
+
+        for day, slot_keys, teacher, room, blocking in self.probes(req):
+            if len(blocking) != 1 or not self.movable(blocking[0]):
+                continue
+            if self.eject_and_insert(demand, day, slot_keys, teacher, room, blocking[0], depth):
+                return True
+        return False
+
+    def eject_and_insert(self, demand, day, slot_keys, teacher, room, victim, depth):
+        ctx = self.ctx
+        victim_demand = ctx.demands[victim.req.id]
+        original = (victim.day, victim.slot_keys, victim.teacher, victim.room)
+
+        self.remove(victim_demand, victim)
+        # The victim's hours no longer count towards the limits
+        if not self.within_limits(demand.req, day, slot_keys, teacher):
+            self.place(victim_demand, *original, counted=victim.counted)
+            return False
+        placed = self.place(demand, day, slot_keys, teacher, room)
+
+        self.recently_moved.append(victim.req.id)
+        self.pinned.add(placed.id)
+        try:
+            moved = self.insert(victim_demand, depth - 1)
+        finally:
+            self.pinned.discard(placed.id)
+        if moved:
+            ctx.stats.count("repair_moves")
+            return True
+
+        # Undo: take the new session out and put the victim back where it was
+        self.remove(demand, placed)
+        self.place(victim_demand, *original, counted=victim.counted)
+        return False
+
+    def place(self, demand, day, slot_keys, teacher, room, counted=False):
+        placement = self.ctx.place_session(demand.req, day, list(slot_keys), teacher, room,
+                                           count_towards_limit=counted)
+        self.per_day[(demand.req.id, day)] += 1
+        self.teacher_load[(teacher.id, day)] += len(placement.slot_keys)
+        demand.remaining -= demand.req.lab_duration if demand.req.kind == "lab" else 1
+        self.quality.apply(add=[(demand.req, day, placement.slot_keys, teacher, room)])
+        return placement
+
+    def remove(self, demand, placement):
+        self.ctx.remove_session(placement)
+        self.per_day[(demand.req.id, placement.day)] -= 1
+        self.teacher_load[(placement.teacher.id, placement.day)] -= len(placement.slot_keys)
+        demand.remaining += len(placement.slot_keys) if demand.req.kind == "lab" else 1
+        self.quality.apply(remove=[placement])
+
+    # ----- driver -----------------------------------------------------------
+
+    def run(self, demands):
+        """Repair every demand with hours left. Returns the number of hours placed."""
+        before = sum(d.remaining for d in demands)
+        # Cheap direct insertions first, then ejection chains
+        for depth in (0, self.max_depth):
+            for demand in demands:
+                while demand.remaining > 0 and not self.stopped():
+                    demand.attempted = True
+                    if not self.insert(demand, depth):
+                        break
+            if self.stopped():
+                break
+        repaired = before - sum(max(0, d.remaining) for d in demands)
+        self.ctx.stats.count("repair_hours", repaired)
+        return repaired
+
+
+def repair_unallocated(ctx, time_budget=None, max_depth=2):
+    """Improvement phase: place leftover sessions by moving already-placed ones."""
+    print("=== REPAIR: LOCAL SEARCH OVER LEFTOVER SESSIONS ===")
+    leftovers = [d for d in ctx.demands.values() if d.remaining > 0 and d.req.teacher_ids and d.req.room_ids]
+    if not leftovers:
+        return 0
+    return RepairSearch(ctx, time_budget, max_depth).run(leftovers)
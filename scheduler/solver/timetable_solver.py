@@ -3,281 +3,258 @@ Main timetable solver orchestrator.
 This file now only handles the high-level flow.
 """
 import traceback
-from .config import DAY_NAMES, USE_REAL_TIME_SLOTS
-from .core.time_slots import generate_time_slots
+from dataclasses import replace
+from .core.context import SolverOptions
+from .core.deadline import Deadline
+from .core.model import PayloadError, compile_payload
 from .core.validators import validate_requirements
-from .helpers.timetable import initialize_complete_structure
-from .helpers.teachers import initialize_teacher_daily_limits
-from .allocators.theory import allocate_theory_lectures
-from .allocators.labs import allocate_lab_continuous
-from .allocators.practicals import allocate_practicals
-from .allocators.base import allocate_slot
+from .diff import attach_diff, parse_diff_option
+from .helpers.demands import build_session_summary
+from .helpers.quality import evaluate_context
+from .helpers.stats import SolveStats
+from .engines import ENGINES, get_engine
+from .recommendations.deferred import RECOMMENDATIONS, DeferredRecommendations
 from .recommendations.sessions import generate_enhanced_recommendations
 
-def solver_greedy_distribute(payload):
-    """Main solver orchestrator."""
-    # Extract data
-    years = payload.get("years", {})
-    teachers = payload.get("teachers", [])
-    rooms = payload.get("rooms", [])
-    saved_timetables = payload.get("saved_timetables", [])
-    room_mappings = payload.get("roomMappings", {})
-    
-    # Validate
-    critical_issues = validate_requirements(years, teachers, rooms)
-    if critical_issues:
-        return {
-            "status": "error",
-            "class_timetable": {},
-            "teacher_timetable": {},
-            "conflicts": [],
-            "room_conflicts": [],
-            "unallocated": [],
-            "recommendations": [],
-            "room_recommendations": [],
-            "critical_issues": critical_issues,
-            "warnings": critical_issues,
-            "lab_conflicts": []
-        }
-    
-    # Initialize pools
-    theory_pool = []
-    practical_pool = []
-    lab_pool = []
-    lab_conflicts = []
-    
-    # Generate time slots for each year
-    year_time_slots = {}
-    for yname, ydata in years.items():
-        time_config = ydata.get("timeConfig", {})
-        if time_config and USE_REAL_TIME_SLOTS:
-            year_time_slots[yname] = generate_time_slots(
-                time_config.get("startTime", "09:00"),
-                time_config.get("endTime", "17:00"),
-                time_config.get("periodDuration", 60),
-                time_config.get("lunchStart"),
-                time_config.get("lunchDuration")
-            )
-        else:
-            periods_per_day = int(ydata.get("periodsPerDay", 6))
-            year_time_slots[yname] = [
-                {
-                    "period": i,
-                    "start": None,
-                    "end": None,
-                    "slot_key": str(i),
-                    "is_lunch": (i == int(ydata.get("lunchBreak", 4)))
-                }
-                for i in range(1, periods_per_day + 1)
-            ]
-    
-    # Build requirement pools
-    for yname, ydata in years.items():
-        divs = int(ydata.get("divisions", 1))
-        
-        for div in range(1, divs + 1):
-            for subj in ydata.get("subjects", []):
-                stype = subj.get("type", "Theory")
-                hours = int(subj.get("hours", 1))
-                batches = int(subj.get("batches", 1)) if stype != "Theory" else 1
-                lab_duration = int(subj.get("labDuration", 1)) if stype == "Lab" else 1
-                
-                for b_idx in range(1, batches + 1):
-                    req = {
-                        "year": yname,
-                        "div": div,
-                        "code": subj["code"],
-                        "type": stype,
-                        "batch": b_idx if stype != "Theory" else None,
-                        "remaining": hours,
-                        "count_today": 0,
-                        "max_per_day": min(hours, 2),
-                        "lab_duration": lab_duration
-                    }
-                    
-                    if stype == "Theory":
-                        theory_pool.append(req)
-                    elif stype == "Lab" and lab_duration > 1:
-                        lab_pool.append(req)
-                    else:
-                        practical_pool.append(req)
-    
-    # Initialize structures
-    class_tt, teacher_tt, room_tt = initialize_complete_structure(
-        years, teachers, rooms, year_time_slots
+
+def build_error_result(critical_issues, stats=None, **extra):
+    """Result shape for solves that could not start."""
+    return {
+        "status": "error",
+        "class_timetable": {},
+        "teacher_timetable": {},
+        "conflicts": [],
+        "room_conflicts": [],
+        "unallocated": [],
+        "recommendations": [],
+        "room_recommendations": [],
+        "critical_issues": critical_issues,
+        "warnings": critical_issues,
+        "lab_conflicts": [],
+        "deadline_reached": False,
+        "cancelled": False,
+        "not_attempted": [],
+        "stats": stats.to_dict() if stats else {},
+        **extra
+    }
+
+
+def count_placements(class_tt):
+    """Number of placed (class, day, slot) entries."""
+    return sum(
+        len(entries)
+        for divisions in class_tt.values()
+        for days in divisions.values()
+        for slots in days.values()
+        for entries in slots.values()
     )
-    teacher_limits = initialize_teacher_daily_limits(teachers)
+
+
+def solver_greedy_distribute(payload, deadline=None, stats=None, options=None):
+    """Main solver orchestrator: compile, validate, run the selected engine, build the result."""
+    stats = stats or SolveStats()
+    options = options or SolverOptions.from_payload(payload)
+    engine = get_engine(options.engine)
+    diff_option = parse_diff_option(payload.get("diff"))
     
-    # PHASE 1: Theory Lectures
-    allocate_theory_lectures(
-        theory_pool, years, year_time_slots, class_tt,
-        teacher_tt, room_tt, teachers, rooms,
-        saved_timetables, teacher_limits, room_mappings
-    )
+    # Compile the raw payload once; allocators only read the compiled model
+    stats.emit("phase_start", phase="compile")
+    with stats.phase("compile"):
+        model = compile_payload(payload, options.use_real_time_slots, stats, options.warm_start)
+    stats.emit("phase_end", phase="compile", seconds=round(stats.phases["compile"], 4),
+               requirements=len(model.requirements))
     
-    # PHASE 2: Multi-hour Labs
-    print("=== PHASE 2: ALLOCATING MULTI-HOUR LABS ===")
-    failed_lab_attempts = {}
+    # Validate
+    with stats.phase("validate"):
+        critical_issues = validate_requirements(model.raw_years, model.raw_teachers, model.raw_rooms)
+    if critical_issues:
+        return build_error_result(critical_issues, stats)
     
-    for day in DAY_NAMES:
-        for teacher_name in teacher_limits:
-            teacher_limits[teacher_name]["daily_count"][day] = 0
-        
-        for req in lab_pool:
-            if req["remaining"] <= 0:
-                continue
-            
-            yname = req["year"]
-            ydata = years[yname]
-            
-            if day in ydata.get("holidays", []):
-                continue
-            
-            slots = year_time_slots[yname]
-            lab_duration = req["lab_duration"]
-            lab_key = f"{req['year']}_Div{req['div']}_{req['code']}_Batch{req['batch']}"
-            
-            for start_idx in range(len(slots) - lab_duration + 1):
-                if req["remaining"] <= 0:
-                    break
-                
-                success, conflict_info = allocate_lab_continuous(
-                    req, day, start_idx, class_tt, teacher_tt, room_tt,
-                    teachers, rooms, year_time_slots, saved_timetables,
-                    lab_conflicts, teacher_limits, room_mappings
-                )
-                
-                if success:
-                    req["remaining"] -= lab_duration
-                    if lab_key in failed_lab_attempts:
-                        del failed_lab_attempts[lab_key]
-                    break
-                
-                if conflict_info and conflict_info.get('reason'):
-                    if lab_key not in failed_lab_attempts:
-                        failed_lab_attempts[lab_key] = {
-                            "req": req,
-                            "conflict": conflict_info,
-                            "days_attempted": set()
-                        }
-                    failed_lab_attempts[lab_key]["days_attempted"].add(day)
-                    if conflict_info.get('reason') == 'break_interruption':
-                        failed_lab_attempts[lab_key]["conflict"] = conflict_info
+    ctx, failed_lab_attempts = engine(model, options, Deadline.coerce(deadline), stats)
+    result = build_result(ctx, failed_lab_attempts)
+    result["engine"] = options.engine
+    if diff_option:
+        attach_diff(result, payload, diff_option)
+    return result
 
+
+def build_result(ctx, failed_lab_attempts):
+    """Turn a finished context into the response payload."""
+    model, stats, deadline = ctx.model, ctx.stats, ctx.deadline
+    theory_pool, lab_pool, practical_pool = ctx.theory_pool, ctx.lab_pool, ctx.practical_pool
+    lab_conflicts = ctx.lab_conflicts
+    class_tt = ctx.class_tt
     
-    # PHASE 3: Practicals
-    allocate_practicals(
-        practical_pool, years, year_time_slots, class_tt,
-        teacher_tt, room_tt, teachers, rooms,
-        saved_timetables, teacher_limits, room_mappings
-    )
-    
-    # FALLBACK ALLOCATION
-    print("=== FALLBACK ALLOCATION ===")
-    for req in theory_pool + practical_pool:
-        if req["remaining"] > 0:
-            for day in DAY_NAMES:
-                ydata = years[req["year"]]
-                if day in ydata.get("holidays", []):
-                    continue
-                
-                for slot_info in year_time_slots[req["year"]]:
-                    if slot_info["is_lunch"]:
-                        continue
-                    if req["remaining"] <= 0:
-                        break
-                    
-                    if allocate_slot(req, day, slot_info, class_tt, teacher_tt,
-                                   room_tt, teachers, rooms, saved_timetables,
-                                   None, None, room_mappings):
-                        req["remaining"] -= 1
+    # Requirements the solver never reached before the deadline
+    deadline_reached = deadline.reached
+    not_attempted = [
+        build_session_summary(d)
+        for d in theory_pool + lab_pool + practical_pool
+        if d.remaining > 0 and not d.attempted
+    ]
+    if deadline_reached:
+        print(f"⏱️ Deadline reached after {deadline.elapsed():.2f}s, "
+              f"{len(not_attempted)} requirement(s) not attempted")
     
     # Build unallocated sessions
     unallocated_sessions = []
     
-    for req in theory_pool + practical_pool:
-        if req["remaining"] > 0:
+    for d in theory_pool + practical_pool:
+        if d.remaining > 0:
             unallocated_sessions.append({
-                "subject": req["code"],
-                "type": req["type"],
-                "year": req["year"],
-                "division": req["div"],
-                "batch": f"{req['year']} - Div {req['div']}",
-                "batch_num": req["batch"],
-                "required": req["remaining"] + req.get("count_today", 0),
-                "assigned": req.get("count_today", 0),
-                "missing": req["remaining"],
-                "lab_duration": req.get("lab_duration", 1)
+                **build_session_summary(d),
+                "required": d.remaining + d.count_today,
+                "assigned": d.count_today,
+                "not_attempted": not d.attempted
             })
     
-    for req in lab_pool:
-        if req["remaining"] > 0:
-            lab_key = f"{req['year']}_Div{req['div']}_{req['code']}_Batch{req['batch']}"
+    for d in lab_pool:
+        if d.remaining > 0:
+            lab_key = d.req.key
             failure_reason = None
-            if lab_key in failed_lab_attempts:
-                failure_reason = failed_lab_attempts[lab_key]["conflict"].get("reason")
             if lab_key in failed_lab_attempts:
                 conflict = failed_lab_attempts[lab_key]["conflict"]
-                if conflict.get("reason") == "break_interruption":
+                failure_reason = conflict.get("reason")
+                if failure_reason == "break_interruption":
                     lab_conflicts.append(conflict)
 
             unallocated_sessions.append({
-                "subject": req["code"],
+                **build_session_summary(d),
                 "type": "Lab",
-                "year": req["year"],
-                "division": req["div"],
-                "batch": f"{req['year']} - Div {req['div']}",
-                "batch_num": req["batch"],
-                "required": req["remaining"],
+                "required": d.remaining,
                 "assigned": 0,
-                "missing": req["remaining"],
-                "lab_duration": req.get("lab_duration", 1),
-                "failure_reason": failure_reason
+                "failure_reason": failure_reason,
+                "not_attempted": not d.attempted
             })
     
-    # Generate recommendations
-    recommendations = generate_enhanced_recommendations(
-        unallocated_sessions, lab_conflicts, class_tt, years, teachers, rooms
-    )
+    # Generate recommendations (only for sessions the solver actually tried),
+    # or leave them to be asked for through a handle
+    recommendation_handle = None
+    rebuild_only = False
+    with stats.phase("recommendations"):
+        if ctx.options.defer_recommendations:
+            recommendations = []
+            deferred = DeferredRecommendations(
+                unallocated_sessions, lab_conflicts, model.raw_teachers, model.raw_rooms
+            )
+            recommendation_handle = deferred.id
+            # A handle only this process could answer would be lost with it
+            if RECOMMENDATIONS.keeps_handles():
+                RECOMMENDATIONS.add(deferred)
+            else:
+                rebuild_only = True
+        else:
+            recommendations = generate_enhanced_recommendations(
+                [s for s in unallocated_sessions if not s["not_attempted"]],
+                lab_conflicts, class_tt, model.raw_years, model.raw_teachers, model.raw_rooms
+            )
+    
+    with stats.phase("quality"):
+        quality = evaluate_context(ctx, ctx.options.quality_weights)
+    
+    stats.count("placements", count_placements(class_tt))
+    stats.count("unallocated_hours", sum(s["missing"] for s in unallocated_sessions))
     
     return {
-        "status": "success" if (not unallocated_sessions) else "partial",
+        "status": "success" if (not unallocated_sessions and not deadline_reached) else "partial",
         "class_timetable": class_tt,
-        "teacher_timetable": teacher_tt,
+        "teacher_timetable": ctx.teacher_tt,
         "conflicts": [],
         "room_conflicts": [],
         "unallocated": unallocated_sessions,
         "recommendations": recommendations,
+        "recommendations_deferred": recommendation_handle is not None,
+        "recommendation_handle": recommendation_handle,
+        # The handle is known nowhere: /recommendations needs the result context with it
+        "recommendation_handle_rebuild_only": rebuild_only,
         "room_recommendations": [],
         "lab_conflicts": lab_conflicts,
+        "deadline_reached": deadline_reached,
+        "cancelled": deadline.cancelled,
+        "not_attempted": not_attempted,
+        "warm_start": ctx.warm_start,
+        "quality": quality,
+        "stats": stats.to_dict(),
         "warnings": [
-            f"{r['year']} Div {r['div']} {r['code']} missing {r['remaining']} hrs"
-            for r in theory_pool + practical_pool + lab_pool if r["remaining"] > 0
+            f"{d.req.year} Div {d.req.div} {d.req.code} missing {d.remaining} hrs"
+            for d in theory_pool + practical_pool + lab_pool if d.remaining > 0
         ]
     }
 
-def solve_timetable(payload):
-    """Public entry point."""
+def solve_timetable(payload, deadline=None, options=None, progress=None):
+    """
+    Public entry point.
+    
+    deadline: optional time budget in seconds (or a Deadline). Falls back to the
+    payload's "timeLimit". When it is reached the best timetable so far is
+    returned with status "partial" and "deadline_reached": True.
+    
+    options: SolverOptions; defaults to the payload's solver flags. All per-solve
+    state lives on a SolverContext, so concurrent calls from threads are safe.
+    
+    progress: optional callable receiving progress event dicts (phase_start,
+    phase_end with placements, unallocated hours and ETA). Pass a Deadline and
+    call its cancel() from another thread to stop the solve early.
+    """
     try:
+        if deadline is None:
+            deadline = payload.get("timeLimit")
+        try:
+            deadline = Deadline.coerce(deadline)
+        except (TypeError, ValueError):
+            raise PayloadError([{"path": "timeLimit", "message": "must be a finite number of seconds", "value": deadline}])
+        
         print("=== SOLVER START ===")
         print(f"Years: {list(payload.get('years', {}).keys())}")
         print(f"Teachers: {len(payload.get('teachers', []))}")
         print(f"Rooms: {len(payload.get('rooms', []))}")
+        if deadline.limit is not None:
+            print(f"Time limit: {deadline.limit:.1f}s")
         print("====================")
-        return solver_greedy_distribute(payload)
+        return solver_greedy_distribute(payload, deadline, SolveStats(progress), options)
+    except PayloadError as e:
+        print("Invalid payload:", e)
+        return build_error_result(
+            [f"INVALID INPUT: {err['path']}: {err['message']}" for err in e.errors],
+            error=str(e),
+            payload_errors=e.errors
+        )
     except Exception as e:
         print("Exception in solver:", e)
         traceback.print_exc()
-        return {
-            "class_timetable": {},
-            "teacher_timetable": {},
-            "status": "error",
-            "error": str(e),
-            "conflicts": [],
-            "room_conflicts": [],
-            "unallocated": [],
-            "recommendations": [],
-            "room_recommendations": [],
-            "lab_conflicts": [],
-            "critical_issues": [f"System error: {str(e)}"]
-        }
\ No newline at end of file
+        return build_error_result([f"System error: {str(e)}"], error=str(e))
+
+
+def compare_engines(payload, engines=None, deadline=None):
+    """
+    Solve one payload with several engines and report time against quality.
+    Each engine gets the full time budget. "recommended" is the fastest
+    engine among those with the best quality score.
+    """
+    base_options = SolverOptions.from_payload(payload)
+    runs = []
+    for name in engines or sorted(ENGINES):
+        result = solve_timetable(payload, deadline, replace(base_options, engine=name))
+        stats = result.get("stats") or {}
+        counters = stats.get("counters", {})
+        runs.append({
+            "engine": name,
+            "status": result["status"],
+            "seconds": stats.get("total_seconds"),
+            "phases": stats.get("phases", {}),
+            "placements": counters.get("placements", 0),
+            "unallocated_hours": counters.get("unallocated_hours", 0),
+            "quality_score": (result.get("quality") or {}).get("score"),
+            "deadline_reached": result["deadline_reached"],
+            "error": result.get("error")
+        })
+    
+    finished = [r for r in runs if r["status"] != "error"]
+    recommended = None
+    if finished:
+        best = min(r["quality_score"] for r in finished)
+        recommended = min(
+            (r for r in finished if r["quality_score"] == best),
+            key=lambda r: r["seconds"]
+        )["engine"]
+    return {"engines": runs, "recommended": recommended}
@@ -0,0 +1,43 @@
+# ============================================
+# FILE 29: solver/utils.py
+# ============================================
+"""Small helpers shared by the constraint layer and the quality evaluator."""
+
+
+def popcount(mask):
+    return bin(mask).count("1")
+
+
+def run_starts(mask, length):
+    """Bits that start a run of at least `length` consecutive set bits."""
+    for _ in range(length - 1):
+        mask &= mask >> 1
+    return mask
+
+
+def consecutive_excess(mask, limit):
+    """Set bits beyond the first `limit` of every run (0 when no run is longer)."""
+    return popcount(run_starts(mask, limit + 1))
+
+
+def time_to_minutes(value):
+    """Minutes since midnight of an "HH:MM" string. Raises ValueError."""
+    hours, minutes = str(value).split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def global_slot_order(years):
+    """
+    Slot keys of every year's grid in one time order, for resources that span
+    years: by start time, then slot index. Periods are never compared; they
+    mix numbers with "BREAK".
+    """
+    order = {}
+    for year in years:
+        for slot in year.slots:
+            try:
+                minutes = time_to_minutes(slot.start)
+            except (TypeError, ValueError):
+                minutes = -1
+            order.setdefault(slot.key, (minutes, slot.index))
+    return sorted(order, key=order.get)
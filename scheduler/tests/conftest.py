@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+
+# The service modules and the solver package live next to this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def client():
+    from main import app
+    return app.test_client()
@@ -0,0 +1,68 @@
+"""Small /generate payloads, and contexts solved from them, for the solver tests."""
+from solver.core.context import SolverContext, SolverOptions
+from solver.core.deadline import Deadline
+from solver.core.model import compile_payload
+from solver.engines import run_greedy_phases
+from solver.helpers.stats import SolveStats
+
+
+def time_config(start="09:00", end="17:00", lunch_start="13:00", lunch_duration=60):
+    config = {"startTime": start, "endTime": end, "periodDuration": 60}
+    if lunch_start:
+        config.update(lunchStart=lunch_start, lunchDuration=lunch_duration)
+    return config
+
+
+def make_year(subjects, divisions=1, holidays=("Sat", "Sun"), config=None):
+    return {
+        "divisions": divisions,
+        "subjects": subjects,
+        "holidays": list(holidays),
+        "timeConfig": config or time_config(),
+    }
+
+
+def theory(code, hours=3):
+    return {"code": code, "name": code, "type": "Theory", "hours": hours}
+
+
+def lab(code, hours=2, batches=1, duration=2):
+    return {"code": code, "name": code, "type": "Lab", "hours": hours, "batches": batches, "labDuration": duration}
+
+
+def make_payload(years, teachers, rooms, **options):
+    payload = {"years": years, "teachers": teachers, "rooms": rooms, "saved_timetables": [], "roomMappings": {}}
+    payload.update(options)
+    return payload
+
+
+def standard_payload(years=("FE", "SE"), divisions=2, teachers_per_subject=2, **options):
+    """A solvable payload: four theory subjects and two labs per year."""
+    year_data = {}
+    teachers = []
+    for name in years:
+        subjects = [theory(f"{name}-T{i}") for i in range(4)] + [lab(f"{name}-L{i}", batches=3) for i in range(2)]
+        year_data[name] = make_year(subjects, divisions)
+        for subject in subjects:
+            for _ in range(teachers_per_subject):
+                teachers.append({"name": f"Teacher {len(teachers) + 1}", "subjects": [{"code": subject["code"]}],
+                                 "maxHoursPerDay": 5})
+    rooms = [{"name": f"Lab {i + 1}", "type": "Lab", "capacity": 30} for i in range(4)]
+    rooms += [{"name": f"Classroom {i + 1}", "type": "Classroom", "capacity": 60} for i in range(4)]
+    return make_payload(year_data, teachers, rooms, **options)
+
+
+def placed_hours(result, year, division, code):
+    """Hours of a subject placed for one class (lab parts count one hour each)."""
+    days = result["class_timetable"][year][division]
+    return sum(1 for slots in days.values() for entries in slots.values()
+               for entry in entries if entry.get("subject") == code)
+
+
+def solved_context(payload):
+    """Context after the greedy phases (and any optional phase the payload turns on)."""
+    options = SolverOptions.from_payload(payload)
+    model = compile_payload(payload, options.use_real_time_slots, warm_start=options.warm_start)
+    ctx = SolverContext(model, options, Deadline.coerce(None), SolveStats())
+    run_greedy_phases(ctx)
+    return ctx
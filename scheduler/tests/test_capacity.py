@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+
+import pytest
+
+import solver.capacity as capacity
+from payloads import standard_payload
+from solver.core.model import PayloadError
+
+
+@pytest.fixture
+def variants(monkeypatch):
+    """Solving a variant replaced by a lookup: unallocated hours by the swept dimension's value."""
+    fake = SimpleNamespace(hours={}, probed=[])
+
+    def evaluate(base, dimensions, config, time_limit):
+        fake.probed.append(config[0])
+        return {"status": "success", "unallocated_hours": fake.hours[config[0]], "seconds": 0,
+                "deadline_reached": False, "error": None}
+
+    monkeypatch.setattr(capacity, "evaluate_variant", evaluate)
+    return fake
+
+
+def sweep(dimension, **kwargs):
+    spec = dict({"resource": "rooms", "roomType": "Lab", "min": 0, "max": 12}, **dimension)
+    return capacity.sweep_capacity(standard_payload(years=("FE",)), [spec], max_workers=1, **kwargs)
+
+
+def test_bisection_finds_the_smallest_value_meeting_the_target(variants):
+    variants.hours.update({v: max(0, 5 - v) for v in range(13)})
+    report = sweep({})
+    assert report["minimal"] == {"rooms:Lab": 5}
+    probed = variants.probed
+    assert len(probed) < 13 and 12 in probed
+    # Invariant: every probe below the answer misses the target, every one from it up meets it
+    assert all((variants.hours[v] == 0) == (v >= 5) for v in probed)
+
+
+def test_target_allows_leftover_hours(variants):
+    variants.hours.update({v: max(0, 5 - v) for v in range(13)})
+    assert sweep({}, target=2)["minimal"] == {"rooms:Lab": 3}
+
+
+def test_non_monotone_dimension_checks_every_value(variants):
+    # Feasible at 2 and from 9 up: bisection would stop at 9
+    variants.hours.update({v: 0 if v == 2 or v >= 9 else 4 for v in range(13)})
+    assert sweep({})["minimal"] == {"rooms:Lab": 9}
+    variants.probed.clear()
+    report = sweep({"monotone": False})
+    assert report["minimal"] == {"rooms:Lab": 2}
+    assert sorted(variants.probed) == list(range(13))
+
+
+def test_curve_has_a_point_per_value(variants):
+    variants.hours.update({v: max(0, 6 - v) for v in range(0, 13)})
+    report = sweep({"step": 3, "curve": True})
+    curve = report["dimensions"][0]["curve"]
+    assert [p["value"] for p in curve] == [0, 3, 6, 9, 12]
+    assert [p["unallocated_hours"] for p in curve] == [6, 3, 0, 0, 0]
+    assert report["minimal"] == {"rooms:Lab": 6}
+
+
+def test_infeasible_maximum_reports_no_minimal(variants):
+    variants.hours.update({v: 1 for v in range(13)})
+    report = sweep({})
+    assert not report["feasible"] and report["minimal"] is None
+    assert variants.probed == [12]
+
+
+@pytest.mark.parametrize("kwargs, path", [
+    ({"target": "x"}, "targetUnallocatedHours"), ({"target": -1}, "targetUnallocatedHours"),
+    ({"variant_time_limit": "x"}, "variantTimeLimit"), ({"variant_time_limit": 0}, "variantTimeLimit"),
+    ({"variant_time_limit": "nan"}, "variantTimeLimit"),
+])
+def test_bad_target_and_variant_limit_are_payload_errors(kwargs, path):
+    with pytest.raises(PayloadError) as raised:
+        sweep({}, **kwargs)
+    assert [e["path"] for e in raised.value.errors] == [path]
+
+
+def test_sweep_endpoint_rejects_a_bad_target(client):
+    body = standard_payload(years=("FE",), targetUnallocatedHours="x", variantTimeLimit="x",
+                            dimensions=[{"resource": "rooms", "roomType": "Lab", "max": 4}])
+    response = client.post("/capacity/sweep", json=body)
+    assert response.status_code == 400
+    assert [e["path"] for e in response.get_json()["payload_errors"]] == ["targetUnallocatedHours", "variantTimeLimit"]
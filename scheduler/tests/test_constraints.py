@@ -0,0 +1,86 @@
+import pytest
+
+from payloads import lab, make_payload, make_year, standard_payload, time_config
+from solver.constraints import ConstraintSet
+from solver.core.model import compile_payload
+from solver.timetable_solver import solve_timetable
+from solver.utils import global_slot_order
+
+
+def mixed_lunch_payload():
+    payload = standard_payload()
+    payload["years"]["FE"]["timeConfig"] = time_config(lunch_start="12:00", lunch_duration=30)
+    return payload
+
+
+def test_global_slot_order_with_lunch_and_period_at_same_start():
+    model = compile_payload(mixed_lunch_payload())
+    order = global_slot_order(model.years)
+    assert len(order) == len(set(order))
+    starts = {slot.key: slot.start for year in model.years for slot in year.slots}
+    assert [starts[key] for key in order] == sorted(starts[key] for key in order)
+
+
+def test_constraint_set_compiles_for_mixed_grids():
+    model = compile_payload(mixed_lunch_payload())
+    constraints = ConstraintSet(model.years)
+    assert sorted(constraints.teacher_bits.values()) == [1 << i for i in range(len(constraints.teacher_bits))]
+
+
+def two_labs_one_teacher(lab_placement, constraints):
+    return make_payload(
+        {"SE": make_year([lab("L0"), lab("L1")], holidays=("Tue", "Wed", "Thu", "Fri", "Sat", "Sun"),
+                         config=time_config("09:00", "13:00", None))},
+        [{"name": "Rao", "subjects": [{"code": "L0"}, {"code": "L1"}]}],
+        [{"name": "Lab 1", "type": "Lab", "capacity": 30}],
+        labPlacement=lab_placement,
+        constraints=constraints,
+    )
+
+
+@pytest.mark.parametrize("lab_placement", ["first-fit", "matching"])
+def test_subject_rule_does_not_block_other_labs(lab_placement):
+    rule = {"type": "classUnavailable", "year": "SE", "subject": "L0", "from": "09:00", "to": "11:00"}
+    result = solve_timetable(two_labs_one_teacher(lab_placement, [rule]))
+    assert result["status"] == "success"
+    assert result["unallocated"] == []
+    days = result["class_timetable"]["SE"][1]
+    l0_slots = [key for slots in days.values() for key, entries in slots.items()
+                for entry in entries if entry["subject"] == "L0"]
+    assert l0_slots and all(key >= "11:00" for key in l0_slots)
+
+
+def test_teacher_unavailable_is_respected():
+    payload = standard_payload()
+    rule = {"type": "teacherUnavailable", "teacher": "Teacher 1", "days": ["Mon"], "from": "09:00", "to": "13:00"}
+    payload["constraints"] = [rule]
+    result = solve_timetable(payload)
+    monday = result["teacher_timetable"].get("Teacher 1", {}).get("Mon", {})
+    assert not [key for key, entries in monday.items() if entries and key < "13:00"]
+
+
+def test_invalid_rules_are_payload_errors():
+    payload = standard_payload()
+    payload["constraints"] = [{"type": "nope"}, {"type": "maxConsecutive", "resource": "teacher", "limit": 0}]
+    result = solve_timetable(payload)
+    assert result["status"] == "error"
+    assert [e["path"] for e in result["payload_errors"]] == ["constraints[0].type", "constraints[1].limit"]
+
+
+@pytest.mark.parametrize("rule", [
+    {"type": "latestEnd", "year": 2, "time": "15:00"},
+    {"type": "latestEnd", "year": {"name": "FE"}, "time": "15:00"},
+    {"type": "latestEnd", "year": [["FE"]], "time": "15:00"},
+    {"type": "latestEnd", "year": ["FE", "TE"], "time": "15:00"},
+    {"type": "classUnavailable", "year": ["FE"], "from": "09:00", "to": "10:00"},
+])
+def test_malformed_rule_years_are_payload_errors(rule):
+    result = solve_timetable(standard_payload(constraints=[rule]))
+    assert [e["path"] for e in result["payload_errors"]] == ["constraints[0].year"]
+
+
+def test_unhashable_resource_names_are_unknown():
+    rules = [{"type": "teacherUnavailable", "teacher": ["Teacher 1"], "from": "09:00", "to": "10:00"},
+             {"type": "maxConsecutive", "resource": "teacher", "teacher": {"name": "Teacher 1"}, "limit": 2}]
+    result = solve_timetable(standard_payload(constraints=rules))
+    assert [e["path"] for e in result["payload_errors"]] == ["constraints[0].teacher", "constraints[1].teacher"]
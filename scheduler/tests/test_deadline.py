@@ -0,0 +1,52 @@
+import time
+
+import pytest
+
+from payloads import standard_payload
+from solver.batch import _solve_group
+from solver.core.deadline import Deadline
+from solver.timetable_solver import solve_timetable
+
+
+def test_only_none_and_empty_mean_no_limit():
+    assert Deadline.coerce(None).limit is None
+    assert Deadline.coerce("").limit is None
+    spent = Deadline.coerce(0.0)
+    assert spent.limit == 0.0 and spent.expired()
+
+
+@pytest.mark.parametrize("value", ["nan", float("inf"), -1, "soon"])
+def test_bad_limits_are_rejected(value):
+    with pytest.raises(ValueError):
+        Deadline.coerce(value)
+
+
+def test_solve_reports_a_bad_time_limit():
+    result = solve_timetable(standard_payload(years=("FE",), timeLimit="nan"))
+    assert result["payload_errors"][0]["path"] == "timeLimit"
+
+
+@pytest.mark.parametrize("time_limit", ["nan", "inf", 0, -5])
+def test_generate_rejects_time_limits_that_never_or_always_expire(client, time_limit):
+    response = client.post("/generate", json=standard_payload(years=("FE",), timeLimit=time_limit))
+    assert response.status_code == 400
+    assert response.get_json()["payload_errors"][0]["path"] == "timeLimit"
+
+
+def test_explicit_limit_beats_the_service_default(client, monkeypatch):
+    monkeypatch.setenv("SOLVER_TIME_LIMIT", "30")
+    response = client.post("/generate", json=standard_payload(years=("FE",), timeLimit=0))
+    assert response.status_code == 400
+
+
+def test_ends_at_survives_a_late_start():
+    assert Deadline(None).ends_at() is None and Deadline.until(None).limit is None
+    deadline = Deadline(30)
+    assert Deadline.until(deadline.ends_at()).remaining() == pytest.approx(30, abs=0.5)
+    assert Deadline.until(time.time() - 5).expired()
+
+
+def test_a_batch_group_picked_up_after_the_deadline_gets_no_budget():
+    # What a group queued behind max_workers sees once the batch's time is up
+    results = _solve_group([("CS", standard_payload(years=("FE",)))], time.time() - 1)
+    assert results["CS"]["deadline_reached"]
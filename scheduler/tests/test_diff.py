@@ -0,0 +1,58 @@
+import time
+
+from payloads import standard_payload
+from solver.batch import solve_departments
+from solver.diff import diff_timetables, response_result
+from solver.timetable_solver import solve_timetable
+
+
+def entry(subject, teacher, room, **extra):
+    return {"subject": subject, "teacher": teacher, "room": room, "batch": None, "type": "Theory", **extra}
+
+
+def test_diff_pairs_moves_and_merges_lab_parts():
+    lab_parts = [entry("L", "T2", "Lab 1", type="Lab", batch=1, lab_session_id="Tue-10", lab_part=f"{i}/2")
+                 for i in (1, 2)]
+    old = {"FE": {"1": {"Mon": {"09:00-10:00": [entry("A", "T1", "C1")], "10:00-11:00": [entry("B", "T1", "C1")]},
+                        "Tue": {"10:00-11:00": [lab_parts[0]], "11:00-12:00": [lab_parts[1]]}}}}
+    new = {"FE": {"1": {"Mon": {"09:00-10:00": [entry("A", "T1", "C1")], "11:00-12:00": [entry("B", "T1", "C2")]},
+                        "Tue": {"10:00-11:00": [lab_parts[0]], "11:00-12:00": [lab_parts[1]]}}}}
+    diff = diff_timetables(old, new)
+    assert diff["summary"] == {"unchanged": 2, "added": 0, "removed": 0, "moved": 1}
+    moved, = diff["changes"]
+    assert moved["subject"] == "B" and moved["fields"] == ["slots", "room"]
+    assert diff["by_room"] == {"C1": [0], "C2": [0]}
+
+
+def test_diff_keeps_timetables_until_the_response():
+    payload = standard_payload(years=("FE",), diff="saved")
+    result = solve_timetable(payload)
+    assert result["timetables_omitted"] and result["class_timetable"]
+    sent = response_result(result)
+    assert sent["class_timetable"] is None and sent["teacher_timetable"] is None
+    assert result["class_timetable"]     # response_result leaves the result itself alone
+
+
+def test_batch_with_diff_books_shared_teachers_once():
+    # Same teachers and rooms in both departments: one group, solved in turn
+    departments = {name: standard_payload(years=("FE",), diff="saved") for name in ("CS", "IT")}
+    report = solve_departments(departments, max_workers=1)
+    assert report["shared_teachers"]
+    assert report["cross_department_conflicts"] == []
+    assert all(r["class_timetable"] is None and r["diff"] for r in report["departments"].values())
+
+
+def test_job_export_reads_the_timetables_a_diff_left_out(client):
+    response = client.post("/jobs", json=standard_payload(years=("FE",), diff="saved"))
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+    for _ in range(200):
+        summary = client.get(f"/jobs/{job_id}").get_json()
+        if summary["finished_at"]:
+            break
+        time.sleep(0.05)
+    assert summary["result"]["class_timetable"] is None
+
+    export = client.post("/export/csv", json={"job_id": job_id, "resource": "teacher"})
+    assert export.status_code == 200
+    assert len(export.get_data(as_text=True).strip().splitlines()) > 1
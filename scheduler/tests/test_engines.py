@@ -0,0 +1,59 @@
+import random
+from dataclasses import replace
+
+from payloads import standard_payload
+from solver.core.context import SolverOptions
+from solver.core.deadline import Deadline
+from solver.core.model import compile_payload
+from solver.engines import greedy_engine, multistart_engine
+from solver.helpers.quality import QualityEvaluator
+from solver.helpers.stats import SolveStats
+from solver.timetable_solver import solve_timetable
+
+
+def test_multistart_reports_the_winning_run_only():
+    payload = standard_payload(multistartRuns=3, seed=7)
+    model = compile_payload(payload)
+    options = SolverOptions.from_payload(payload)
+
+    # The same runs one by one, each with its own stats
+    seeds = random.Random(7)
+    runs = []
+    for _ in range(3):
+        run_stats = SolveStats()
+        ctx, _ = greedy_engine(model, replace(options, seed=seeds.getrandbits(32)), Deadline.coerce(None), run_stats)
+        runs.append((QualityEvaluator.from_context(ctx).score(), run_stats.counters))
+    winner = min(runs, key=lambda run: run[0])[1]
+
+    stats = SolveStats()
+    ctx, _ = multistart_engine(model, options, Deadline.coerce(None), stats)
+    assert ctx.stats is stats
+    assert stats.counters.pop("multistart_runs") == 3
+    assert stats.counters == winner
+
+
+def test_multistart_result_stats_and_progress():
+    events = []
+    result = solve_timetable(standard_payload(engine="multistart", multistartRuns=2),
+                             progress=events.append)
+    assert result["status"] != "error"
+    assert result["stats"]["counters"]["multistart_runs"] == 2
+    assert "compile" in result["stats"]["phases"] and "theory" in result["stats"]["phases"]
+    assert sum(1 for e in events if e["event"] == "phase_start" and e["phase"] == "theory") == 2
+
+
+def test_seeds_vary_theory_and_labs_without_practicals():
+    model = compile_payload(standard_payload())
+    assert not model.requirements_of_kind("practical")
+    scores = set()
+    for seed in range(4):
+        ctx, _ = greedy_engine(model, SolverOptions(seed=seed), Deadline.coerce(None), SolveStats())
+        scores.add(QualityEvaluator.from_context(ctx).score())
+    assert len(scores) > 1
+
+
+def test_no_seed_keeps_payload_order():
+    model = compile_payload(standard_payload())
+    timetables = [greedy_engine(model, SolverOptions(), Deadline.coerce(None), SolveStats())[0].class_tt
+                  for _ in range(2)]
+    assert timetables[0] == timetables[1]
@@ -0,0 +1,79 @@
+from collections import Counter
+
+from payloads import solved_context, standard_payload
+from solver.search.exact import solve_unfinished_exactly
+from solver.timetable_solver import solve_timetable
+
+
+def take_out_division(ctx, division_id, count):
+    """Remove count theory sessions of one division, as if greedy had left them."""
+    taken = [p for p in ctx.placements.values() if p.req.division_id == division_id and p.req.kind == "theory"]
+    for placement in taken[:count]:
+        ctx.remove_session(placement)
+        ctx.demands[placement.req.id].remaining += 1
+
+
+def snapshot(ctx):
+    return sorted((p.req.id, p.day, tuple(p.slot_keys), p.teacher.id, p.room.id, p.counted)
+                  for p in ctx.placements.values())
+
+
+def test_exact_search_completes_an_unfinished_division():
+    ctx = solved_context(standard_payload())
+    take_out_division(ctx, 0, 4)
+    assert solve_unfinished_exactly(ctx) >= 1
+    division = [d for d in ctx.demands.values() if d.req.division_id == 0]
+    assert all(d.remaining <= 0 for d in division)
+
+    # No resource is double-booked, and every daily limit holds for the division
+    for timetable in (ctx.teacher_tt, ctx.room_tt):
+        assert all(len(entries) <= 1 for days in timetable.values()
+                   for slots in days.values() for entries in slots.values())
+    per_day = Counter((p.req.id, p.day) for p in ctx.placements.values()
+                      if p.req.division_id == 0 and p.req.kind != "lab")
+    assert all(count <= ctx.model.requirements[req_id].max_per_day for (req_id, _), count in per_day.items())
+
+
+def test_exhausted_budget_keeps_the_greedy_placements():
+    ctx = solved_context(standard_payload())
+    take_out_division(ctx, 0, 4)
+    before = snapshot(ctx)
+    remaining = {req_id: d.remaining for req_id, d in ctx.demands.items()}
+    assert solve_unfinished_exactly(ctx, node_limit=1) == 0
+    assert snapshot(ctx) == before
+    assert {req_id: d.remaining for req_id, d in ctx.demands.items()} == remaining
+    assert ctx.stats.counters["exact_budget_exhausted"] >= 1
+
+
+def test_fixed_placements_stay_put():
+    ctx = solved_context(standard_payload())
+    take_out_division(ctx, 0, 4)
+    fixed = [p for p in ctx.placements.values() if p.req.division_id == 0][:6]
+    for placement in fixed:
+        placement.fixed = True
+    assert solve_unfinished_exactly(ctx) >= 1
+    assert all(ctx.placements.get(p.id) is p for p in fixed)
+    assert all(d.remaining <= 0 for d in ctx.demands.values() if d.req.division_id == 0)
+
+
+def test_zero_exact_time_limit_skips_the_phase():
+    ctx = solved_context(standard_payload(exact=True, exactTimeLimit=0))
+    assert "exact" not in ctx.planned_phases and "exact" not in ctx.stats.phases
+
+
+def test_exact_search_keeps_warm_started_sessions():
+    solved = solve_timetable(standard_payload(years=("FE",)))
+    saved = [{"year": "FE", "division": division, "timetableData": days}
+             for division, days in solved["class_timetable"]["FE"].items()]
+    ctx = solved_context(standard_payload(years=("FE",), warmStart=True, saved_timetables=saved))
+    assert sum(p.fixed for p in ctx.placements.values()) == ctx.warm_start["kept"] > 0
+    warm = [p for p in ctx.placements.values() if p.req.division_id == 0 and p.fixed]
+
+    # Leave the division unfinished by dropping its warm-started theory, all but two sessions
+    theory = [p for p in warm if p.req.kind == "theory"]
+    for placement in theory[2:]:
+        ctx.remove_session(placement)
+        ctx.demands[placement.req.id].remaining += 1
+    kept = [p for p in warm if p not in theory[2:]]
+    assert solve_unfinished_exactly(ctx) >= 1
+    assert all(ctx.placements.get(p.id) is p for p in kept)
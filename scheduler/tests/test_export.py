@@ -0,0 +1,72 @@
+import pytest
+
+from payloads import time_config
+from solver.core.model import PayloadError
+from solver.export import export_calendar
+
+LAB_PARTS = [{"subject": "L", "type": "Lab", "teacher": "T2", "room": "Lab 1", "batch": 1, "lab_part": f"{i}/2"}
+             for i in (1, 2)]
+TIMETABLE = {"FE": {"1": {
+    "Mon": {"09:00-10:00": [{"subject": "A", "type": "Theory", "teacher": "T1", "room": "C1", "batch": None}]},
+    "Tue": {"10:00-11:00": [LAB_PARTS[0]], "11:00-12:00": [LAB_PARTS[1]]},
+}}}
+
+
+def exported(**request):
+    media_type, filename, chunks = export_calendar(dict({"resource": "teacher", "format": "ics"}, **request))
+    return "".join(chunks)
+
+
+def error_paths(**request):
+    with pytest.raises(PayloadError) as raised:
+        export_calendar(dict({"resource": "teacher", "format": "csv"}, **request))
+    return [e["path"] for e in raised.value.errors]
+
+
+def test_csv_folds_lab_parts_into_one_session():
+    rows = exported(format="csv", class_timetable=TIMETABLE).strip().splitlines()
+    assert rows[1:] == ["T1,Mon,09:00,10:00,,A,Theory,FE,1,,T1,C1", "T2,Tue,10:00,12:00,,L,Lab,FE,1,1,T2,Lab 1"]
+
+
+def test_malformed_timetables_fail_before_streaming():
+    assert error_paths(class_timetable={"FE": ["1"]}) == ["class_timetable.FE"]
+    assert error_paths(class_timetable={"FE": {"1": {"Mon": {"09:00-10:00": 5}}}}) == [
+        "class_timetable.FE.1.Mon.09:00-10:00"]
+    bad_part = {"FE": {"1": {"Tue": {"10:00-11:00": [dict(LAB_PARTS[0], lab_part="1/x")]}}}}
+    assert error_paths(class_timetable=bad_part) == ["class_timetable.FE.1.Tue.10:00-11:00[0].lab_part"]
+    saved = [{"year": ["FE"], "division": "1", "timetableData": {"Mon": []}, "timeConfig": "9 to 5"}]
+    assert error_paths(saved_timetables=saved) == [
+        "saved_timetables[0].year", "saved_timetables[0].timeConfig", "saved_timetables[0].timetableData.Mon"]
+
+
+def test_period_lengths_are_checked():
+    years = {"FE": {"timeConfig": dict(time_config(), periodDuration=0)}}
+    assert error_paths(class_timetable=TIMETABLE, years=years) == ["years.FE.timeConfig.periodDuration"]
+
+
+def test_ics_with_a_timezone_defines_it():
+    calendar = exported(class_timetable=TIMETABLE, timezone="Europe/London", termStart="2026-03-02", weeks=6)
+    lines = calendar.split("\r\n")
+    assert lines.index("BEGIN:VTIMEZONE") < lines.index("BEGIN:VEVENT")
+    zone = lines[lines.index("BEGIN:VTIMEZONE"):lines.index("END:VTIMEZONE")]
+    assert zone[:3] == ["BEGIN:VTIMEZONE", "TZID:Europe/London", "BEGIN:STANDARD"]
+    # British Summer Time starts during the term, at 01:00 GMT on the last Sunday of March
+    daylight = zone[zone.index("BEGIN:DAYLIGHT"):]
+    assert daylight[1:4] == ["DTSTART:20260329T010000", "TZOFFSETFROM:+0000", "TZOFFSETTO:+0100"]
+    assert "DTSTART;TZID=Europe/London:20260302T090000" in lines
+
+
+def test_ics_timezone_without_changes_has_one_observance():
+    calendar = exported(class_timetable=TIMETABLE, timezone="Asia/Kolkata", termStart="2026-07-06")
+    assert calendar.count("BEGIN:STANDARD") == 1 and "BEGIN:DAYLIGHT" not in calendar
+    assert "TZOFFSETTO:+0530" in calendar
+
+
+def test_unknown_timezone_is_a_payload_error():
+    assert error_paths(class_timetable=TIMETABLE, timezone="Mars/Olympus") == ["timezone"]
+
+
+def test_export_endpoint_rejects_a_non_object_body(client):
+    response = client.post("/export/csv", json=[TIMETABLE])
+    assert response.status_code == 400
+    assert response.get_json()["payload_errors"][0]["path"] == "body"
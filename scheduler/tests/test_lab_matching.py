@@ -0,0 +1,28 @@
+import pytest
+
+from payloads import lab, make_payload, make_year
+from solver.allocators.lab_matching import hopcroft_karp
+from solver.timetable_solver import solve_timetable
+
+
+def test_hopcroft_karp_finds_a_maximum_matching():
+    # Greedy in order would give 0 -> 0 and leave 1 unmatched
+    assert hopcroft_karp([[0, 1], [0]], 2) == [1, 0]
+    assert hopcroft_karp([[0], [0]], 1).count(None) == 1
+
+
+def one_teacher_for_many_batches(max_hours_per_day):
+    # 16 two-hour sessions; the teacher fits three a day around lunch, 15 a week
+    year = make_year([lab("L", hours=2, batches=16)])
+    teachers = [{"name": "T", "subjects": [{"code": "L"}], "maxHoursPerDay": max_hours_per_day}]
+    rooms = [{"name": f"Lab {i}", "type": "Lab", "capacity": 30} for i in range(4)]
+    return make_payload({"FE": year}, teachers, rooms, labPlacement="matching")
+
+
+@pytest.mark.parametrize("max_hours_per_day, reason", [(8, "teacher_conflict"), (4, "teacher_daily_limit")])
+def test_unmatched_labs_report_what_blocked_them(max_hours_per_day, reason):
+    result = solve_timetable(one_teacher_for_many_batches(max_hours_per_day))
+    labs = [s for s in result["unallocated"] if s["type"] == "Lab"]
+    assert labs and {s["failure_reason"] for s in labs} == {reason}
+    # Only break interruptions become lab conflicts for the recommendations
+    assert result["lab_conflicts"] == []
@@ -0,0 +1,47 @@
+import pytest
+
+from serving import AdmissionController
+
+
+@pytest.mark.parametrize("endpoint", ["/jobs", "/generate/stream"])
+@pytest.mark.parametrize("body, path", [
+    ("null", "body"),
+    ("[1, 2]", "body"),
+    ('{"years": {}, "timeLimit": "soon"}', "timeLimit"),
+    ('{"years": {}, "timeLimit": [5]}', "timeLimit"),
+    ('{"years": {}, "timeLimit": -1}', "timeLimit"),
+])
+def test_job_requests_are_checked_before_starting(client, endpoint, body, path):
+    response = client.post(endpoint, data=body, content_type="application/json")
+    assert response.status_code == 400
+    assert [e["path"] for e in response.get_json()["payload_errors"]] == [path]
+
+
+@pytest.mark.parametrize("endpoint", ["/generate", "/compare", "/generate/batch", "/capacity/sweep"])
+def test_solving_endpoints_answer_payload_errors_with_400(client, endpoint):
+    response = client.post(endpoint, data="null", content_type="application/json")
+    assert response.status_code == 400
+    assert response.get_json()["payload_errors"][0]["path"] == "body"
+
+
+@pytest.mark.parametrize("endpoint", ["/generate", "/compare", "/generate/batch", "/capacity/sweep"])
+def test_solving_endpoints_answer_429_when_the_worker_is_full(client, monkeypatch, endpoint):
+    import main
+    admission = AdmissionController(max_concurrent=1, max_queue=0, queue_timeout=0)
+    monkeypatch.setattr(main, "admission", admission)
+    with admission.admit():
+        response = client.post(endpoint, json={})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "5"
+
+
+def test_unexpected_errors_answer_500(client, monkeypatch):
+    import main
+
+    def broken(*args):
+        raise RuntimeError("engine crashed")
+
+    monkeypatch.setattr(main, "compare_engines", broken)
+    response = client.post("/compare", json={})
+    assert response.status_code == 500
+    assert response.get_json() == {"error": "engine crashed"}
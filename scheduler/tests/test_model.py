@@ -0,0 +1,42 @@
+import pytest
+
+from payloads import make_payload, make_year, theory, time_config
+from solver.core.model import PayloadError, compile_payload
+from solver.core.time_slots import generate_time_slots
+
+
+def one_year(config):
+    return make_payload({"FE": make_year([theory("FE-T0")], config=config)},
+                        [{"name": "T1", "subjects": [{"code": "FE-T0"}]}],
+                        [{"name": "C1", "type": "Classroom", "capacity": 60}])
+
+
+@pytest.mark.parametrize("field, value", [
+    ("periodDuration", 0), ("periodDuration", -30), ("periodDuration", "long"), ("lunchDuration", -1),
+])
+def test_bad_period_and_lunch_lengths_are_payload_errors(field, value):
+    config = dict(time_config(), **{field: value})
+    with pytest.raises(PayloadError) as raised:
+        compile_payload(one_year(config))
+    assert [e["path"] for e in raised.value.errors] == [f"years.FE.timeConfig.{field}"]
+
+
+def test_zero_lunch_duration_means_no_lunch():
+    model = compile_payload(one_year(time_config(lunch_duration=0)))
+    assert not any(slot.is_lunch for slot in model.years[0].slots)
+
+
+def test_generate_time_slots_refuses_empty_periods():
+    with pytest.raises(ValueError):
+        generate_time_slots("09:00", "17:00", 0)
+
+
+def test_best_fit_keeps_the_primary_year_ahead_of_a_smaller_shared_room():
+    year = dict(make_year([theory("FE-T0")]), strength=40)
+    rooms = [{"name": "Shared small", "type": "Classroom", "capacity": 45, "primaryYear": "Shared"},
+             {"name": "FE big", "type": "Classroom", "capacity": 80, "primaryYear": "FE"},
+             {"name": "FE tight", "type": "Classroom", "capacity": 40, "primaryYear": "FE"},
+             {"name": "FE too small", "type": "Classroom", "capacity": 20, "primaryYear": "FE"}]
+    model = compile_payload(make_payload({"FE": year}, [{"name": "T1", "subjects": [{"code": "FE-T0"}]}], rooms))
+    req, = model.requirements
+    assert [model.rooms[rid].name for rid in req.room_ids] == ["FE tight", "FE big", "Shared small", "FE too small"]
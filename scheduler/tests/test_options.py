@@ -0,0 +1,47 @@
+import pytest
+
+from payloads import standard_payload
+from solver.core.context import SolverOptions
+from solver.core.model import PayloadError
+from solver.timetable_solver import solve_timetable
+
+
+def test_defaults():
+    options = SolverOptions.from_payload({})
+    assert options.multistart_runs == 8
+    assert options.exact_time_limit == 2.0
+    assert options.lab_placement == "matching"
+
+
+def test_numeric_strings_are_accepted():
+    options = SolverOptions.from_payload({"multistartRuns": "3", "repairTimeLimit": "0.5"})
+    assert options.multistart_runs == 3
+    assert options.repair_time_limit == 0.5
+
+
+def test_malformed_values_are_payload_errors():
+    with pytest.raises(PayloadError) as raised:
+        SolverOptions.from_payload({
+            "multistartRuns": "many", "repairTimeLimit": [1], "exactNodeLimit": 0,
+            "exactTimeLimit": None, "labPlacement": "random",
+        })
+    assert [e["path"] for e in raised.value.errors] == [
+        "labPlacement", "multistartRuns", "repairTimeLimit", "exactNodeLimit"
+    ]
+
+
+def test_solve_reports_option_errors():
+    payload = standard_payload(exactTimeLimit="soon")
+    result = solve_timetable(payload)
+    assert result["status"] == "error"
+    assert result["payload_errors"][0]["path"] == "exactTimeLimit"
+
+
+def test_quality_weights_are_checked():
+    options = SolverOptions.from_payload({"qualityWeights": {"student_gaps": "5"}})
+    assert options.quality_weights == {"student_gaps": 5.0}
+    for weights, path in (([1, 2], "qualityWeights"), ({"gaps": 1}, "qualityWeights.gaps"),
+                          ({"back_to_back": "high"}, "qualityWeights.back_to_back")):
+        with pytest.raises(PayloadError) as raised:
+            SolverOptions.from_payload({"qualityWeights": weights})
+        assert [e["path"] for e in raised.value.errors] == [path]
@@ -0,0 +1,25 @@
+from payloads import solved_context, standard_payload, time_config
+from solver.helpers.quality import QualityEvaluator
+from solver.timetable_solver import solve_timetable
+
+
+def test_lunch_and_period_at_same_start_solve():
+    # FE's lunch starts at 12:00, where SE has its fourth period
+    payload = standard_payload()
+    payload["years"]["FE"]["timeConfig"] = time_config(lunch_start="12:00", lunch_duration=30)
+    result = solve_timetable(payload)
+    assert result["status"] == "success", result.get("error")
+    assert result["quality"]["metrics"]["unallocated_hours"] == 0
+
+
+def test_delta_matches_full_rescore():
+    ctx = solved_context(standard_payload())
+    evaluator = QualityEvaluator.from_context(ctx)
+    before = evaluator.score()
+    placement = next(p for p in ctx.placements.values() if p.req.kind == "theory")
+
+    delta = evaluator.delta(remove=[placement])
+    assert evaluator.score() == before     # delta() leaves the evaluator as it was
+
+    evaluator.apply(remove=[placement])
+    assert abs(evaluator.score() - before - delta) < 1e-9
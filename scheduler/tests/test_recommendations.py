@@ -0,0 +1,82 @@
+import pytest
+
+from payloads import standard_payload
+from solver.batch import solve_departments
+from solver.core.model import PayloadError
+from solver.recommendations.deferred import RECOMMENDATIONS, DeferredRecommendations
+from solver.timetable_solver import solve_timetable
+
+
+def short_of_rooms(**options):
+    """Two FE divisions sharing one classroom and one lab: some sessions stay unallocated."""
+    payload = standard_payload(years=("FE",), deferRecommendations=True, **options)
+    payload["rooms"] = [next(r for r in payload["rooms"] if r["type"] == kind) for kind in ("Classroom", "Lab")]
+    return payload
+
+
+def context_of(result, payload):
+    return {"unallocated": result["unallocated"], "lab_conflicts": result["lab_conflicts"],
+            "teachers": payload["teachers"], "rooms": payload["rooms"]}
+
+
+def test_deferred_recommendations_are_computed_once_per_session():
+    result = solve_timetable(short_of_rooms())
+    assert result["recommendations"] == [] and result["recommendations_deferred"]
+    assert not result["recommendation_handle_rebuild_only"]
+    deferred = RECOMMENDATIONS.get(result["recommendation_handle"])
+    eligible = deferred.eligible()
+    assert eligible and deferred.summary()["computed"] == 0
+
+    first, = deferred.get([eligible[0]])
+    assert first["index"] == eligible[0] and deferred.summary()["computed"] == 1
+    assert deferred.get([eligible[0]])[0] is first
+    assert [r["index"] for r in deferred.get()] == eligible
+    with pytest.raises(PayloadError):
+        deferred.get([len(result["unallocated"])])
+
+
+def test_rebuilt_handle_gives_the_same_recommendations(client):
+    payload = short_of_rooms()
+    result = solve_timetable(payload)
+    handle = result["recommendation_handle"]
+    kept = client.post(f"/recommendations/{handle}").get_json()["recommendations"]
+
+    unknown = "0" * 32
+    assert client.post(f"/recommendations/{unknown}", json={}).status_code == 404
+    rebuilt = client.post(f"/recommendations/{unknown}", json=context_of(result, payload))
+    assert rebuilt.status_code == 200
+    assert rebuilt.get_json()["recommendations"] == kept
+    # Kept under the caller's handle: the context is not needed again
+    assert client.post(f"/recommendations/{unknown}", json={"sessions": [kept[0]["index"]]}).status_code == 200
+
+
+def test_malformed_rebuild_requests_are_payload_errors(client):
+    assert client.post("/recommendations/" + "1" * 32, json=["unallocated"]).status_code == 400
+    response = client.post("/recommendations/" + "2" * 32, json={"unallocated": [{"subject": "X"}], "rooms": {}})
+    assert response.status_code == 400
+    assert [e["path"] for e in response.get_json()["payload_errors"]] == ["rooms"]
+    assert DeferredRecommendations.from_context({"unallocated": []}).get() == []
+
+
+def test_handles_outside_the_serving_process_are_rebuild_only(monkeypatch):
+    monkeypatch.setattr(RECOMMENDATIONS, "keep_handles", False)
+    result = solve_timetable(short_of_rooms())
+    assert result["recommendation_handle_rebuild_only"]
+    assert RECOMMENDATIONS.get(result["recommendation_handle"]) is None
+
+
+def test_batch_workers_return_rebuild_only_handles():
+    # Departments with their own teachers and rooms solve in separate worker processes
+    departments = {}
+    for name in ("CS", "IT"):
+        payload = short_of_rooms()
+        for teacher in payload["teachers"]:
+            teacher["name"] = f"{name} {teacher['name']}"
+        for room in payload["rooms"]:
+            room["name"] = f"{name} {room['name']}"
+        departments[name] = payload
+    report = solve_departments(departments, max_workers=2)
+    assert report["workers"] == 2
+    for result in report["departments"].values():
+        assert result["recommendation_handle_rebuild_only"]
+        assert RECOMMENDATIONS.get(result["recommendation_handle"]) is None
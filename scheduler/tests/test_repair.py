@@ -0,0 +1,94 @@
+from collections import Counter
+
+import pytest
+
+from payloads import solved_context, standard_payload
+from solver.core.context import SolverOptions
+from solver.core.model import PayloadError
+from solver.helpers.quality import QualityEvaluator
+from solver.search.repair import DIRECT_CANDIDATES, RepairSearch
+
+
+def take_out(ctx, count, kind="theory"):
+    """Remove count placed sessions of one kind, as leftovers for repair."""
+    demands = []
+    for placement in [p for p in ctx.placements.values() if p.req.kind == kind][:count]:
+        ctx.remove_session(placement)
+        demand = ctx.demands[placement.req.id]
+        demand.remaining += len(placement.slot_keys) if kind == "lab" else 1
+        demands.append(demand)
+    return demands
+
+
+def test_repair_places_leftovers_and_keeps_quality_in_step():
+    ctx = solved_context(standard_payload())
+    demands = take_out(ctx, 3)
+    search = RepairSearch(ctx)
+    assert search.run(demands) == 3
+    assert all(d.remaining == 0 for d in demands)
+    assert abs(search.quality.score() - QualityEvaluator.from_context(ctx).score()) < 1e-9
+
+
+def test_direct_insertion_takes_the_cheapest_option():
+    ctx = solved_context(standard_payload())
+    demand, = take_out(ctx, 1)
+    search = RepairSearch(ctx)
+    before = search.quality.score()
+    direct = [option[:4] for option in search.probes(demand.req) if not option[4]][:DIRECT_CANDIDATES]
+    cheapest = min(search.quality.delta(add=[(demand.req, *option)]) for option in direct)
+    search.run([demand])
+    assert abs(search.quality.score() - before - cheapest) < 1e-9
+
+
+def test_repair_respects_teacher_daily_limits():
+    ctx = solved_context(standard_payload())
+    demand, = take_out(ctx, 1)
+    search = RepairSearch(ctx)
+    for tid in demand.req.teacher_ids:
+        for day in ctx.model.years[demand.req.year_id].working_days:
+            search.teacher_load[(tid, day)] = ctx.model.teachers[tid].max_per_day
+    assert search.run([demand]) == 0
+    assert demand.remaining == 1
+
+
+def test_repair_respects_sessions_per_day():
+    ctx = solved_context(standard_payload())
+    search = RepairSearch(ctx)
+    placement = next(p for p in ctx.placements.values() if p.req.kind == "theory")
+    req, day = placement.req, placement.day
+    search.per_day[(req.id, day)] = req.max_per_day
+    assert not search.within_limits(req, day, placement.slot_keys, placement.teacher)
+    search.per_day[(req.id, day)] = req.max_per_day - 1
+    assert search.within_limits(req, day, placement.slot_keys, placement.teacher)
+
+
+@pytest.mark.parametrize("counted", [True, False])
+def test_failed_chain_restores_the_victim_as_it_was(counted):
+    ctx = solved_context(standard_payload())
+    victim = [p for p in ctx.placements.values() if p.req.kind == "theory" and p.counted][-1]
+    if not counted:
+        ctx.remove_session(victim)
+        victim = ctx.place_session(victim.req, victim.day, victim.slot_keys, victim.teacher, victim.room,
+                                   count_towards_limit=False)
+    demand, = take_out(ctx, 1)
+    search = RepairSearch(ctx)
+    load = dict(search.teacher_load)
+    search.budget.cancel()     # the ejected session finds no new place
+    assert not search.eject_and_insert(demand, victim.day, victim.slot_keys, victim.teacher, victim.room,
+                                       victim, depth=1)
+    restored = ctx.teacher_at[(victim.teacher.id, victim.day, victim.slot_keys[0])]
+    assert restored.req is victim.req and restored.counted == counted
+    assert +search.teacher_load == +Counter(load)
+    assert demand.remaining == 1
+
+
+def test_zero_repair_time_limit_skips_the_phase():
+    ctx = solved_context(standard_payload(repair=True, repairTimeLimit=0))
+    assert "repair" not in ctx.planned_phases and "repair" not in ctx.stats.phases
+
+
+@pytest.mark.parametrize("limit", [-1, "nan", "inf"])
+def test_repair_time_limit_must_be_finite_and_not_negative(limit):
+    with pytest.raises(PayloadError) as raised:
+        SolverOptions.from_payload({"repairTimeLimit": limit})
+    assert [e["path"] for e in raised.value.errors] == ["repairTimeLimit"]
@@ -0,0 +1,47 @@
+import os
+import threading
+
+import pytest
+
+from metrics import Counter, Registry
+from serving import AdmissionController
+
+
+def test_concurrent_snapshots_do_not_collide(tmp_path):
+    registry = Registry(str(tmp_path))
+    requests = registry.register(Counter("requests_total", "Requests"))
+    failures = []
+
+    def write():
+        try:
+            for _ in range(200):
+                requests.inc()
+                registry.write_snapshot()
+        except OSError as e:
+            failures.append(e)
+
+    threads = [threading.Thread(target=write) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert failures == []
+    assert os.listdir(tmp_path) == [f"{os.getpid()}.json"]
+
+
+def test_failing_change_hook_does_not_leak_a_slot():
+    admission = AdmissionController(max_concurrent=1, max_queue=0, queue_timeout=0)
+
+    def on_change(controller):
+        if controller.in_flight:
+            raise OSError("metrics directory is gone")
+
+    admission.on_change = on_change
+    with pytest.raises(OSError):
+        with admission.admit():
+            pass
+    assert (admission.waiting, admission.in_flight) == (0, 0)
+
+    admission.on_change = None
+    with admission.admit():
+        assert admission.in_flight == 1